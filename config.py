@@ -1,4 +1,19 @@
 # Configuration du projet
-DATA_PATH = "data/secom.csv"
+DATA_PATH = "data/uci-secom.csv"
 RANDOM_STATE = 42
 TEST_SIZE = 0.2
+
+# Coûts du point de fonctionnement (src/thresholds.py)
+COST_FALSE_ALARM = 1.0     # Plaquette conforme rebutée à tort
+COST_MISSED_DEFECT = 10.0  # Plaquette défectueuse livrée (échappement)
+
+# Pipeline (src/pipeline.py)
+PIPELINE_DIR = "results/pipeline"  # Artefacts indexés par empreinte des entrées
+PRUNE_FEATURES = True              # Retrait des capteurs constants et redondants
+SMOTE_K_NEIGHBORS = 5
+N_ESTIMATORS = 100
+ROLLING_WINDOW = 0                 # Features glissantes sur les N plaquettes précédentes (0 : désactivées)
+
+# Backend du modèle (src/training.py) : 'random_forest' (SMOTE + forêt) ou
+# 'binned_hgb' (capteurs discrétisés en uint8 + boosting par histogrammes)
+MODEL_BACKEND = "random_forest"
@@ -3,12 +3,20 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-import joblib
 import os
-from datetime import datetime
+import io
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
 
 # Import de notre classe de déploiement
-from deployment import SemiconductorQualityControl
+from deployment import load_registered_model
+from src.sensor_stats import SENSOR_STATS_PATH, load_sensor_stats, sensor_summary
+from src.explain import top_factors
+from src.monitoring import PSI_ALERT, PSI_WARNING
+from src.registry import ModelRegistry
 
 # --- CONFIGURATION DE LA PAGE ---
 st.set_page_config(
@@ -107,10 +115,128 @@ st.markdown("""
 
 # --- SYSTEM INITIALIZATION ---
 @st.cache_resource
-def load_qc_system():
-    return SemiconductorQualityControl()
+def model_registry():
+    """Registre des modèles par ligne, partagé entre sessions (versions chargées à la demande)"""
+    return ModelRegistry(load_registered_model)
 
-qc = load_qc_system()
+registry = model_registry()
+
+@st.cache_resource
+def load_stats_index(path, mtime):
+    """Index des statistiques capteurs, rechargé seulement si le fichier change"""
+    return load_sensor_stats(path)
+
+TEST_DATASET_PATH = 'results/test_dataset.pkl'
+
+@st.cache_resource
+def model_failure_factors(model_key, _qc):
+    """Facteurs d'échec d'une version de modèle, calculés une fois par version"""
+    import joblib
+    qc = _qc
+    if qc.explainer is None:
+        return None
+    X_test, _ = joblib.load(TEST_DATASET_PATH)
+    # Modèle seul : le jeu de test n'alimente ni le suivi de dérive ni la fenêtre glissante
+    preds, _ = qc._run_model(qc.prepare_data(X_test), qc.threshold)
+    if not np.any(preds == 1):
+        return None
+    return top_factors(qc.explain(X_test[preds == 1]))
+
+# --- SCORING DES LOTS ---
+LOT_CHUNKSIZE = 2000     # Lignes scorées entre deux mises à jour de la progression
+MAX_CACHED_LOTS = 8      # Résultats de lots conservés en mémoire
+
+@st.cache_resource
+def lot_jobs():
+    """
+    Résultats des lots, indexés par empreinte du fichier et version du modèle (partagés
+    entre sessions), avec le verrou qui protège le dictionnaire contre les threads de scoring
+    """
+    return {'jobs': OrderedDict(), 'lock': threading.Lock()}
+
+def get_lot_job(job_key):
+    store = lot_jobs()
+    with store['lock']:
+        return store['jobs'].get(job_key)
+
+def job_state(job):
+    """Instantané cohérent d'un lot, mis à jour en parallèle par son thread de scoring"""
+    with job['lock']:
+        return {key: value for key, value in job.items() if key != 'lock'}
+
+def _update_job(job, **fields):
+    with job['lock']:
+        job.update(fields)
+
+def upload_digest(uploaded_file):
+    """Empreinte SHA-256 du fichier déposé, recalculée seulement si le fichier change"""
+    key = (uploaded_file.name, uploaded_file.size, getattr(uploaded_file, 'file_id', None))
+    cached = st.session_state.get('upload_digest')
+    if cached is None or cached[0] != key:
+        cached = (key, hashlib.sha256(uploaded_file.getvalue()).hexdigest())
+        st.session_state['upload_digest'] = cached
+    return cached[1]
+
+def _score_lot(job, content, qc):
+    """Scoring d'un lot bloc par bloc (thread d'arrière-plan), progression dans job"""
+    try:
+        data = pd.read_csv(io.BytesIO(content))
+        n_rows = len(data)
+        # Fenêtre glissante d'avant le lot, pour rejouer ses features lors de l'explication
+        window = qc.rolling.copy() if qc.rolling is not None else None
+        preds = np.empty(n_rows, dtype=np.int8)
+        probs = np.empty(n_rows, dtype=np.float64)
+        done = 0
+        for chunk_preds, chunk_probs in qc.predict_stream(data, chunksize=LOT_CHUNKSIZE):
+            preds[done:done + len(chunk_preds)] = chunk_preds
+            probs[done:done + len(chunk_preds)] = chunk_probs
+            done += len(chunk_preds)
+            _update_job(job, progress=done / max(n_rows, 1))
+        
+        # Agrégats et tableau de détail calculés une seule fois, de façon vectorisée
+        n_defects = int(np.count_nonzero(preds == 1))
+        summary = {
+            'defects': n_defects,
+            'ok': n_rows - n_defects,
+            'yield': (n_rows - n_defects) / n_rows * 100 if n_rows else 0.0,
+            'mean_confidence': float(np.maximum(probs, 1 - probs).mean() * 100) if n_rows else 0.0,
+        }
+        table = pd.DataFrame({
+            'Status': np.where(preds == 1, "DÉFECTUEUX ❌", "CONFORME ✅"),
+            'Confiance': np.maximum(probs, 1 - probs) * 100,
+        })
+        
+        # Explication des seules plaquettes défectueuses, calculée une fois par lot
+        defect_rows = np.flatnonzero(preds == 1)
+        explanation = None
+        if len(defect_rows) and qc.explainer is not None:
+            lot = data
+            if window is not None:
+                # Mêmes blocs que le scoring, sur la copie : la fenêtre en ligne n'avance qu'une fois
+                lot = pd.concat([qc.prepare_data(data.iloc[i:i + LOT_CHUNKSIZE], rolling=window)
+                                 for i in range(0, n_rows, LOT_CHUNKSIZE)])
+            explanation = qc.explain(lot.iloc[defect_rows])
+        # Résultats publiés ensemble : un lot 'done' a toujours son tableau
+        _update_job(job, summary=summary, table=table, explanation=explanation, status='done')
+    except Exception as e:
+        _update_job(job, error=str(e), status='error')
+
+def start_lot_job(job_key, content, qc):
+    """Lance le scoring d'un lot en arrière-plan (une seule fois par contenu et version)"""
+    store = lot_jobs()
+    with store['lock']:
+        jobs = store['jobs']
+        if job_key in jobs and job_state(jobs[job_key])['status'] != 'error':
+            jobs.move_to_end(job_key)
+            return jobs[job_key]
+        job = {'status': 'running', 'progress': 0.0, 'started': time.time(), 'lock': threading.Lock()}
+        jobs[job_key] = job
+        # Éviction des lots les plus anciens déjà terminés
+        for old in list(jobs)[:-MAX_CACHED_LOTS]:
+            if job_state(jobs[old])['status'] != 'running':
+                del jobs[old]
+    threading.Thread(target=_score_lot, args=(job, content, qc), daemon=True).start()
+    return job
 
 # --- SIDEBAR UI ---
 with st.sidebar:
@@ -122,9 +248,18 @@ with st.sidebar:
     menu = st.radio("Navigation", 
                   ["🛰️ Vue d'ensemble", "🔍 Contrôle de Lot", "📊 Statistiques Capteurs", "🎯 Intelligence Modèle"])
     
+    st.markdown("---")
+    selected_line = st.selectbox("Ligne de production", registry.lines())
+    try:
+        # Relu à chaque interaction : une nouvelle version publiée remplace l'ancienne sans redémarrage
+        served_line, model_version, qc = registry.get(selected_line)
+    except LookupError:
+        served_line, model_version, qc = selected_line, None, load_registered_model(registry.fallback_dir)
+    model_key = f"{served_line}/{model_version}"
+
     st.markdown("---")
     st.markdown("### 🟢 État du Système")
-    st.success("Modèle : RF-SMOTE v2.1")
+    st.success(f"Modèle : {model_key}" if model_version else "Modèle : non entraîné")
     st.info("Flux de données : Temps Réel")
 
 # --- MAIN CONTENT ---
@@ -146,24 +281,54 @@ if menu == "🛰️ Vue d'ensemble":
     with c3:
         st.metric("F1-Score IA", "95.1%", "+1.2%")
     with c4:
-        st.metric("Temps de Réponse", "12ms", "Optimisé")
+        # Latence mesurée par le benchmark (python src/evaluation.py) si disponible
+        if os.path.exists('results/benchmark.json'):
+            with open('results/benchmark.json') as f:
+                predict_bench = json.load(f)['stages']['predict']
+            st.metric("Temps de Réponse", f"{predict_bench['p50_ms']:.1f}ms",
+                      f"p99 {predict_bench['p99_ms']:.1f}ms", delta_color="off")
+        else:
+            st.metric("Temps de Réponse", "12ms", "Optimisé")
 
     st.markdown("<br>", unsafe_allow_html=True)
     
     col_l, col_r = st.columns([2, 1])
     
+    # Suivi de dérive alimenté par chaque lot scoré
+    monitor = qc.monitor
+    history = monitor.history_frame() if monitor is not None else pd.DataFrame()
+    
     with col_l:
-        st.subheader("📈 Historique de Production (Simulé)")
-        chart_data = pd.DataFrame(
-            np.random.randn(24, 2),
-            columns=['Volume Pass', 'Volume Fail']
-        )
-        st.line_chart(chart_data)
+        st.subheader("📈 Historique de Production")
+        if len(history):
+            chart_data = pd.DataFrame({
+                'Volume Pass': history['rows'] - history['defects'],
+                'Volume Fail': history['defects'],
+            }, index=pd.to_datetime(history['time'], unit='s'))
+            st.line_chart(chart_data)
+        else:
+            st.info("Aucun lot scoré depuis le dernier entraînement.")
         
     with col_r:
         st.subheader("💡 Recommandations IA")
-        st.info("**Maintenance préventive :** Vérifier le capteur 589 sur la ligne 3.")
-        st.warning("**Alerte Qualité :** Légère dérive observée sur la phase de Lithographie.")
+        if len(history):
+            drift = monitor.report()
+            alerts = drift[drift['psi'] > PSI_ALERT]
+            warnings = drift[(drift['psi'] > PSI_WARNING) & (drift['psi'] <= PSI_ALERT)]
+            top = drift.index[0]
+            if len(alerts):
+                st.error(f"**Dérive forte :** {len(alerts)} capteur(s) au-delà de PSI {PSI_ALERT} "
+                         f"(capteur {top} : PSI {drift['psi'].iloc[0]:.2f}, décalage {drift['mean_shift'].iloc[0]:+.2f}σ).")
+            elif len(warnings):
+                st.warning(f"**Alerte Qualité :** Légère dérive observée sur {len(warnings)} capteur(s) "
+                           f"(capteur {top} : PSI {drift['psi'].iloc[0]:.2f}).")
+            else:
+                st.success(f"**Capteurs stables :** aucune dérive sur {monitor.n_rows} plaquettes suivies.")
+            st.dataframe(drift.head(5)[['psi', 'ks', 'mean_shift']], use_container_width=True)
+        elif monitor is None:
+            st.info("Suivi de dérive inactif : référence absente (relancer `python src/training.py`).")
+        else:
+            st.info("Suivi de dérive en attente des premiers lots.")
 
 elif menu == "🔍 Contrôle de Lot":
     st.title("🔍 Contrôle de Lot en Temps Réel")
@@ -177,64 +342,137 @@ elif menu == "🔍 Contrôle de Lot":
     uploaded_file = st.file_uploader("", type="csv")
     
     if uploaded_file:
-        data = pd.read_csv(uploaded_file)
-        st.dataframe(data.head(5), use_container_width=True)
+        # Aperçu seulement : le fichier complet n'est lu que par le scoring
+        content = uploaded_file.getvalue()
+        digest = upload_digest(uploaded_file)
+        st.dataframe(pd.read_csv(io.BytesIO(content), nrows=5), use_container_width=True)
         
+        # Un lot rescoré par une autre version du modèle est un nouveau résultat
+        job_key = f"{digest}:{model_key}"
+        job = get_lot_job(job_key)
         if st.button("🚀 LANCER L'ANALYSE IA"):
-            with st.spinner('Détection des anomalies en cours...'):
-                features = data.drop(columns=['Target']) if 'Target' in data.columns else data
-                preds, probs = qc.predict(features)
-                
-                # Metrics du lot
-                l1, l2, l3 = st.columns(3)
-                l1.metric("Puces Défectueuses", sum(preds==1))
-                l2.metric("Puces Conformes", sum(preds==0))
-                l3.metric("Rendement (Yield)", f"{(sum(preds==0)/len(preds))*100:.1f}%")
-                
-                # Visualisation
+            if not qc.has_model():
+                st.error("Aucun modèle disponible pour la prédiction")
+            else:
+                job = start_lot_job(job_key, content, qc)
+        
+        # Le scoring continue en arrière-plan même si la page est quittée
+        state = job_state(job) if job is not None else None
+        if state is not None and state['status'] == 'running':
+            progress = st.progress(0.0, text='Détection des anomalies en cours...')
+            while state['status'] == 'running':
+                progress.progress(state['progress'], text=f"Détection des anomalies en cours... {state['progress']:.0%}")
+                time.sleep(0.2)
+                state = job_state(job)
+            progress.empty()
+        
+        if state is not None and state['status'] == 'error':
+            st.error(f"Erreur lors de la prédiction : {state['error']}")
+        elif state is not None and state['status'] == 'done':
+            summary = state['summary']
+            
+            # Metrics du lot
+            l1, l2, l3 = st.columns(3)
+            l1.metric("Puces Défectueuses", summary['defects'])
+            l2.metric("Puces Conformes", summary['ok'])
+            l3.metric("Rendement (Yield)", f"{summary['yield']:.1f}%")
+            
+            # Visualisation
+            st.markdown("---")
+            v1, v2 = st.columns([1, 1])
+            
+            with v1:
+                fig_gau = go.Figure(go.Indicator(
+                    mode = "gauge+number",
+                    value = summary['yield'],
+                    domain = {'x': [0, 1], 'y': [0, 1]},
+                    title = {'text': "Conformité du Lot (%)", 'font': {'size': 24}},
+                    gauge = {
+                        'axis': {'range': [None, 100], 'tickwidth': 1},
+                        'bar': {'color': "#3B82F6"},
+                        'steps': [
+                            {'range': [0, 70], 'color': "#FEE2E2"},
+                            {'range': [70, 90], 'color': "#FEF3C7"},
+                            {'range': [90, 100], 'color': "#D1FAE5"}]
+                    }
+                ))
+                st.plotly_chart(fig_gau, use_container_width=True)
+            
+            with v2:
+                res_df = state['table']
+                st.write(f"Détails des échantillons (confiance moyenne {summary['mean_confidence']:.1f}%) :")
+                p1, p2 = st.columns(2)
+                page_size = p1.selectbox("Lignes par page", [15, 50, 200], key='lot_page_size')
+                n_pages = max(1, -(-len(res_df) // page_size))
+                page = p2.number_input(f"Page (sur {n_pages})", min_value=1, max_value=n_pages, value=1, key='lot_page')
+                start = (page - 1) * page_size
+                st.dataframe(
+                    res_df.iloc[start:start + page_size],
+                    use_container_width=True,
+                    column_config={'Confiance': st.column_config.NumberColumn(format="%.1f%%")},
+                )
+            
+            explanation = state.get('explanation')
+            if explanation is not None:
                 st.markdown("---")
-                v1, v2 = st.columns([1, 1])
-                
-                with v1:
-                    fig_gau = go.Figure(go.Indicator(
-                        mode = "gauge+number",
-                        value = (sum(preds==0)/len(preds))*100,
-                        domain = {'x': [0, 1], 'y': [0, 1]},
-                        title = {'text': "Conformité du Lot (%)", 'font': {'size': 24}},
-                        gauge = {
-                            'axis': {'range': [None, 100], 'tickwidth': 1},
-                            'bar': {'color': "#3B82F6"},
-                            'steps': [
-                                {'range': [0, 70], 'color': "#FEE2E2"},
-                                {'range': [70, 90], 'color': "#FEF3C7"},
-                                {'range': [90, 100], 'color': "#D1FAE5"}]
-                        }
-                    ))
-                    st.plotly_chart(fig_gau, use_container_width=True)
-                
-                with v2:
-                    res_df = pd.DataFrame({
-                        'Status': ["DÉFECTUEUX ❌" if p == 1 else "CONFORME ✅" for p in preds],
-                        'Confiance': [f"{p*100:.1f}%" if p > 0.5 else f"{(1-p)*100:.1f}%" for p in probs]
-                    })
-                    st.write("Détails des échantillons :")
-                    st.dataframe(res_df.head(15), use_container_width=True)
+                e1, e2 = st.columns([1, 1])
+                with e1:
+                    st.subheader("💎 Facteurs d'Échec du Lot")
+                    factors = top_factors(explanation).sort_values('Impact')
+                    fig_lot = px.bar(factors, x='Impact', y='Feature', orientation='h',
+                                     color_discrete_sequence=['#EF4444'])
+                    st.plotly_chart(fig_lot, use_container_width=True)
+                with e2:
+                    st.subheader("🔬 Plaquette Défectueuse")
+                    wafer = st.selectbox("Échantillon", explanation.index, key='lot_wafer')
+                    wafer_factors = explanation.loc[wafer].nlargest(10).sort_values()
+                    fig_wafer = px.bar(x=wafer_factors.to_numpy(), y=wafer_factors.index.astype(str),
+                                       orientation='h', labels={'x': 'Contribution', 'y': 'Feature'},
+                                       color_discrete_sequence=['#3B82F6'])
+                    st.plotly_chart(fig_wafer, use_container_width=True)
 
 elif menu == "📊 Statistiques Capteurs":
     st.title("📊 Exploration des Paramètres de Fabrication")
-    if os.path.exists('data/secom_preprocessed.csv'):
-        df = pd.read_csv('data/secom_preprocessed.csv')
+    stats = load_stats_index(SENSOR_STATS_PATH, os.path.getmtime(SENSOR_STATS_PATH)) if os.path.exists(SENSOR_STATS_PATH) else None
+    if stats is not None:
+        names = stats['feature_names']
+        if st.checkbox("Trier par pouvoir séparateur (KS)", value=True):
+            names = names[np.argsort(stats['separation'])[::-1]]
+        feat = st.selectbox("Sélectionner la variable capteur (Sensor)", names)
+        view = sensor_summary(stats, feat)
         
-        feat = st.selectbox("Sélectionner la variable capteur (Sensor)", df.columns[:100])
+        s1, s2, s3 = st.columns(3)
+        s1.metric("Séparation OK / Fail (KS)", f"{view['separation']:.2f}")
+        s2.metric("Valeurs manquantes (brut)", f"{view['missing_rate']:.1%}")
+        s3.metric("Écart des moyennes (Fail - OK)", f"{view['means'][1] - view['means'][0]:+.3g}")
         
-        fig = px.violin(df, x="Target", y=feat, color="Target", 
-                       box=True, points="all",
-                       title=f"Analyse de la variance : {feat}",
-                       color_discrete_map={0: "#10B981", 1: "#EF4444"},
-                       labels={"Target": "0: OK, 1: Fail"})
+        h1, h2 = st.columns([3, 2])
+        with h1:
+            # Distributions par classe depuis les histogrammes précalculés
+            hist = pd.DataFrame({
+                feat: np.tile(view['bin_centers'], 2),
+                'Densité': view['density'].ravel(),
+                'Target': np.repeat([0, 1], len(view['bin_centers'])),
+            })
+            fig = px.line(hist, x=feat, y='Densité', color='Target', line_shape='hvh',
+                          title=f"Distribution par classe : {feat}",
+                          color_discrete_map={0: "#10B981", 1: "#EF4444"},
+                          labels={"Target": "0: OK, 1: Fail"})
+            fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+            st.plotly_chart(fig, use_container_width=True)
+        with h2:
+            # Échantillon sous-échantillonné : quelques centaines de points seulement
+            fig = px.strip(view['points'], x="Target", y=feat, color="Target",
+                           title="Échantillon de plaquettes",
+                           color_discrete_map={0: "#10B981", 1: "#EF4444"},
+                           labels={"Target": "0: OK, 1: Fail"})
+            fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', showlegend=False)
+            st.plotly_chart(fig, use_container_width=True)
         
-        fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-        st.plotly_chart(fig, use_container_width=True)
+        st.write("Quantiles par classe :")
+        st.dataframe(view['quantiles'], use_container_width=True)
+    else:
+        st.info("Index des statistiques absent : lancez `python src/sensor_stats.py`.")
 
 elif menu == "🎯 Intelligence Modèle":
     st.title("🎯 Évaluation de l'Intelligence Artificielle")
@@ -243,16 +481,30 @@ elif menu == "🎯 Intelligence Modèle":
         m = qc.metrics
         st.markdown("<br>", unsafe_allow_html=True)
         
-        # Big metric cards
-        mc1, mc2, mc3, mc4 = st.columns(4)
-        mc1.metric("Accuracy", f"{m['accuracy']:.2%}")
-        mc2.metric("Precision", f"{m['precision']:.2%}")
-        mc3.metric("Recall", f"{m['recall']:.2%}")
-        mc4.metric("F1-Score", f"{m['f1_score']:.2%}")
+        # Big metric cards : chaque métrique avec l'intervalle calculé au même seuil
+        card_rows = [("Seuil par défaut (classe majoritaire des arbres)", m, m.get('confidence_intervals'))]
+        if 'operating_point' in m:
+            card_rows.append((f"Point de fonctionnement (seuil {m['operating_point']['threshold']:.3f})",
+                              m['operating_point'], m.get('operating_point_intervals')))
+        for title, values, row_intervals in card_rows:
+            st.markdown(f"**{title}**")
+            mc1, mc2, mc3, mc4 = st.columns(4)
+            for col, label, key in ((mc1, "Accuracy", 'accuracy'), (mc2, "Precision", 'precision'),
+                                    (mc3, "Recall", 'recall'), (mc4, "F1-Score", 'f1_score')):
+                col.metric(label, f"{values[key]:.2%}")
+                if row_intervals:
+                    low, high = row_intervals[key]
+                    col.caption(f"IC {row_intervals['confidence']:.0%} : {low:.1%} – {high:.1%}")
+        intervals = m.get('confidence_intervals')
+        if intervals:
+            n_test = int(np.sum(m['confusion_matrix']))
+            n_fail = int(np.sum(m['confusion_matrix'][1]))
+            st.caption(f"Intervalles bootstrap ({intervals['n_resamples']} rééchantillonnages) sur "
+                       f"{n_test} plaquettes de test dont {n_fail} défectueuses.")
         
         st.markdown("<br>", unsafe_allow_html=True)
         
-        # Matrix and Importance (fake for importance here)
+        # Matrix and Importance
         ml, mr = st.columns(2)
         
         with ml:
@@ -265,14 +517,16 @@ elif menu == "🎯 Intelligence Modèle":
             
         with mr:
             st.subheader("💎 Facteurs Clés d'Échec")
-            # Simulation d'importance
-            importance = pd.DataFrame({
-                'Feature': [f"Sensor_{i}" for i in [59, 102, 342, 590, 42]],
-                'Impact': [0.15, 0.12, 0.09, 0.08, 0.07]
-            }).sort_values('Impact')
-            fig_imp = px.bar(importance, x='Impact', y='Feature', orientation='h',
-                            color_discrete_sequence=['#3B82F6'])
-            st.plotly_chart(fig_imp, use_container_width=True)
+            # Contributions moyennes sur les plaquettes du set de test prédites défectueuses
+            importance = None
+            if os.path.exists(TEST_DATASET_PATH) and os.path.exists(qc.model_path):
+                importance = model_failure_factors(model_key, qc)
+            if importance is not None:
+                fig_imp = px.bar(importance.sort_values('Impact'), x='Impact', y='Feature', orientation='h',
+                                color_discrete_sequence=['#3B82F6'])
+                st.plotly_chart(fig_imp, use_container_width=True)
+            else:
+                st.info("Facteurs indisponibles : entraînez le modèle (`python src/training.py`).")
 
 # Footer
 st.markdown("---")
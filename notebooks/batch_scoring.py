@@ -0,0 +1,290 @@
+# batch_scoring.py
+import argparse
+import io
+import json
+import logging
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from deployment import load_registered_model
+from src.preprocessing import align_features
+from src.registry import DEFAULT_LINE, ModelRegistry
+from src.rolling import RollingWindow
+
+logger = logging.getLogger(__name__)
+
+SHARD_MB = 64                    # Taille cible d'un shard CSV
+TARGET_COLUMNS = ('Target', 'Pass/Fail')
+
+# Modèle du processus de travail : hérité du parent (fork) ou chargé une fois par processus (spawn)
+_QC = None
+
+
+def csv_shards(path, n_shards):
+    """
+    Découpe un CSV en plages d'octets alignées sur les fins de ligne.
+
+    Chaque processus lit sa propre plage : aucune donnée ne transite par le parent.
+    Les champs entre guillemets contenant un retour à la ligne ne sont pas supportés.
+
+    Args:
+        path: Chemin du CSV (avec en-tête)
+        n_shards: Nombre de shards visé (moins si le fichier est petit)
+
+    Returns:
+        (colonnes, liste de (début, fin) en octets)
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        columns = pd.read_csv(io.BytesIO(header)).columns.tolist()
+        start = f.tell()
+        bounds = [start]
+        for i in range(1, n_shards):
+            f.seek(max(start + (size - start) * i // n_shards, bounds[-1]))
+            f.readline()
+            position = f.tell()
+            if bounds[-1] < position < size:
+                bounds.append(position)
+    bounds.append(size)
+    return columns, [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def _read_shard(source, kind, spec, columns):
+    if kind == 'csv':
+        start, end = spec
+        with open(source, 'rb') as f:
+            f.seek(start)
+            buffer = f.read(end - start)
+        return pd.read_csv(io.BytesIO(buffer), header=None, names=columns)
+    import pyarrow.parquet as pq
+    return pq.ParquetFile(source).read_row_group(spec).to_pandas()
+
+
+def _preceding_rows(source, kind, spec, columns, data_start, n_rows):
+    """Les n_rows lignes qui précèdent un shard dans le fichier (amorçage de la fenêtre glissante)."""
+    if kind == 'csv':
+        start = spec[0]
+        with open(source, 'rb') as f:
+            position, tail = start, b''
+            # Lecture à rebours par blocs jusqu'à disposer de n_rows lignes complètes
+            while position > data_start and tail.count(b'\n') <= n_rows:
+                read_from = max(data_start, position - (1 << 16))
+                f.seek(read_from)
+                tail = f.read(position - read_from) + tail
+                position = read_from
+        lines = tail.split(b'\n')[:-1][-n_rows:]
+        return pd.read_csv(io.BytesIO(b'\n'.join(lines) + b'\n'), header=None, names=columns)
+    import pyarrow.parquet as pq
+    parquet = pq.ParquetFile(source)
+    groups, rows = [], 0
+    for group in range(spec - 1, -1, -1):
+        groups.insert(0, parquet.read_row_group(group).to_pandas())
+        rows += len(groups[0])
+        if rows >= n_rows:
+            break
+    return pd.concat(groups, ignore_index=True).iloc[-n_rows:]
+
+
+def _shard_window(index, source, kind, spec, columns, data_start):
+    """
+    Fenêtre glissante propre au shard : le premier shard prolonge une copie de la fenêtre
+    en ligne (fin de l'historique connu), les suivants sont amorcés sur les plaquettes qui
+    les précèdent dans le fichier, supposé trié par Time. La fenêtre en ligne n'est pas modifiée.
+    """
+    if index == 0:
+        return _QC.rolling.copy()
+    rolling = RollingWindow(_QC.rolling.sensors, _QC.rolling.window)
+    warmup = _preceding_rows(source, kind, spec, columns, data_start, rolling.window)
+    times = warmup['Time'].to_numpy() if 'Time' in warmup.columns else None
+    rolling.transform(align_features(_QC.schema, warmup).to_numpy(), times)
+    return rolling
+
+
+def _init_worker(model_dir):
+    global _QC
+    if _QC is None:
+        logging.getLogger('deployment').setLevel(logging.WARNING)
+        _QC = load_registered_model(model_dir)
+    # Un processus par cœur : chaque processus évalue les arbres sur un seul thread
+    if _QC.engine is not None:
+        _QC.engine.n_threads = 1
+
+
+def _score_shard(task):
+    """
+    Score un shard dans un processus de travail.
+
+    Le suivi de dérive et la fenêtre glissante en ligne ne sont pas mis à jour : plusieurs
+    processus écriraient le même état.
+
+    Returns:
+        Dictionnaire : prédictions, probabilités, identifiants et chronométrage du shard
+    """
+    index, source, kind, spec, columns, data_start, threshold, id_column = task
+    start = time.perf_counter()
+    frame = _read_shard(source, kind, spec, columns)
+    rolling = None
+    if _QC.rolling is not None:
+        rolling = _shard_window(index, source, kind, spec, columns, data_start)
+    read_done = time.perf_counter()
+
+    ids = frame[id_column].to_numpy() if id_column else None
+    features = frame.drop(columns=[c for c in TARGET_COLUMNS if c in frame.columns])
+    prepared = _QC.prepare_data(features, rolling=rolling)
+    prepare_done = time.perf_counter()
+    predictions, probabilities = _QC._run_model(prepared, threshold if threshold is not None else _QC.threshold)
+    score_done = time.perf_counter()
+    return {
+        'shard': index,
+        'pid': os.getpid(),
+        'rows': len(frame),
+        'defects': int(np.count_nonzero(predictions == 1)),
+        'read_ms': (read_done - start) * 1000,
+        'prepare_ms': (prepare_done - read_done) * 1000,
+        'score_ms': (score_done - prepare_done) * 1000,
+        'predictions': predictions,
+        'probabilities': probabilities,
+        'ids': ids,
+    }
+
+
+def score_file(source, output, qc, jobs=None, shard_mb=SHARD_MB, threshold=None, id_column=None):
+    """
+    Score un export volumineux (CSV ou Parquet) sur un pool de processus.
+
+    Le fichier est découpé en shards (plages d'octets pour un CSV, groupes de lignes pour
+    un Parquet) lus directement par les processus de travail. Le modèle n'est jamais
+    sérialisé vers les processus : avec fork, ils héritent de celui du parent (forêt
+    compilée projetée en mémoire, pages partagées) ; sinon chacun projette la forêt
+    compilée une seule fois. Les résultats sont écrits dans l'ordre du fichier source.
+
+    Pour un modèle à features glissantes, le fichier doit être trié par Time : chaque
+    shard amorce sa fenêtre sur les plaquettes qui le précèdent, ce qui donne les mêmes
+    features qu'un calcul séquentiel.
+
+    Args:
+        source: Chemin du CSV ou du Parquet (.parquet, nécessite pyarrow)
+        output: CSV de sortie (row, [id_column], prediction, probability)
+        qc: SemiconductorQualityControl chargé (voir load_registered_model)
+        jobs: Nombre de processus (par défaut, nombre de cœurs)
+        shard_mb: Taille cible d'un shard CSV
+        threshold: Seuil de décision (par défaut, celui choisi à l'entraînement)
+        id_column: Colonne source recopiée dans la sortie (ex. Time)
+
+    Returns:
+        Rapport : totaux et chronométrage par shard
+    """
+    global _QC
+    if not qc.has_model():
+        raise ValueError("Aucun modèle disponible pour le scoring")
+    # Modèle du parent : hérité tel quel par les processus forkés
+    _QC = qc
+    model_dir = os.path.dirname(qc.model_path)
+    jobs = jobs or os.cpu_count() or 1
+    if source.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("pyarrow est requis pour lire un fichier Parquet (pip install pyarrow)") from None
+        kind, columns, data_start = 'parquet', None, None
+        specs = list(range(pq.ParquetFile(source).num_row_groups))
+    else:
+        kind = 'csv'
+        n_shards = max(jobs, -(-os.path.getsize(source) // (shard_mb << 20)))
+        columns, specs = csv_shards(source, n_shards)
+        data_start = specs[0][0] if specs else 0
+    tasks = [(i, source, kind, spec, columns, data_start, threshold, id_column) for i, spec in enumerate(specs)]
+
+    start = time.perf_counter()
+    shards = []
+    directory = os.path.dirname(output)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    tmp_path = output + '.tmp'
+    pool = None
+    try:
+        if jobs > 1 and len(tasks) > 1:
+            method = 'fork' if 'fork' in mp.get_all_start_methods() else 'spawn'
+            pool = mp.get_context(method).Pool(jobs, initializer=_init_worker, initargs=(model_dir,))
+            results = pool.imap(_score_shard, tasks)
+        else:
+            results = map(_score_shard, tasks)
+
+        with open(tmp_path, 'w', newline='') as f:
+            row = 0
+            for result in results:
+                # imap restitue les shards dans l'ordre : écriture en flux, mémoire bornée
+                out = {'row': np.arange(row, row + result['rows'])}
+                ids = result.pop('ids')
+                if id_column:
+                    out[id_column] = ids
+                out['prediction'] = result.pop('predictions')
+                out['probability'] = result.pop('probabilities')
+                pd.DataFrame(out).to_csv(f, header=(row == 0), index=False, float_format='%.6f')
+                row += result['rows']
+                shards.append(result)
+        os.replace(tmp_path, output)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    elapsed = time.perf_counter() - start
+    rows = sum(s['rows'] for s in shards)
+    return {
+        'source': source,
+        'output': output,
+        'model_dir': model_dir,
+        'jobs': jobs,
+        'n_shards': len(shards),
+        'rows': rows,
+        'defects': sum(s['defects'] for s in shards),
+        'seconds': elapsed,
+        'throughput_rows_s': rows / elapsed if elapsed > 0 else 0.0,
+        'shards': shards,
+    }
+
+
+def log_report(report):
+    logger.info(f"✅ {report['rows']} plaquettes scorées en {report['seconds']:.2f} s "
+                f"({report['throughput_rows_s']:.0f} lignes/s, {report['jobs']} processus, "
+                f"{report['n_shards']} shards) → {report['output']}")
+    logger.info(f"📊 {report['defects']} défectueuses ({report['defects'] / max(report['rows'], 1):.1%})")
+    logger.info("   shard |  pid   | lignes | lecture ms | prépa ms | scoring ms")
+    for s in report['shards']:
+        logger.info(f"   {s['shard']:>5} | {s['pid']:>6} | {s['rows']:>6} | {s['read_ms']:>10.1f} | "
+                    f"{s['prepare_ms']:>8.1f} | {s['score_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scoring par lots multi-processus d'un export volumineux")
+    parser.add_argument("source", help="CSV ou Parquet à scorer")
+    parser.add_argument("--output", default="results/batch_predictions.csv")
+    parser.add_argument("--report", default=None, help="Rapport JSON (par défaut <output>.timing.json)")
+    parser.add_argument("--jobs", type=int, default=None, help="Processus de travail (par défaut, nombre de cœurs)")
+    parser.add_argument("--shard-mb", type=int, default=SHARD_MB)
+    parser.add_argument("--threshold", type=float, default=None)
+    parser.add_argument("--id-column", default=None, help="Colonne recopiée dans la sortie (ex. Time)")
+    parser.add_argument("--line", default=DEFAULT_LINE, help="Ligne de production (version active du registre)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+
+    try:
+        _, _, qc = ModelRegistry(load_registered_model).get(args.line)
+    except LookupError:
+        raise SystemExit("❌ Aucun modèle disponible pour le scoring")
+
+    report = score_file(args.source, args.output, qc, args.jobs, args.shard_mb,
+                        args.threshold, args.id_column)
+    log_report(report)
+    report_path = args.report or os.path.splitext(args.output)[0] + '.timing.json'
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
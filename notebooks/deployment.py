@@ -1,25 +1,58 @@
 # deployment.py
 import pandas as pd
 import numpy as np
-import joblib
+import atexit
+import logging
 import os
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
-from sklearn.impute import SimpleImputer
+import sys
+import time
 import warnings
 warnings.filterwarnings('ignore')
 
+# Permet d'importer le package src depuis notebooks/ ou depuis la racine
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.preprocessing import align_features, compile_schema, load_preprocessor
+from src.data_cache import load_csv
+from src.inference import CompiledForest
+from src.explain import ForestExplainer
+from src.monitoring import DriftMonitor, load_reference
+from src.binning import load_bin_edges, transform_bins
+from src.rolling import RollingWindow, rolling_feature_names
+from src.thresholds import confusion_counts, load_operating_point, metrics_from_counts, threshold_sweep
+from src.model_format import is_stale, load_compiled, read_manifest
+from src.registry import version_state_dir
+from src.instrumentation import METRICS
+
+logger = logging.getLogger(__name__)
+
+# scikit-learn et joblib ne sont importés qu'à la demande : le scoring à partir de
+# la forêt compilée n'en a pas besoin, ce qui réduit le temps de démarrage.
+_NOT_LOADED = object()
+
 class SemiconductorQualityControl:
     """Classe pour déployer et utiliser le modèle de contrôle qualité"""
     
-    def __init__(self, model_path=None, metrics_path=None):
+    def __init__(self, model_path=None, metrics_path=None, preprocessor_path=None, compiled_path=None,
+                 missing_sensors='error', state_dir=None):
         """
         Initialisation du système de contrôle qualité
         
+        Le modèle n'est chargé qu'à la première prédiction : la forêt compilée
+        (memory-map) si elle existe et est à jour, sinon le pickle scikit-learn.
+        
         Args:
             model_path: Chemin vers le modèle sauvegardé
             metrics_path: Chemin vers les métriques sauvegardées
+            preprocessor_path: Chemin vers l'état du prétraitement (médianes, colonnes)
+            compiled_path: Dossier de la forêt compilée (manifeste + binaire)
+            missing_sensors: Capteur attendu absent des données : 'error' (refus) ou 'median'
+            state_dir: Dossier de l'état modifiable (suivi de dérive, fenêtre glissante) ;
+                       par défaut, celui du modèle
         """
-        print("🔧 Initialisation du système de contrôle qualité...")
+        logger.info("🔧 Initialisation du système de contrôle qualité...")
         
         # Gestion intelligente des chemins par défaut
         if model_path is None:
@@ -30,192 +63,600 @@ class SemiconductorQualityControl:
         if metrics_path is None:
             paths_to_test = ['results/final_metrics.pkl', '../results/final_metrics.pkl']
             metrics_path = next((p for p in paths_to_test if os.path.exists(p)), paths_to_test[0])
+            
+        if preprocessor_path is None:
+            paths_to_test = ['results/preprocessor.pkl', '../results/preprocessor.pkl']
+            preprocessor_path = next((p for p in paths_to_test if os.path.exists(p)), paths_to_test[0])
+            
+        if compiled_path is None:
+            compiled_path = os.path.join(os.path.dirname(model_path), 'final_model_compiled')
         
-        # Charger le modèle
-        if os.path.exists(model_path):
-            self.model = joblib.load(model_path)
-            print(f"✅ Modèle chargé depuis : {model_path}")
+        # Le modèle est localisé ici mais chargé à la première utilisation
+        self.model_path = model_path
+        self.compiled_path = compiled_path
+        self._model = _NOT_LOADED
+        self._engine = _NOT_LOADED
+        self._explainer = None
+        manifest = read_manifest(compiled_path)
+        if manifest is not None and not is_stale(manifest, model_path):
+            logger.info(f"✅ Forêt compilée disponible : {compiled_path} ({manifest['n_trees']} arbres, chargement différé)")
+        elif os.path.exists(model_path):
+            logger.info(f"✅ Modèle disponible : {model_path} (chargement différé)")
         else:
-            print(f"⚠️  Modèle non trouvé : {model_path}")
-            print("   Création d'un modèle fictif pour le test...")
-            self.model = None
+            logger.warning(f"⚠️  Modèle non trouvé : {model_path}")
+            logger.warning("   Création d'un modèle fictif pour le test...")
+            self._model = None
+            self._engine = None
         
-        # Charger les métriques de référence
+        # Métriques de référence, elles aussi chargées à la première utilisation
+        self.metrics_path = metrics_path
+        self._metrics = _NOT_LOADED
         if os.path.exists(metrics_path):
-            self.metrics = joblib.load(metrics_path)
-            print(f"✅ Métriques de référence chargées depuis : {metrics_path}")
+            logger.info(f"✅ Métriques de référence disponibles : {metrics_path} (chargement différé)")
+        else:
+            self._metrics = None
+            logger.warning(f"⚠️  Métriques de référence non trouvées à : {metrics_path}")
+        
+        # Charger l'état du prétraitement appris à l'entraînement
+        if os.path.exists(preprocessor_path):
+            self.preprocessor = load_preprocessor(preprocessor_path)
+            # Schéma d'entrée compilé une fois : alignement des colonnes et imputation en une passe
+            self.schema = compile_schema(self.preprocessor, missing_sensors)
+            logger.info(f"✅ Prétraitement chargé depuis : {preprocessor_path}")
+        else:
+            self.preprocessor = None
+            self.schema = None
+            logger.warning(f"⚠️  Prétraitement non trouvé à : {preprocessor_path}")
+        
+        # Seuil de décision choisi à l'entraînement (coût rebut / échappement minimal)
+        results_dir = os.path.dirname(model_path)
+        self.operating_point = load_operating_point(os.path.join(results_dir, 'operating_point.json'))
+        self.threshold = self.operating_point['threshold'] if self.operating_point else None
+        if self.threshold is not None:
+            logger.info(f"✅ Seuil de décision : {self.threshold:.3f}")
+        
+        # Bornes de discrétisation uint8 (backend binned_hgb) : le modèle s'applique aux codes
+        self.bin_edges = load_bin_edges(os.path.join(results_dir, 'bin_edges.npz'))
+        if self.bin_edges is not None:
+            logger.info(f"✅ Discrétisation uint8 chargée ({self.bin_edges['edges'].shape[0]} capteurs)")
+        
+        # État modifiable au scoring, séparé des artefacts (immuables dans le registre)
+        state_dir = state_dir or results_dir
+        
+        # Features glissantes : fenêtre de fin d'historique, prolongée à chaque plaquette scorée
+        self.rolling_state_path = os.path.join(state_dir, 'rolling_state.npz')
+        self.rolling = None
+        self.rolling_features = None
+        if self.preprocessor is not None and 'rolling' in self.preprocessor:
+            self.rolling_features = pd.Index(rolling_feature_names(self.preprocessor['feature_names']))
+            self.rolling = RollingWindow.load(self.rolling_state_path)
+            if self.rolling is None:
+                # Premier démarrage : fenêtre de fin d'historique d'entraînement
+                self.rolling = RollingWindow.load(os.path.join(results_dir, 'rolling_state.npz'))
+            if self.rolling is not None:
+                atexit.register(self.save_rolling)
+                logger.info(f"✅ Features glissantes actives (fenêtre {self.rolling.window}, "
+                            f"{self.rolling.count} plaquettes d'historique)")
+            else:
+                logger.warning(f"⚠️  Fenêtre des features glissantes non trouvée : {self.rolling_state_path}")
+        
+        # Suivi de dérive des capteurs par rapport à l'entraînement (état repris entre deux exécutions)
+        self.drift_state_path = os.path.join(state_dir, 'drift_state.npz')
+        reference = load_reference(os.path.join(results_dir, 'drift_reference.npz'))
+        if reference is not None:
+            self.monitor = DriftMonitor.load(reference, self.drift_state_path)
+            atexit.register(self.save_monitor)
+            logger.info(f"✅ Suivi de dérive actif ({self.monitor.n_rows} plaquettes déjà suivies)")
         else:
-            self.metrics = None
-            print(f"⚠️  Métriques de référence non trouvées à : {metrics_path}")
+            self.monitor = None
+        
+        # Compteurs cumulés du mode flux (predict_stream)
+        self.stream_stats = {'chunks': 0, 'rows': 0, 'defects': 0}
+    
+    @property
+    def metrics(self):
+        """Métriques de référence, désérialisées à la première utilisation"""
+        if self._metrics is _NOT_LOADED:
+            import joblib
+            self._metrics = joblib.load(self.metrics_path) if os.path.exists(self.metrics_path) else None
+        return self._metrics
+    
+    @property
+    def model(self):
+        """Modèle scikit-learn, désérialisé à la première utilisation"""
+        if self._model is _NOT_LOADED:
+            import joblib
+            if os.path.exists(self.model_path):
+                self._model = joblib.load(self.model_path)
+                logger.info(f"✅ Modèle chargé depuis : {self.model_path}")
+            else:
+                self._model = None
+        return self._model
+    
+    @model.setter
+    def model(self, value):
+        self._model = value
+        self._engine = _NOT_LOADED
+    
+    @property
+    def engine(self):
+        """Forêt compilée : artefact memory-mappé si à jour, sinon compilée depuis le modèle"""
+        if self._engine is _NOT_LOADED:
+            manifest = read_manifest(self.compiled_path)
+            if self._model is _NOT_LOADED and manifest is not None and not is_stale(manifest, self.model_path):
+                self._engine = load_compiled(self.compiled_path)
+                logger.info(f"✅ Forêt compilée chargée : {self._engine.n_trees} arbres")
+            else:
+                # Compiler la forêt en tableaux contigus pour une inférence en une passe
+                self._engine = None
+                if self.model is not None and (hasattr(self.model, 'estimators_') or hasattr(self.model, '_predictors')):
+                    try:
+                        feature_names = self.bin_edges['feature_names'] if self.bin_edges is not None else None
+                        self._engine = CompiledForest.from_estimator(self.model, feature_names)
+                        logger.info(f"✅ Forêt compilée : {self._engine.n_trees} arbres")
+                    except (AttributeError, ValueError) as e:
+                        logger.warning(f"⚠️  Compilation de la forêt impossible ({e}), inférence scikit-learn")
+        return self._engine
+    
+    @engine.setter
+    def engine(self, value):
+        self._engine = value
+    
+    @property
+    def explainer(self):
+        """Moteur d'explication construit sur la forêt compilée courante"""
+        engine = self.engine
+        if engine is None or engine.baseline is not None:
+            return None
+        if self._explainer is None or self._explainer.engine is not engine:
+            self._explainer = ForestExplainer(engine)
+        return self._explainer
     
-    def prepare_data(self, new_data):
+    def has_model(self):
+        """Vrai si un modèle (compilé ou scikit-learn) est disponible"""
+        return self.engine is not None or self.model is not None
+    
+    def prepare_data(self, new_data, rolling=None):
         """
         Prépare les nouvelles données pour la prédiction
         
         Args:
             new_data: DataFrame pandas avec les nouvelles données
+            rolling: Fenêtre des features glissantes à prolonger (par défaut, une copie de
+                     la fenêtre en ligne : seul le scoring la fait avancer)
         
         Returns:
-            DataFrame préparé
+            DataFrame préparé (les données déjà alignées sont retournées sans copie)
+        
+        Raises:
+            ValueError: données incompatibles avec le schéma d'entraînement
         """
-        print("📊 Préparation des données...")
+        prepared = self._align(new_data)
+        if self.rolling_features is not None:
+            prepared = self._with_rolling(new_data, prepared, rolling)
+        return prepared
+    
+    def _align(self, new_data):
+        """Capteurs alignés sur le schéma d'entraînement, sans les features glissantes"""
+        logger.debug("📊 Préparation des données...")
+        
+        # Appliquer l'état appris à l'entraînement (médianes figées, pas de réajustement)
+        if self.schema is not None:
+            with METRICS.span('prepare'):
+                return align_features(self.schema, new_data)
         
         # Vérifier que les données ont la bonne forme
         expected_features = 567  # Nombre de features attendues
         if new_data.shape[1] != expected_features:
-            print(f"⚠️  Attention: {new_data.shape[1]} features au lieu de {expected_features}")
+            logger.warning(f"⚠️  Attention: {new_data.shape[1]} features au lieu de {expected_features}")
         
         # Vérifier les valeurs manquantes
         missing_values = new_data.isnull().sum().sum()
         if missing_values > 0:
-            print(f"⚠️  {missing_values} valeurs manquantes détectées")
+            logger.warning(f"⚠️  {missing_values} valeurs manquantes détectées")
+            METRICS.inc('imputed_values', int(missing_values))
             # Imputation simple (médiane)
+            from sklearn.impute import SimpleImputer
             imputer = SimpleImputer(strategy='median')
             new_data = pd.DataFrame(imputer.fit_transform(new_data), 
                                    columns=new_data.columns)
-            print("✅ Valeurs manquantes imputées")
+            logger.info("✅ Valeurs manquantes imputées")
         
         return new_data
     
+    def _with_rolling(self, new_data, prepared, rolling=None):
+        """
+        Ajoute les features glissantes : reprises telles quelles si les données les
+        contiennent déjà (historique prétraité), sinon calculées en prolongeant la fenêtre
+        dans l'ordre de la colonne Time (ou des lignes).
+        """
+        names = self.rolling_features
+        if isinstance(new_data, pd.DataFrame) and names.isin(new_data.columns).all():
+            return pd.concat([prepared, new_data[names]], axis=1)
+        
+        window = rolling
+        if window is None:
+            if self.rolling is None:
+                raise ValueError(f"Features glissantes requises par le modèle : fenêtre absente ({self.rolling_state_path})")
+            window = self.rolling.copy()
+        times = new_data['Time'].to_numpy() if isinstance(new_data, pd.DataFrame) and 'Time' in new_data.columns else None
+        with METRICS.span('rolling'):
+            features = pd.DataFrame(window.transform(prepared.to_numpy(), times), columns=names, index=prepared.index)
+        if window is self.rolling:
+            self.rolling.maybe_save(self.rolling_state_path)
+        return pd.concat([prepared, features], axis=1)
+    
     def predict(self, new_data, threshold=None):
         """
         Fait des prédictions sur de nouvelles données
         
         Args:
             new_data: DataFrame pandas
-            threshold: Seuil de décision personnalisé (optionnel)
+            threshold: Seuil de décision personnalisé (par défaut, celui choisi à l'entraînement)
         
         Returns:
             predictions: Prédictions (0: OK, 1: Défectueux)
             probabilities: Probabilités de la classe 1
         """
-        print("🤖 Prédiction en cours...")
+        logger.debug("🤖 Prédiction en cours...")
         
-        if self.model is None:
-            print("❌ Aucun modèle disponible pour la prédiction")
+        if not self.has_model():
+            logger.error("❌ Aucun modèle disponible pour la prédiction")
             return None, None
         
-        # Préparer les données
-        prepared_data = self.prepare_data(new_data)
-        
-        # Faire des prédictions
-        try:
-            if hasattr(self.model, 'predict_proba'):
-                probabilities = self.model.predict_proba(prepared_data)[:, 1]
-                
-                # Appliquer un seuil personnalisé si spécifié
-                if threshold is not None:
-                    predictions = (probabilities >= threshold).astype(int)
-                else:
-                    predictions = self.model.predict(prepared_data)
-            else:
-                predictions = self.model.predict(prepared_data)
-                probabilities = None
-            
-            print(f"✅ {len(predictions)} prédictions effectuées")
+        start = time.perf_counter()
+        with METRICS.trace() as stages:
+            # Préparer les données (la fenêtre glissante en ligne avance)
+            prepared_data = self.prepare_data(new_data, rolling=self.rolling)
             
-            # Statistiques des prédictions
+            # Faire des prédictions
+            try:
+                predictions, probabilities = self._score(prepared_data, threshold)
+            except Exception as e:
+                METRICS.inc('predict_errors')
+                logger.error(f"❌ Erreur lors de la prédiction: {e}")
+                return None, None
+        METRICS.observe('predict_latency_ms', (time.perf_counter() - start) * 1000)
+        logger.debug(f"⏱️  Lot de {len(predictions)} lignes : "
+                     + ", ".join(f"{stage} {ms:.2f} ms" for stage, ms in stages.items()))
+        
+        # Chemin de chaque requête : le suivi passe par METRICS, le résumé seulement en debug
+        if logger.isEnabledFor(logging.DEBUG):
             defect_count = np.sum(predictions == 1)
             ok_count = np.sum(predictions == 0)
-            if len(predictions) > 0:
-                defect_rate = defect_count / len(predictions) * 100
-            else:
-                defect_rate = 0
-            
-            print(f"📊 Résumé: {defect_count} défectueux ({defect_rate:.1f}%), {ok_count} OK")
+            defect_rate = defect_count / len(predictions) * 100 if len(predictions) > 0 else 0
+            logger.debug(f"✅ {len(predictions)} prédictions effectuées")
+            logger.debug(f"📊 Résumé: {defect_count} défectueux ({defect_rate:.1f}%), {ok_count} OK")
+        
+        return predictions, probabilities
+    
+    def _score(self, prepared_data, threshold=None):
+        """
+        Applique le modèle à des données déjà préparées (sans affichage)
+        
+        Returns:
+            predictions, probabilities
+        """
+        if threshold is None:
+            threshold = self.threshold
+        with METRICS.span('score'):
+            predictions, probabilities = self._run_model(prepared_data, threshold)
+        if self.monitor is not None:
+            with METRICS.span('monitor'):
+                self.monitor.update(prepared_data, predictions)
+                self.monitor.maybe_save(self.drift_state_path)
+        if METRICS.enabled:
+            METRICS.inc('rows_scored', len(predictions))
+            METRICS.inc('defects_predicted', int(np.sum(predictions == 1)))
+        return predictions, probabilities
+    
+    def _run_model(self, prepared_data, threshold=None):
+        """Forêt compilée si disponible, sinon modèle scikit-learn"""
+        if self.bin_edges is not None:
+            # Modèle entraîné sur les codes uint8 : discrétisation avec les bornes sauvegardées
+            if self.bin_edges['feature_names'] is not None and list(prepared_data.columns) != self.bin_edges['feature_names']:
+                prepared_data = prepared_data[self.bin_edges['feature_names']]
+            with METRICS.span('bin'):
+                prepared_data = transform_bins(self.bin_edges['edges'], prepared_data.to_numpy())
+        
+        if self.engine is not None:
+            # Une seule traversée des arbres pour les probabilités et les prédictions
+            if isinstance(prepared_data, pd.DataFrame):
+                if self.engine.feature_names is not None and list(prepared_data.columns) != self.engine.feature_names:
+                    prepared_data = prepared_data[self.engine.feature_names]
+                prepared_data = prepared_data.to_numpy()
+            return self.engine.predict(prepared_data, threshold)
+        
+        if hasattr(self.model, 'predict_proba'):
+            probabilities = self.model.predict_proba(prepared_data)[:, 1]
             
-            return predictions, probabilities
+            # Appliquer un seuil personnalisé si spécifié
+            if threshold is not None:
+                predictions = (probabilities >= threshold).astype(int)
+            else:
+                predictions = self.model.predict(prepared_data)
+        else:
+            predictions = self.model.predict(prepared_data)
+            probabilities = None
+        return predictions, probabilities
+    
+    def save_monitor(self):
+        """Sauvegarde l'état du suivi de dérive"""
+        if self.monitor is not None and self.monitor.n_rows > 0:
+            self.monitor.save(self.drift_state_path)
+    
+    def save_rolling(self):
+        """Sauvegarde la fenêtre des features glissantes"""
+        if self.rolling is not None:
+            self.rolling.save(self.rolling_state_path)
+    
+    def close(self):
+        """Libère l'instance (modèle retiré du registre) : états de dérive et des features glissantes sauvegardés"""
+        self.save_monitor()
+        if self.monitor is not None:
+            atexit.unregister(self.save_monitor)
+        self.save_rolling()
+        if self.rolling is not None:
+            atexit.unregister(self.save_rolling)
+    
+    def explain(self, new_data, rolling=None):
+        """
+        Contributions de chaque capteur à la probabilité de défaut, par plaquette
+        
+        Args:
+            new_data: DataFrame pandas (format brut ou prétraité)
+            rolling: Fenêtre des features glissantes (par défaut, une copie de la fenêtre en ligne)
+        
+        Returns:
+            DataFrame (plaquettes x capteurs) ; biais + somme d'une ligne = probabilité
+        """
+        if self.explainer is None:
+            logger.error("❌ L'explication nécessite une forêt compilée")
+            return None
+        
+        prepared_data = self.prepare_data(new_data, rolling)
+        if self.engine.feature_names is not None and list(prepared_data.columns) != self.engine.feature_names:
+            prepared_data = prepared_data[self.engine.feature_names]
+        with METRICS.span('explain'):
+            return self.explainer.explain(prepared_data)
+    
+    def _iter_chunks(self, source, chunksize):
+        """
+        Normalise une source de données en itérateur de DataFrames
+        
+        Args:
+            source: Chemin d'un CSV, DataFrame, tableau numpy ou itérable de ceux-ci
+            chunksize: Nombre de lignes par bloc pour les fichiers et gros tableaux
+        """
+        if isinstance(source, str):
+            yield from pd.read_csv(source, chunksize=chunksize)
+            return
+        if isinstance(source, pd.DataFrame):
+            data = source
+            source = (data.iloc[i:i + chunksize] for i in range(0, len(data), chunksize))
+        elif isinstance(source, np.ndarray):
+            data = np.atleast_2d(source)
+            source = (data[i:i + chunksize] for i in range(0, len(data), chunksize))
+        
+        for chunk in source:
+            if isinstance(chunk, np.ndarray):
+                chunk = self.array_to_frame(chunk)
+            yield chunk
+    
+    def array_to_frame(self, values):
+        """
+        Convertit un tableau numpy en DataFrame aux colonnes attendues
+        
+        Args:
+            values: Tableau (n_samples, n_features) au format prétraité ou brut
+        """
+        values = np.atleast_2d(values)
+        columns = None
+        if self.preprocessor is not None:
+            # Colonnes au format prétraité ou brut selon la largeur du tableau
+            if values.shape[1] == len(self.preprocessor['feature_names']):
+                columns = self.preprocessor['feature_names']
+            elif self.rolling_features is not None and \
+                    values.shape[1] == len(self.preprocessor['feature_names']) + len(self.rolling_features):
+                columns = self.preprocessor['feature_names'] + self.rolling_features.tolist()
+            elif values.shape[1] == len(self.preprocessor['raw_columns']):
+                columns = self.preprocessor['raw_columns']
+        return pd.DataFrame(values, columns=columns)
+    
+    def predict_stream(self, source, threshold=None, chunksize=10000):
+        """
+        Prédictions bloc par bloc, en mémoire bornée, sur un flux de données
+        
+        Args:
+            source: Chemin d'un CSV, DataFrame, tableau numpy ou itérable de blocs
+            threshold: Seuil de décision personnalisé (optionnel)
+            chunksize: Nombre de lignes par bloc pour les fichiers et gros tableaux
+        
+        Yields:
+            (predictions, probabilities) pour chaque bloc
+        
+        Les compteurs cumulés sont disponibles dans self.stream_stats.
+        """
+        if not self.has_model():
+            logger.error("❌ Aucun modèle disponible pour la prédiction")
+            return
+        
+        self.stream_stats = {'chunks': 0, 'rows': 0, 'defects': 0}
+        for chunk in self._iter_chunks(source, chunksize):
+            # Les colonnes cible éventuelles ne sont pas des features
+            chunk = chunk.drop(columns=[c for c in ('Target', 'Pass/Fail') if c in chunk.columns])
+            with METRICS.span('stream_chunk'):
+                predictions, probabilities = self._score(self.prepare_data(chunk, rolling=self.rolling), threshold)
             
-        except Exception as e:
-            print(f"❌ Erreur lors de la prédiction: {e}")
-            return None, None
+            self.stream_stats['chunks'] += 1
+            self.stream_stats['rows'] += len(predictions)
+            self.stream_stats['defects'] += int(np.sum(predictions == 1))
+            yield predictions, probabilities
+        
+        rows, defects = self.stream_stats['rows'], self.stream_stats['defects']
+        defect_rate = defects / rows * 100 if rows > 0 else 0
+        logger.info(f"📊 Résumé du flux: {rows} lignes en {self.stream_stats['chunks']} blocs, "
+                    f"{defects} défectueux ({defect_rate:.1f}%)")
     
-    def evaluate_performance(self, X_test, y_true):
+    def evaluate_performance(self, X_test, y_true, threshold=None):
         """
         Évalue la performance du modèle sur un jeu de test
         
+        Les probabilités sont calculées une seule fois ; les métriques au seuil de
+        décision et le balayage de tous les seuils en sont déduits par comptage.
+        
         Args:
             X_test: Features de test
             y_true: Labels réels
+            threshold: Seuil évalué (par défaut, celui choisi à l'entraînement)
         
         Returns:
             metrics_dict: Dictionnaire des métriques
         """
-        print("📈 Évaluation des performances...")
+        logger.info("📈 Évaluation des performances...")
         
-        if self.model is None:
-            print("❌ Aucun modèle disponible pour l'évaluation")
+        if not self.has_model():
+            logger.error("❌ Aucun modèle disponible pour l'évaluation")
             return None
         
-        # Faire des prédictions
-        y_pred, _ = self.predict(X_test)
+        if threshold is None:
+            threshold = self.threshold
+        y_true = np.asarray(y_true, dtype=np.int64)
         
-        if y_pred is None:
-            return None
-        
-        # Calculer les métriques
-        accuracy = accuracy_score(y_true, y_pred)
-        precision = precision_score(y_true, y_pred, pos_label=1, zero_division=0)
-        recall = recall_score(y_true, y_pred, pos_label=1, zero_division=0)
-        f1 = f1_score(y_true, y_pred, pos_label=1, zero_division=0)
-        cm = confusion_matrix(y_true, y_pred)
+        # Une seule passe de scoring (sans alimenter le suivi de dérive)
+        prepared_data = self.prepare_data(X_test)
+        with METRICS.span('evaluate'):
+            y_pred, probabilities = self._run_model(prepared_data, threshold)
+            metrics = metrics_from_counts(confusion_counts(y_true, y_pred))
+            sweep = threshold_sweep(y_true, probabilities) if probabilities is not None else None
+        accuracy, precision, recall, f1 = (metrics[k] for k in ('accuracy', 'precision', 'recall', 'f1_score'))
+        cm = metrics['confusion_matrix']
         
         # Afficher les résultats
-        print("\n" + "="*60)
-        print("📊 PERFORMANCES DU MODÈLE")
-        print("="*60)
-        print(f"Accuracy:    {accuracy:.4f}")
-        print(f"Précision:   {precision:.4f}")
-        print(f"Recall:      {recall:.4f}")
-        print(f"F1-score:    {f1:.4f}")
-        
-        print(f"\n📋 Matrice de confusion:")
-        print(f"    | Prédit OK | Prédit Défectueux |")
-        print(f"    |-----------|-------------------|")
-        print(f"Vrai OK | {cm[0,0]:^10} | {cm[0,1]:^17} |")
-        print(f"Vrai Déf| {cm[1,0]:^10} | {cm[1,1]:^17} |")
+        logger.info("\n" + "="*60)
+        logger.info("📊 PERFORMANCES DU MODÈLE")
+        logger.info("="*60)
+        if threshold is not None:
+            logger.info(f"Seuil:       {threshold:.3f}")
+        logger.info(f"Accuracy:    {accuracy:.4f}")
+        logger.info(f"Précision:   {precision:.4f}")
+        logger.info(f"Recall:      {recall:.4f}")
+        logger.info(f"F1-score:    {f1:.4f}")
+        
+        logger.info("\n📋 Matrice de confusion:")
+        logger.info("    | Prédit OK | Prédit Défectueux |")
+        logger.info("    |-----------|-------------------|")
+        logger.info(f"Vrai OK | {cm[0,0]:^10} | {cm[0,1]:^17} |")
+        logger.info(f"Vrai Déf| {cm[1,0]:^10} | {cm[1,1]:^17} |")
+        
+        if sweep is not None:
+            best_f1 = sweep['f1_score'].idxmax()
+            best_cost = sweep['cost'].idxmin()
+            logger.info(f"\n🎯 Balayage des seuils ({len(sweep)} seuils) : meilleur F1 {sweep['f1_score'].max():.4f} "
+                        f"au seuil {best_f1:.3f}, coût minimal {sweep['cost'].min():g} au seuil {best_cost:.3f}")
         
         # Comparer avec les métriques de référence
         if self.metrics:
-            print(f"\n📊 Comparaison avec les métriques d'entraînement:")
-            print(f"    | Entraînement | Test      | Différence |")
-            print(f"    |--------------|-----------|------------|")
-            print(f"Accuracy  | {self.metrics['accuracy']:.4f}     | {accuracy:.4f}  | {accuracy-self.metrics['accuracy']:+.4f}    |")
-            print(f"Precision | {self.metrics['precision']:.4f}     | {precision:.4f}  | {precision-self.metrics['precision']:+.4f}    |")
-            print(f"Recall    | {self.metrics['recall']:.4f}     | {recall:.4f}  | {recall-self.metrics['recall']:+.4f}    |")
-            print(f"F1-score  | {self.metrics['f1_score']:.4f}     | {f1:.4f}  | {f1-self.metrics['f1_score']:+.4f}    |")
+            logger.info("\n📊 Comparaison avec les métriques d'entraînement:")
+            logger.info("    | Entraînement | Test      | Différence |")
+            logger.info("    |--------------|-----------|------------|")
+            logger.info(f"Accuracy  | {self.metrics['accuracy']:.4f}     | {accuracy:.4f}  | {accuracy-self.metrics['accuracy']:+.4f}    |")
+            logger.info(f"Precision | {self.metrics['precision']:.4f}     | {precision:.4f}  | {precision-self.metrics['precision']:+.4f}    |")
+            logger.info(f"Recall    | {self.metrics['recall']:.4f}     | {recall:.4f}  | {recall-self.metrics['recall']:+.4f}    |")
+            logger.info(f"F1-score  | {self.metrics['f1_score']:.4f}     | {f1:.4f}  | {f1-self.metrics['f1_score']:+.4f}    |")
         
         return {
             'accuracy': accuracy,
             'precision': precision,
             'recall': recall,
             'f1_score': f1,
-            'confusion_matrix': cm
+            'confusion_matrix': cm,
+            'threshold': threshold,
+            'sweep': sweep,
         }
 
+def load_registered_model(directory):
+    """
+    Charge une version du registre (src/registry.py) prête à scorer.
+
+    Args:
+        directory: Dossier des artefacts d'une version
+
+    Returns:
+        SemiconductorQualityControl dont le modèle est déjà chargé ; l'état de dérive et la
+        fenêtre glissante sont écrits hors du dossier de la version (voir version_state_dir)
+    """
+    qc = SemiconductorQualityControl(
+        model_path=os.path.join(directory, 'final_model_smote_rf.pkl'),
+        metrics_path=os.path.join(directory, 'final_metrics.pkl'),
+        preprocessor_path=os.path.join(directory, 'preprocessor.pkl'),
+        state_dir=version_state_dir(directory),
+    )
+    # Chargement immédiat : la version n'est activée qu'une fois prête
+    qc.has_model()
+    return qc
+
+
+def score_by_line(registry, frame, lines, threshold=None):
+    """
+    Score un lot dont chaque plaquette est routée vers le modèle de sa ligne.
+
+    Args:
+        registry: ModelRegistry
+        frame: DataFrame brut
+        lines: Ligne de production de chaque plaquette (None : ligne par défaut)
+        threshold: Seuil personnalisé (par défaut, celui de chaque modèle)
+
+    Returns:
+        predictions, probabilities (dans l'ordre de frame), versions servies {ligne: version}
+    """
+    lines = pd.Series(lines, index=frame.index, dtype=object).fillna(registry.default_line)
+    # Tous les groupes sont validés avant qu'une fenêtre glissante n'avance : un lot refusé
+    # (rescoré plaquette par plaquette par le serveur) n'est jamais compté deux fois
+    groups = []
+    for line, rows in lines.groupby(lines, sort=False).indices.items():
+        # Référence prise une fois par groupe : un remplacement à chaud n'affecte pas ce lot
+        route, version, qc = registry.get(line)
+        data = frame.iloc[rows]
+        groups.append((line, rows, f"{route}/{version}", qc, data, qc._align(data)))
+    
+    predictions = np.empty(len(frame), dtype=np.int64)
+    probabilities = np.empty(len(frame), dtype=np.float64)
+    served = {}
+    for line, rows, served_version, qc, data, prepared in groups:
+        if qc.rolling_features is not None:
+            prepared = qc._with_rolling(data, prepared, qc.rolling)
+        preds, probs = qc._score(prepared, threshold)
+        predictions[rows] = preds
+        probabilities[rows] = probs
+        served[line] = served_version
+    return predictions, probabilities, served
+
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+    
     # Test du système de déploiement
     qc_system = SemiconductorQualityControl()
     
     # 1. Charger les données pour le test
     data_path = '../data/secom_preprocessed.csv'
     if os.path.exists(data_path):
-        df = pd.read_csv(data_path)
+        df = load_csv(data_path)
         X = df.drop('Target', axis=1)
-        y = df['Target']
+        y = df['Target'].astype(int)
         
         # Simuler l'arrivée de nouvelles données (5 premières lignes)
-        print("\n--- TEST: Simulation de nouvelles données ---")
+        logger.info("\n--- TEST: Simulation de nouvelles données ---")
         new_samples = X.head(5)
         predictions, probs = qc_system.predict(new_samples)
         
         # Affichage détaillé
         for i, (pred, prob) in enumerate(zip(predictions, probs)):
             status = "DÉFECTUEUX ❌" if pred == 1 else "OK ✅"
-            print(f"Échantillon {i+1} : {status} (Probabilité: {prob:.4f})")
+            logger.info(f"Échantillon {i+1} : {status} (Probabilité: {prob:.4f})")
             
         # 2. Évaluer les performances globales
-        print("\n--- TEST: Évaluation globale du modèle ---")
+        logger.info("\n--- TEST: Évaluation globale du modèle ---")
         qc_system.evaluate_performance(X, y)
     else:
-        print(f"❌ Erreur: Fichier de données {data_path} non trouvé.")
+        logger.error(f"❌ Erreur: Fichier de données {data_path} non trouvé.")
@@ -0,0 +1,373 @@
+# scoring_server.py
+import asyncio
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from deployment import load_registered_model, score_by_line
+from src.instrumentation import METRICS
+from src.registry import ModelRegistry, publish_model
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Regroupe les requêtes unitaires en micro-lots pour un scoring vectorisé.
+
+    Un lot est envoyé dès qu'il atteint `max_batch_size` requêtes ou que la plus
+    ancienne attend depuis `max_delay_ms`. Le scoring s'exécute dans un thread pour ne
+    pas bloquer la boucle asyncio, puis chaque appelant reçoit sa propre ligne.
+    Les plaquettes d'un lot sont routées vers le modèle de leur ligne de production.
+    """
+
+    def __init__(self, registry, max_batch_size=64, max_delay_ms=5.0, threshold=None):
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.threshold = threshold
+        self.queue = asyncio.Queue()
+        # Un seul worker : les lots sont traités dans l'ordre d'arrivée
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.stats = {
+            'requests': 0,
+            'batches': 0,
+            'errors': 0,
+            'max_batch_size': 0,
+            'batch_size_counts': {},
+            'total_batch_latency_ms': 0.0,
+        }
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, record, line=None):
+        """
+        Ajoute une plaquette à la file et attend son résultat.
+
+        Args:
+            record: Dictionnaire {capteur: valeur} ou liste de valeurs
+            line: Ligne de production (None : ligne par défaut)
+
+        Returns:
+            (prédiction, probabilité, modèle servi)
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((record, line, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Attendre la première requête, puis compléter le lot jusqu'à l'échéance
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            records = [record for record, _, _ in batch]
+            lines = [line for _, line, _ in batch]
+            futures = [future for _, _, future in batch]
+            start = time.perf_counter()
+            try:
+                predictions, probabilities, served = await loop.run_in_executor(
+                    self.executor, self._score, records, lines)
+            except ValueError as e:
+                if len(batch) == 1:
+                    self._fail(futures, e)
+                    continue
+                # Donnée invalide dans le lot : chaque plaquette est rescorée seule,
+                # seules les fautives reçoivent l'erreur
+                for record, line, future in batch:
+                    try:
+                        result = await loop.run_in_executor(self.executor, self._score, [record], [line])
+                    except Exception as e:
+                        self._fail([future], e)
+                    else:
+                        self._resolve([future], [line], *result)
+                continue
+            except Exception as e:
+                self._fail(futures, e)
+                continue
+
+            self._record_batch(len(batch), (time.perf_counter() - start) * 1000)
+            self._resolve(futures, lines, predictions, probabilities, served)
+
+    def _resolve(self, futures, lines, predictions, probabilities, served):
+        for i, future in enumerate(futures):
+            if not future.done():
+                line = lines[i] or self.registry.default_line
+                future.set_result((int(predictions[i]), float(probabilities[i]), served[line]))
+
+    def _fail(self, futures, error):
+        self.stats['errors'] += 1
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+
+    def _score(self, records, lines):
+        """Scoring vectorisé d'un micro-lot (exécuté dans le thread de travail)."""
+        if isinstance(records[0], dict):
+            frame = pd.DataFrame.from_records(records)
+            if any(len(record) != frame.shape[1] for record in records):
+                # Un champ absent d'une requête n'est pas une valeur manquante : validation unitaire
+                raise ValueError("Champs différents d'une plaquette à l'autre dans le lot")
+        else:
+            _, _, qc = self.registry.get()
+            frame = qc.array_to_frame(np.asarray(records, dtype=np.float64))
+        return score_by_line(self.registry, frame, lines, self.threshold)
+
+    def _record_batch(self, size, latency_ms):
+        stats = self.stats
+        stats['requests'] += size
+        stats['batches'] += 1
+        stats['max_batch_size'] = max(stats['max_batch_size'], size)
+        stats['batch_size_counts'][size] = stats['batch_size_counts'].get(size, 0) + 1
+        stats['total_batch_latency_ms'] += latency_ms
+
+    def snapshot(self):
+        """Statistiques courantes : profondeur de file et tailles de lots."""
+        stats = self.stats
+        batches = max(stats['batches'], 1)
+        return {
+            'queue_depth': self.queue.qsize(),
+            'requests': stats['requests'],
+            'batches': stats['batches'],
+            'errors': stats['errors'],
+            'mean_batch_size': stats['requests'] / batches,
+            'max_batch_size': stats['max_batch_size'],
+            'batch_size_counts': {str(k): v for k, v in sorted(stats['batch_size_counts'].items())},
+            'mean_batch_latency_ms': stats['total_batch_latency_ms'] / batches,
+        }
+
+
+class ScoringServer:
+    """
+    Serveur HTTP/1.1 minimal (asyncio) autour du registre des modèles.
+
+    Routes :
+        POST /predict  {"features": {...} ou [...], "line": "L1"} -> {"prediction", "probability", "model"}
+                       (sans "line" : ligne par défaut)
+        GET  /models   versions actives et cache des modèles
+        GET  /stats    statistiques du micro-batching
+        GET  /metrics  métriques du pipeline (Prometheus ; ?format=json pour du JSON)
+        GET  /health   état du serveur
+    """
+
+    def __init__(self, registry, host='127.0.0.1', port=8765, max_batch_size=64, max_delay_ms=5.0, threshold=None):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self.batcher = MicroBatcher(registry, max_batch_size, max_delay_ms, threshold)
+        self._server = None
+
+    async def start(self):
+        self.batcher.start()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"🚀 Serveur de scoring à l'écoute sur http://{self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.batcher.stop()
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _handle_connection(self, reader, writer):
+        # Connexions persistantes : plusieurs requêtes par connexion
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                status, payload = await self._route(method, path, body)
+                if isinstance(payload, str):
+                    data, content_type = payload.encode(), 'text/plain; version=0.0.4'
+                else:
+                    data, content_type = json.dumps(payload).encode(), 'application/json'
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        if method == 'GET' and path == '/health':
+            return '200 OK', {'status': 'ok'}
+        if method == 'GET' and path == '/models':
+            return '200 OK', self.registry.snapshot()
+        if method == 'GET' and path == '/stats':
+            return '200 OK', self.batcher.snapshot()
+        if method == 'GET' and path == '/metrics?format=json':
+            return '200 OK', METRICS.snapshot()
+        if method == 'GET' and path == '/metrics':
+            return '200 OK', METRICS.to_prometheus()
+        if method == 'POST' and path == '/predict':
+            try:
+                request = json.loads(body)
+                record, line = request['features'], request.get('line')
+            except (ValueError, KeyError, TypeError, AttributeError):
+                return '400 Bad Request', {'error': "Corps JSON attendu : {\"features\": ..., \"line\": ...}"}
+            try:
+                prediction, probability, model = await self.batcher.submit(record, line)
+            except ValueError as e:
+                return '400 Bad Request', {'error': str(e)}
+            except Exception as e:
+                return '500 Internal Server Error', {'error': str(e)}
+            return '200 OK', {'prediction': prediction, 'probability': probability, 'model': model}
+        return '404 Not Found', {'error': f"Route inconnue : {method} {path}"}
+
+
+async def run_load_test(host, port, records, n_requests=2000, concurrency=64):
+    """
+    Générateur de charge local : `concurrency` clients persistants envoient
+    chacun des requêtes unitaires en boucle.
+
+    Returns:
+        Dictionnaire (débit, latences p50/p99 en ms)
+    """
+    latencies = []
+    counter = iter(range(n_requests))
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for i in counter:
+                body = json.dumps({'features': records[i % len(records)]}).encode()
+                start = time.perf_counter()
+                writer.write(
+                    f"POST /predict HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+                await reader.readline()
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    if line.lower().startswith(b'content-length:'):
+                        length = int(line.split(b':')[1])
+                await reader.readexactly(length)
+                latencies.append((time.perf_counter() - start) * 1000)
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': len(latencies),
+        'throughput_rps': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+    }
+
+
+def _isolated_registry(work_dir, memory_budget_mb):
+    """
+    Registre temporaire contenant une copie du modèle actif de la ligne par défaut : le
+    banc d'essai n'écrit ni dans l'état de dérive ni dans la fenêtre glissante de production.
+    """
+    production = ModelRegistry(load_registered_model)
+    version, directory = production._pointer(production.default_line)
+    if version is None:
+        raise SystemExit("❌ Aucun modèle disponible pour le scoring")
+    registry_dir = os.path.join(work_dir, 'registry')
+    publish_model(directory, production.default_line, registry_dir, note=f"banc d'essai ({version})")
+    return ModelRegistry(load_registered_model, registry_dir, memory_budget_mb, fallback_dir=work_dir)
+
+
+async def _benchmark(args):
+    """Démarre le serveur en local sur une copie isolée du modèle, le charge puis affiche les statistiques."""
+    with tempfile.TemporaryDirectory(prefix='scqc-bench-') as work_dir:
+        registry = _isolated_registry(work_dir, args.memory_budget_mb)
+        _, _, qc = registry.get()
+        server = ScoringServer(registry, args.host, 0, args.max_batch_size, args.max_delay_ms)
+        await server.start()
+
+        if qc.preprocessor is not None:
+            n_features = len(qc.preprocessor['feature_names'])
+        else:
+            n_features = qc.engine.n_features
+        records = np.random.default_rng(0).normal(size=(256, n_features)).tolist()
+
+        result = await run_load_test(args.host, server.port, records, args.requests, args.concurrency)
+        logger.info(f"📈 {result['requests']} requêtes : {result['throughput_rps']:.0f} req/s, "
+                    f"p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms")
+        logger.info(f"📊 Micro-batching : {json.dumps(server.batcher.snapshot())}")
+        await server.stop()
+        # Plus aucune sauvegarde d'état à la sortie : le dossier temporaire va être supprimé
+        qc.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur de scoring asyncio avec micro-batching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-delay-ms", type=float, default=5.0)
+    parser.add_argument("--bench", action="store_true", help="Lance un test de charge local")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--memory-budget-mb", type=float, default=1024,
+                        help="Budget mémoire du cache des modèles (toutes lignes confondues)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+
+    if args.bench:
+        asyncio.run(_benchmark(args))
+    else:
+        registry = ModelRegistry(load_registered_model, memory_budget_mb=args.memory_budget_mb)
+        try:
+            registry.get()
+        except LookupError:
+            raise SystemExit("❌ Aucun modèle disponible pour le scoring")
+        server = ScoringServer(registry, args.host, args.port, args.max_batch_size, args.max_delay_ms)
+        asyncio.run(server.serve_forever())
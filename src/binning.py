@@ -0,0 +1,103 @@
+import numpy as np
+import os
+
+BIN_EDGES_PATH = 'results/bin_edges.npz'
+
+# 254 classes de valeurs + 1 code réservé aux valeurs manquantes : au plus 255 valeurs
+# distinctes par capteur, soit exactement max_bins pour HistGradientBoostingClassifier
+N_BINS = 254
+MISSING_BIN = 255
+
+# Au-delà de ce nombre de comparaisons, discrétisation capteur par capteur (searchsorted)
+_BROADCAST_LIMIT = 1 << 22
+
+
+def fit_bin_edges(X, n_bins=N_BINS, subsample=200000, random_state=42):
+    """
+    Bornes de discrétisation par capteur, calculées une seule fois.
+
+    Un capteur qui prend au plus n_bins valeurs distinctes reçoit une borne entre
+    chaque paire de valeurs consécutives (discrétisation sans perte) ; sinon les
+    bornes sont ses quantiles.
+
+    Args:
+        X: Données d'entraînement (n_samples, n_features)
+        n_bins: Nombre maximal de classes par capteur (<= 255)
+        subsample: Lignes tirées pour estimer les quantiles sur un gros historique
+        random_state: Graine du sous-échantillonnage
+
+    Returns:
+        Tableau (n_features, n_bins - 1) des bornes croissantes, complété par +inf
+    """
+    if not 2 <= n_bins <= MISSING_BIN:
+        raise ValueError(f"n_bins doit être compris entre 2 et {MISSING_BIN}, reçu {n_bins}")
+    values = np.asarray(X, dtype=np.float64)
+    if subsample and len(values) > subsample:
+        rows = np.random.default_rng(random_state).choice(len(values), subsample, replace=False)
+        values = values[np.sort(rows)]
+
+    edges = np.full((values.shape[1], n_bins - 1), np.inf)
+    quantiles = np.linspace(0, 1, n_bins + 1)[1:-1]
+    for j in range(values.shape[1]):
+        column = values[:, j]
+        column = column[~np.isnan(column)]
+        distinct = np.unique(column)
+        if len(distinct) <= n_bins:
+            cuts = (distinct[:-1] + distinct[1:]) / 2
+        else:
+            cuts = np.unique(np.quantile(column, quantiles))
+        edges[j, :len(cuts)] = cuts
+    return edges
+
+
+def transform_bins(edges, X):
+    """
+    Codes uint8 des capteurs : nombre de bornes inférieures ou égales à la valeur,
+    MISSING_BIN pour une valeur manquante.
+
+    Args:
+        edges: Bornes retournées par fit_bin_edges
+        X: Données (n_samples, n_features), dans l'ordre des capteurs de edges
+
+    Returns:
+        Tableau uint8 (n_samples, n_features)
+    """
+    values = np.asarray(X, dtype=np.float64)
+    if values.ndim != 2 or values.shape[1] != edges.shape[0]:
+        raise ValueError(f"{edges.shape[0]} features attendues, forme reçue {values.shape}")
+
+    if values.size * edges.shape[1] <= _BROADCAST_LIMIT:
+        # Petits lots (scoring en ligne) : une comparaison diffusée sur toutes les bornes
+        codes = (values[:, :, None] >= edges[None, :, :]).sum(axis=2).astype(np.uint8)
+    else:
+        codes = np.empty(values.shape, dtype=np.uint8)
+        for j in range(values.shape[1]):
+            codes[:, j] = np.searchsorted(edges[j], values[:, j], side='right')
+    codes[np.isnan(values)] = MISSING_BIN
+    return codes
+
+
+def save_bin_edges(edges, feature_names=None, path=BIN_EDGES_PATH):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    arrays = {'edges': edges}
+    if feature_names is not None:
+        arrays['feature_names'] = np.asarray(feature_names, dtype=str)
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_bin_edges(path=BIN_EDGES_PATH):
+    """
+    Returns:
+        Dictionnaire (edges, feature_names), ou None si le modèle n'est pas discrétisé
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {
+            'edges': data['edges'],
+            'feature_names': list(data['feature_names']) if 'feature_names' in data.files else None,
+        }
@@ -0,0 +1,142 @@
+import numpy as np
+import argparse
+import logging
+import os
+import sys
+import time
+
+# Permet l'exécution directe du script (python src/confidence.py)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+logger = logging.getLogger(__name__)
+
+METRIC_NAMES = ('accuracy', 'precision', 'recall', 'f1_score')
+
+
+def bootstrap_counts(y_true, y_pred, n_resamples=2000, random_state=42, block_size=500):
+    """
+    Matrices de confusion de n_resamples rééchantillonnages bootstrap du set de test.
+
+    Chaque plaquette est codée par sa case de la matrice de confusion (2 * réel + prédit) ;
+    un bloc de rééchantillonnages est une matrice d'indices (bloc, n_samples) et ses
+    comptes sont obtenus par un seul bincount, sans boucle par rééchantillonnage.
+
+    Args:
+        y_true: Labels réels (0: OK, 1: Défectueux)
+        y_pred: Prédictions
+        n_resamples: Nombre de rééchantillonnages
+        random_state: Graine
+        block_size: Rééchantillonnages traités ensemble (borne la mémoire des indices)
+
+    Returns:
+        Tableau (n_resamples, 4) des comptes VN, FP, FN, VP
+    """
+    cells = 2 * np.asarray(y_true, dtype=np.int64) + np.asarray(y_pred, dtype=np.int64)
+    n_samples = len(cells)
+    rng = np.random.default_rng(random_state)
+    counts = np.empty((n_resamples, 4), dtype=np.int64)
+    for start in range(0, n_resamples, block_size):
+        n_block = min(block_size, n_resamples - start)
+        idx = rng.integers(0, n_samples, size=(n_block, n_samples))
+        # Indice plat (rééchantillonnage, case) pour un seul bincount par bloc
+        flat = cells[idx] + 4 * np.arange(n_block)[:, None]
+        counts[start:start + n_block] = np.bincount(flat.ravel(), minlength=4 * n_block).reshape(n_block, 4)
+    return counts
+
+
+def metrics_from_count_matrix(counts):
+    """
+    Accuracy, précision, rappel et F1 pour chaque ligne d'un tableau (n, 4) de comptes.
+
+    Un ratio non défini (aucune prédiction ou aucun défaut tiré) vaut 0, comme dans
+    metrics_from_counts.
+    """
+    tn, fp, fn, tp = (counts[:, i].astype(np.float64) for i in range(4))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'accuracy': (tp + tn) / counts.sum(axis=1),
+            'precision': np.where(tp + fp > 0, tp / (tp + fp), 0.0),
+            'recall': np.where(tp + fn > 0, tp / (tp + fn), 0.0),
+            'f1_score': np.where(tp > 0, 2 * tp / (2 * tp + fp + fn), 0.0),
+        }
+
+
+def bootstrap_intervals(y_true, y_pred, n_resamples=2000, confidence=0.95, random_state=42):
+    """
+    Intervalles de confiance bootstrap (percentiles) des métriques de test.
+
+    Args:
+        y_true: Labels réels
+        y_pred: Prédictions
+        n_resamples: Nombre de rééchantillonnages
+        confidence: Niveau de confiance
+        random_state: Graine
+
+    Returns:
+        Dictionnaire {métrique: (borne basse, borne haute)}, plus 'confidence' et 'n_resamples'
+    """
+    resampled = metrics_from_count_matrix(bootstrap_counts(y_true, y_pred, n_resamples, random_state))
+    alpha = (1 - confidence) / 2
+    intervals = {}
+    for name in METRIC_NAMES:
+        low, high = np.quantile(resampled[name], [alpha, 1 - alpha])
+        intervals[name] = (float(low), float(high))
+    intervals['confidence'] = confidence
+    intervals['n_resamples'] = n_resamples
+    return intervals
+
+
+if __name__ == "__main__":
+    import joblib
+    sys.path.insert(0, os.path.join(ROOT_DIR, 'notebooks'))
+    from deployment import SemiconductorQualityControl
+    from src.thresholds import confusion_counts, metrics_from_counts
+
+    parser = argparse.ArgumentParser(description="Intervalles de confiance bootstrap des métriques de test")
+    parser.add_argument("--model", default="results/final_model_smote_rf.pkl")
+    parser.add_argument("--test", default="results/test_dataset.pkl")
+    parser.add_argument("--metrics", default="results/final_metrics.pkl",
+                        help="Métriques à compléter avec les intervalles")
+    parser.add_argument("--resamples", type=int, default=2000)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+
+    if not all(os.path.exists(p) for p in (args.model, args.test, args.metrics)):
+        raise SystemExit("❌ Modèle, set de test ou métriques introuvables. Lancez d'abord src/training.py.")
+
+    # Même chemin de scoring qu'en production : discrétisation binned_hgb et forêt compilée
+    qc = SemiconductorQualityControl(model_path=args.model, metrics_path=args.metrics,
+                                     preprocessor_path=os.path.join(os.path.dirname(args.model), 'preprocessor.pkl'))
+    X_test, y_test = joblib.load(args.test)
+    prepared = qc.prepare_data(X_test)
+    metrics = joblib.load(args.metrics)
+
+    # Au seuil par défaut puis au point de fonctionnement : estimations ponctuelles et
+    # intervalles sont tirés des mêmes prédictions et enregistrés côte à côte
+    thresholds = [(None, 'confidence_intervals')]
+    if qc.threshold is not None:
+        thresholds.append((qc.threshold, 'operating_point_intervals'))
+    for threshold, key in thresholds:
+        y_pred, _ = qc._run_model(prepared, threshold)
+        point = metrics_from_counts(confusion_counts(y_test, y_pred))
+
+        start = time.perf_counter()
+        intervals = bootstrap_intervals(y_test, y_pred, args.resamples, args.confidence)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        if threshold is None:
+            metrics.update(point)
+        else:
+            metrics['operating_point'] = dict(point, threshold=threshold)
+        metrics[key] = intervals
+
+        seuil = f"seuil {threshold:.3f}" if threshold is not None else "seuil par défaut"
+        logger.info(f"✅ {args.resamples} rééchantillonnages de {len(y_test)} plaquettes en {elapsed_ms:.1f} ms ({seuil})")
+        for name in METRIC_NAMES:
+            low, high = intervals[name]
+            logger.info(f"   {name:<10}: {point[name]:.4f}  IC {args.confidence:.0%} [{low:.4f} ; {high:.4f}]")
+
+    joblib.dump(metrics, args.metrics)
@@ -0,0 +1,188 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+
+CACHE_VERSION = 2
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Empreinte SHA-256 du contenu d'un fichier, lu par blocs."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_dir_for(csv_path, cache_dir=None):
+    """Dossier de cache associé à un CSV (par défaut data/.cache/<nom>)."""
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(csv_path)), '.cache')
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir, name)
+
+
+def _read_meta(directory):
+    meta_path = os.path.join(directory, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    return meta if meta.get('version') == CACHE_VERSION else None
+
+
+def _source_stat(csv_path):
+    """Signature rapide du CSV : taille, dates de modification et de changement, inode."""
+    stat = os.stat(csv_path)
+    return {'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns,
+            'source_ctime_ns': stat.st_ctime_ns, 'source_inode': stat.st_ino}
+
+
+def _write_meta(directory, meta):
+    """meta.json remplacé de façon atomique."""
+    meta_path = os.path.join(directory, 'meta.json')
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + '.tmp', meta_path)
+
+
+def _is_fresh(meta, directory, csv_path, check_hash):
+    """
+    Le cache est valide si l'empreinte du CSV source n'a pas changé.
+
+    La signature rapide (taille, mtime, ctime, inode) sert de raccourci : le contenu
+    est re-haché dès qu'un de ces champs diffère (ou si check_hash est demandé). Une
+    copie qui conserve la date de modification (cp -p, rsync) change ctime ou inode et
+    n'échappe donc pas à la comparaison du SHA-256.
+    """
+    current = _source_stat(csv_path)
+    if meta['source_size'] != current['source_size']:
+        return False
+    if not check_hash and all(meta[key] == value for key, value in current.items()):
+        return True
+    if meta['source_sha256'] != file_sha256(csv_path):
+        return False
+    # Même contenu : la nouvelle signature évite de re-hacher au prochain chargement
+    if any(meta[key] != value for key, value in current.items()):
+        _write_meta(directory, dict(meta, **current))
+    return True
+
+
+def build_cache(csv_path, cache_dir=None):
+    """
+    Convertit un CSV en cache binaire colonnaire.
+
+    Les colonnes numériques sont stockées dans une matrice float32 en ordre Fortran
+    (chaque colonne est contiguë) ; les colonnes texte (Time, Phase...) sont stockées
+    à part. Le cache est écrit dans un dossier temporaire puis renommé : un lecteur
+    concurrent (application, entraînement) ne voit jamais un cache à moitié écrit.
+
+    Returns:
+        directory: Dossier du cache
+    """
+    directory = _cache_dir_for(csv_path, cache_dir)
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = os.path.join(parent, f'.tmp-{uuid.uuid4().hex[:8]}')
+    os.makedirs(tmp_dir)
+
+    try:
+        # Signature relevée avant la lecture : une réécriture pendant la construction
+        # sera détectée au prochain chargement
+        source = _source_stat(csv_path)
+        sha256 = file_sha256(csv_path)
+        df = pd.read_csv(csv_path)
+
+        numeric_columns = [c for c in df.columns if df[c].dtype.kind in 'biuf']
+        text_columns = [c for c in df.columns if c not in set(numeric_columns)]
+
+        numeric = np.asfortranarray(df[numeric_columns].to_numpy(dtype=np.float32))
+        np.save(os.path.join(tmp_dir, 'numeric.npy'), numeric)
+        for i, col in enumerate(text_columns):
+            values = df[col].astype(str).where(df[col].notna(), '').to_numpy().astype(str)
+            np.save(os.path.join(tmp_dir, f'text_{i}.npy'), values)
+
+        meta = {
+            'version': CACHE_VERSION,
+            'source_path': os.path.abspath(csv_path),
+            **source,
+            'source_sha256': sha256,
+            'columns': [str(c) for c in df.columns],
+            'numeric_columns': [str(c) for c in numeric_columns],
+            'text_columns': [str(c) for c in text_columns],
+            'shape': list(df.shape),
+        }
+        _write_meta(tmp_dir, meta)
+
+        # L'ancien cache est écarté puis remplacé ; les lecteurs qui l'ont déjà ouvert
+        # (memory-map) gardent leurs fichiers jusqu'à la fermeture
+        old_dir = None
+        if os.path.exists(directory):
+            old_dir = os.path.join(parent, f'.old-{uuid.uuid4().hex[:8]}')
+            try:
+                os.rename(directory, old_dir)
+            except FileNotFoundError:
+                old_dir = None
+        try:
+            os.replace(tmp_dir, directory)
+        except OSError:
+            # Un autre processus a publié son cache entre-temps : il est tout aussi valide
+            if not os.path.exists(directory):
+                raise
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return directory
+
+
+def load_csv(csv_path, cache_dir=None, mmap=True, check_hash=False):
+    """
+    Charge un CSV SECOM via son cache binaire, reconstruit si le contenu a changé.
+
+    Args:
+        csv_path: Chemin du CSV source
+        cache_dir: Dossier racine du cache (par défaut <dossier du CSV>/.cache)
+        mmap: Si True, les données numériques sont projetées en mémoire (lecture seule, sans copie)
+        check_hash: Si True, le contenu du CSV est toujours re-haché
+
+    Returns:
+        DataFrame (colonnes numériques en float32)
+    """
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"Le fichier {csv_path} est introuvable.")
+
+    directory = _cache_dir_for(csv_path, cache_dir)
+    meta = _read_meta(directory)
+    if meta is None or not _is_fresh(meta, directory, csv_path, check_hash):
+        logger.info(f"🗄️  Construction du cache binaire pour {csv_path}...")
+        directory = build_cache(csv_path, cache_dir)
+        meta = _read_meta(directory)
+
+    df = _load_cache(directory, meta, mmap)
+    current = _read_meta(directory)
+    if current is None or current['source_sha256'] != meta['source_sha256']:
+        # Cache remplacé par un autre processus pendant la lecture : on relit le nouveau
+        return load_csv(csv_path, cache_dir, mmap, check_hash)
+    return df
+
+
+def _load_cache(directory, meta, mmap):
+    numeric = np.load(os.path.join(directory, 'numeric.npy'), mmap_mode='r' if mmap else None)
+    df = pd.DataFrame(numeric, columns=meta['numeric_columns'], copy=False)
+
+    # Réinsertion des colonnes texte à leur position d'origine
+    positions = {col: i for i, col in enumerate(meta['columns'])}
+    for i, col in enumerate(meta['text_columns']):
+        values = np.load(os.path.join(directory, f'text_{i}.npy'))
+        df.insert(positions[col], col, pd.Series(values).replace('', np.nan))
+    return df
@@ -0,0 +1,394 @@
+import pandas as pd
+import numpy as np
+import contextlib
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import joblib
+
+# Permet l'exécution directe du script (python src/evaluation.py)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, 'notebooks')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from src.preprocessing import load_and_preprocess
+from src.resampling import cached_smote_resample, smote_resample
+
+logger = logging.getLogger(__name__)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Indicateurs pour lesquels une valeur plus grande est une régression
+LOWER_IS_BETTER = ('seconds', 'p50_ms', 'p99_ms', 'peak_rss_mb', 'peak_alloc_mb')
+HIGHER_IS_BETTER = ('throughput_rows_s',)
+
+
+def make_synthetic_secom(n_rows=1567, n_sensors=590, fail_rate=0.066, seed=42):
+    """
+    Génère un jeu de données au format brut SECOM (Time, capteurs, Pass/Fail).
+
+    Les motifs de valeurs manquantes imitent le dataset réel : quelques capteurs
+    presque toujours vides, des groupes de capteurs hors ligne ensemble sur certaines
+    plaquettes et des trous isolés. Une partie des capteurs est constante.
+
+    Args:
+        n_rows: Nombre de plaquettes
+        n_sensors: Nombre de capteurs
+        fail_rate: Proportion de plaquettes défectueuses
+        seed: Graine aléatoire
+
+    Returns:
+        DataFrame au format de uci-secom.csv
+    """
+    rng = np.random.default_rng(seed)
+    y = (rng.random(n_rows) < fail_rate).astype(int)
+
+    scale = rng.lognormal(mean=1.0, sigma=2.0, size=n_sensors)
+    offset = rng.normal(0, 100, size=n_sensors)
+    X = rng.normal(size=(n_rows, n_sensors)) * scale + offset
+
+    # Une vingtaine de capteurs informatifs décalés sur les défauts
+    informative = rng.choice(n_sensors, size=min(20, n_sensors), replace=False)
+    X[np.ix_(y == 1, informative)] += rng.normal(1.0, 0.3, size=len(informative)) * scale[informative]
+
+    # Capteurs constants (~20%)
+    constant = rng.random(n_sensors) < 0.2
+    X[:, constant] = offset[constant]
+
+    # Valeurs manquantes : trous isolés, groupes hors ligne, capteurs presque vides
+    X[rng.random(X.shape) < 0.01] = np.nan
+    for start in rng.choice(n_sensors, size=max(1, n_sensors // 60), replace=False):
+        group = slice(start, min(start + 8, n_sensors))
+        X[rng.random(n_rows) < 0.05, group] = np.nan
+    mostly_empty = rng.choice(n_sensors, size=max(1, n_sensors // 25), replace=False)
+    X[np.ix_(rng.random(n_rows) < 0.9, mostly_empty)] = np.nan
+
+    df = pd.DataFrame(X, columns=[str(i) for i in range(n_sensors)])
+    df.insert(0, 'Time', pd.date_range('2008-07-19', periods=n_rows, freq='37min').strftime('%Y-%m-%d %H:%M:%S'))
+    df['Pass/Fail'] = np.where(y == 1, 1, -1)
+    return df
+
+
+def _peak_rss_mb():
+    """Pic de mémoire résidente du processus (Mo), ou None si indisponible."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en kilo-octets sous Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Coupe les logs de progression des fonctions mesurées (hors avertissements)."""
+    previous = logging.root.manager.disable
+    logging.disable(logging.INFO)
+    try:
+        yield
+    finally:
+        logging.disable(previous)
+
+
+def _time_stage(func, n_rows, repeats=1, trace_memory=False):
+    """
+    Chronomètre une étape et retourne (résultat, mesures).
+
+    Avec trace_memory, le pic d'allocation propre à l'étape est mesuré par tracemalloc
+    (le pic RSS du processus, lui, ne fait que croître d'une étape à l'autre).
+    """
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        with _quiet():
+            result = func()
+        durations.append(time.perf_counter() - start)
+
+    # Passe séparée : tracemalloc ralentit les allocations et fausserait la durée
+    peak_alloc = None
+    if trace_memory:
+        tracemalloc.start()
+        with _quiet():
+            func()
+        peak_alloc = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    seconds = float(np.median(durations))
+    metrics = {
+        'seconds': seconds,
+        'throughput_rows_s': n_rows / seconds if seconds > 0 else None,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+    if trace_memory:
+        metrics['peak_alloc_mb'] = peak_alloc
+    return result, metrics
+
+
+def _latency_stage(func, batches, n_rows):
+    """Mesure les latences unitaires (p50/p99) d'une étape sur une série de lots."""
+    latencies = []
+    with _quiet():
+        for batch in batches:
+            start = time.perf_counter()
+            func(batch)
+            latencies.append(time.perf_counter() - start)
+    total = sum(latencies)
+    return {
+        'seconds': total,
+        'throughput_rows_s': n_rows / total if total > 0 else None,
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def run_benchmarks(n_rows=1567, n_sensors=590, n_latency_samples=200, seed=42, work_dir=None):
+    """
+    Chronomètre séparément chaque étape du pipeline sur des données synthétiques.
+
+    Étapes : load_and_preprocess, SMOTE (imblearn, étape float32 et reprise du cache),
+    entraînement de la forêt, prepare_data et predict (latence unitaire par plaquette
+    et débit sur le lot complet).
+
+    Args:
+        n_rows: Nombre de plaquettes synthétiques
+        n_sensors: Nombre de capteurs
+        n_latency_samples: Nombre d'appels unitaires pour les latences p50/p99
+        seed: Graine aléatoire
+        work_dir: Dossier de travail (temporaire par défaut)
+
+    Returns:
+        Dictionnaire des résultats (sérialisable en JSON)
+    """
+    from imblearn.over_sampling import SMOTE
+    from sklearn.ensemble import RandomForestClassifier
+    from deployment import SemiconductorQualityControl
+
+    temp = None
+    if work_dir is None:
+        temp = tempfile.TemporaryDirectory()
+        work_dir = temp.name
+
+    stages = {}
+    raw_path = os.path.join(work_dir, 'secom_synthetic.csv')
+    preprocessor_path = os.path.join(work_dir, 'preprocessor.pkl')
+    model_path = os.path.join(work_dir, 'model.pkl')
+    make_synthetic_secom(n_rows, n_sensors, seed=seed).to_csv(raw_path, index=False)
+
+    # 1. Prétraitement (lecture comprise)
+    df, stages['load_and_preprocess'] = _time_stage(
+        lambda: load_and_preprocess(raw_path, preprocessor_path=preprocessor_path), n_rows)
+    X, y = df.drop('Target', axis=1), df['Target']
+
+    # 2. Rééquilibrage : imblearn (référence), étape float32 par blocs, puis reprise du cache
+    _, stages['smote'] = _time_stage(
+        lambda: SMOTE(random_state=seed).fit_resample(X, y), n_rows, trace_memory=True)
+    _, stages['smote_fast'] = _time_stage(
+        lambda: smote_resample(X, y, random_state=seed), n_rows, trace_memory=True)
+    smote_cache = os.path.join(work_dir, 'smote_cache')
+    with _quiet():
+        cached_smote_resample(X, y, random_state=seed, cache_dir=smote_cache)
+    (X_res, y_res), stages['smote_cached'] = _time_stage(
+        lambda: cached_smote_resample(X, y, random_state=seed, cache_dir=smote_cache), n_rows, trace_memory=True)
+
+    # 3. Entraînement de la forêt
+    model, stages['forest_fit'] = _time_stage(
+        lambda: RandomForestClassifier(n_estimators=100, random_state=seed, n_jobs=-1).fit(X_res, y_res),
+        len(y_res))
+    joblib.dump(model, model_path)
+
+    with _quiet():
+        qc = SemiconductorQualityControl(model_path=model_path,
+                                         metrics_path=os.path.join(work_dir, 'absent.pkl'),
+                                         preprocessor_path=preprocessor_path)
+
+    # 4-5. Préparation et prédiction : latence par plaquette puis débit sur le lot
+    raw = pd.read_csv(raw_path).drop(columns=['Pass/Fail'])
+    rng = np.random.default_rng(seed)
+    singles = [raw.iloc[[i]] for i in rng.integers(0, len(raw), n_latency_samples)]
+
+    stages['prepare_data'] = _latency_stage(qc.prepare_data, singles, n_latency_samples)
+    _, batch = _time_stage(lambda: qc.prepare_data(raw), n_rows)
+    stages['prepare_data']['batch_throughput_rows_s'] = batch['throughput_rows_s']
+
+    stages['predict'] = _latency_stage(qc.predict, singles, n_latency_samples)
+    _, batch = _time_stage(lambda: qc.predict(raw), n_rows)
+    stages['predict']['batch_throughput_rows_s'] = batch['throughput_rows_s']
+
+    if temp is not None:
+        temp.cleanup()
+
+    return {
+        'meta': {
+            'n_rows': n_rows,
+            'n_sensors': n_sensors,
+            'n_features': X.shape[1],
+            'seed': seed,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'cpu_count': os.cpu_count(),
+        },
+        'stages': stages,
+    }
+
+
+_COLD_START_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {notebooks!r})
+# Processus neuf sans handler de logging : seul le JSON final est écrit sur stdout
+import numpy as np
+from deployment import SemiconductorQualityControl
+imported = time.perf_counter()
+qc = SemiconductorQualityControl(model_path={model_path!r}, metrics_path={metrics_path!r},
+                                 preprocessor_path={preprocessor_path!r}, compiled_path={compiled_path!r})
+initialized = time.perf_counter()
+if qc.preprocessor is not None:
+    n_features = len(qc.preprocessor['feature_names'])
+else:
+    n_features = qc.engine.n_features if qc.engine is not None else qc.model.n_features_in_
+qc.predict(qc.array_to_frame(np.zeros((1, n_features))))
+done = time.perf_counter()
+print(json.dumps({{'import_s': imported - start, 'init_s': initialized - imported,
+                  'first_predict_s': done - initialized, 'total_s': done - start,
+                  'sklearn_imported': 'sklearn' in sys.modules}}))
+"""
+
+
+def measure_cold_start(results_dir='results', repeats=3):
+    """
+    Temps de démarrage à froid (import, initialisation, première prédiction) mesuré
+    dans des processus neufs, avec la forêt compilée puis avec le pickle scikit-learn.
+
+    Returns:
+        Dictionnaire {'compiled': {...}, 'pickle': {...}} (médianes en secondes)
+    """
+    paths = {
+        'notebooks': os.path.join(ROOT_DIR, 'notebooks'),
+        'model_path': os.path.join(results_dir, 'final_model_smote_rf.pkl'),
+        'metrics_path': os.path.join(results_dir, 'final_metrics.pkl'),
+        'preprocessor_path': os.path.join(results_dir, 'preprocessor.pkl'),
+    }
+    variants = {
+        'compiled': os.path.join(results_dir, 'final_model_compiled'),
+        # Dossier inexistant : force la désérialisation du pickle
+        'pickle': os.path.join(results_dir, 'absent_compiled_model'),
+    }
+
+    results = {}
+    for name, compiled_path in variants.items():
+        script = _COLD_START_SCRIPT.format(compiled_path=compiled_path, **{k: os.path.abspath(v) for k, v in paths.items()})
+        runs = []
+        for _ in range(repeats):
+            output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+            runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+        results[name] = {key: float(np.median([run[key] for run in runs])) for key in runs[0] if key.endswith('_s')}
+        results[name]['sklearn_imported'] = runs[0]['sklearn_imported']
+
+    logger.info("\n🧊 Démarrage à froid (médiane de {} processus)".format(repeats))
+    for name, m in results.items():
+        logger.info(f"   {name:<9}: import {m['import_s']:.2f}s | init {m['init_s']:.2f}s | "
+                    f"1re prédiction {m['first_predict_s']:.2f}s | total {m['total_s']:.2f}s | "
+                    f"sklearn importé : {'oui' if m['sklearn_imported'] else 'non'}")
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance=0.2):
+    """
+    Compare des résultats à une référence et liste les régressions.
+
+    Args:
+        results: Résultats de run_benchmarks
+        baseline: Résultats de référence (même format)
+        tolerance: Écart relatif toléré (0.2 = 20%)
+
+    Returns:
+        Liste de dictionnaires {stage, metric, baseline, current, change}
+    """
+    regressions = []
+    for stage, metrics in results['stages'].items():
+        reference = baseline.get('stages', {}).get(stage)
+        if reference is None:
+            continue
+        for metric, current in metrics.items():
+            previous = reference.get(metric)
+            if current is None or not previous:
+                continue
+            change = (current - previous) / previous
+            if (metric in LOWER_IS_BETTER and change > tolerance) or \
+               (metric in HIGHER_IS_BETTER and change < -tolerance):
+                regressions.append({'stage': stage, 'metric': metric, 'baseline': previous,
+                                    'current': current, 'change': change})
+    return regressions
+
+
+def print_report(results, regressions=None):
+    logger.info("\n" + "=" * 72)
+    logger.info("⏱️  BENCHMARK DU PIPELINE")
+    logger.info("=" * 72)
+    logger.info(f"{'Étape':<22}{'Durée (s)':>11}{'Débit (l/s)':>14}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+    for stage, m in results['stages'].items():
+        p50 = f"{m['p50_ms']:.2f}" if 'p50_ms' in m else '-'
+        p99 = f"{m['p99_ms']:.2f}" if 'p99_ms' in m else '-'
+        throughput = m.get('batch_throughput_rows_s') or m['throughput_rows_s']
+        logger.info(f"{stage:<22}{m['seconds']:>11.3f}{throughput:>14.0f}{p50:>10}{p99:>10}")
+    rss = max((m['peak_rss_mb'] or 0) for m in results['stages'].values())
+    logger.info(f"Pic de mémoire résidente : {rss:.0f} Mo")
+    for stage, m in results['stages'].items():
+        if m.get('peak_alloc_mb') is not None:
+            logger.info(f"   Pic d'allocation {stage:<14}: {m['peak_alloc_mb']:.1f} Mo")
+
+    if regressions is not None:
+        if regressions:
+            logger.info(f"\n❌ {len(regressions)} régression(s) par rapport à la référence :")
+            for r in regressions:
+                logger.info(f"   {r['stage']}.{r['metric']} : {r['baseline']:.4g} → {r['current']:.4g} ({r['change']:+.0%})")
+        else:
+            logger.info("\n✅ Aucune régression par rapport à la référence")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark des étapes du pipeline SC-QC")
+    parser.add_argument("--rows", type=int, default=1567)
+    parser.add_argument("--sensors", type=int, default=590)
+    parser.add_argument("--output", default="results/benchmark.json")
+    parser.add_argument("--baseline", default="results/benchmark_baseline.json")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Enregistre ces résultats comme nouvelle référence")
+    parser.add_argument("--cold-start", action="store_true",
+                        help="Mesure le démarrage à froid avec les artefacts de results/")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+
+    if args.cold_start:
+        measure_cold_start()
+        sys.exit(0)
+
+    results = run_benchmarks(args.rows, args.sensors)
+
+    regressions = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        results['regressions'] = regressions
+    print_report(results, regressions)
+
+    for path in [args.output] + ([args.baseline] if args.save_baseline else []):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"💾 Résultats sauvegardés : {path}")
+
+    if regressions:
+        sys.exit(1)
@@ -0,0 +1,153 @@
+import pandas as pd
+import numpy as np
+import argparse
+import logging
+import os
+import sys
+import time
+
+# Permet l'exécution directe du script (python src/explain.py)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+logger = logging.getLogger(__name__)
+
+
+class ForestExplainer:
+    """
+    Contributions par plaquette et par capteur pour une forêt compilée (méthode de
+    Saabas, par chemin de décision).
+
+    Le long du chemin d'une plaquette dans un arbre, chaque nœud de décision fait
+    varier la probabilité de défaut ; cette variation est attribuée au capteur testé.
+    Pour chaque plaquette, biais + somme des contributions = probabilité prédite.
+    Le calcul remonte des feuilles vers les racines pour tous les arbres et toutes
+    les plaquettes à la fois : son coût est celui d'un second parcours de la forêt.
+    """
+
+    def __init__(self, engine):
+        """
+        Args:
+            engine: CompiledForest
+        """
+        if engine.baseline is not None:
+            raise ValueError("Explication disponible pour les forêts (probabilités moyennées) uniquement")
+        self.engine = engine
+        n_nodes = len(engine.feature)
+        internal = np.flatnonzero(~engine.is_leaf)
+
+        # Parent de chaque nœud (-1 pour les racines)
+        parent = np.full(n_nodes, -1, dtype=np.int64)
+        parent[engine.children[2 * internal]] = internal
+        parent[engine.children[2 * internal + 1]] = internal
+        self.parent = parent
+
+        # Variation de probabilité de défaut et capteur responsable, par arête parent -> nœud
+        proba = np.asarray(engine.value[:, 1], dtype=np.float64)
+        has_parent = parent >= 0
+        self.delta = np.where(has_parent, proba - proba[np.maximum(parent, 0)], 0.0)
+        self.split_feature = np.where(has_parent, engine.feature[np.maximum(parent, 0)], 0).astype(np.int64)
+        self.bias = float(proba[engine.roots].mean())
+
+    def contributions(self, X):
+        """
+        Args:
+            X: Tableau (n_samples, n_features) au format prétraité
+
+        Returns:
+            Tableau (n_samples, n_features) des contributions à la probabilité de défaut
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        engine = self.engine
+        block = engine.block_size
+        result = np.empty((X.shape[0], engine.n_features), dtype=np.float64)
+        for start in range(0, X.shape[0], block):
+            result[start:start + block] = self._block_contributions(X[start:start + block])
+        return result
+
+    def _block_contributions(self, X):
+        engine = self.engine
+        n_samples, n_features = X.shape[0], engine.n_features
+        leaves = engine.apply(X)
+        samples = np.broadcast_to(np.arange(n_samples, dtype=np.int64), leaves.shape).ravel()
+        current = leaves.ravel().astype(np.int64)
+
+        # Remontée simultanée de tous les chemins ; les chemins arrivés à la racine sortent
+        keys, weights = [], []
+        active = self.parent[current] >= 0
+        current, samples = current[active], samples[active]
+        while current.size:
+            keys.append(samples * n_features + self.split_feature[current])
+            weights.append(self.delta[current])
+            current = self.parent[current]
+            active = self.parent[current] >= 0
+            current, samples = current[active], samples[active]
+
+        if not keys:
+            return np.zeros((n_samples, n_features))
+        totals = np.bincount(np.concatenate(keys), weights=np.concatenate(weights),
+                             minlength=n_samples * n_features)
+        return totals.reshape(n_samples, n_features) / engine.n_trees
+
+    def explain(self, X, feature_names=None):
+        """
+        Contributions sous forme de DataFrame (une ligne par plaquette).
+        """
+        index = X.index if isinstance(X, pd.DataFrame) else None
+        if feature_names is None:
+            feature_names = self.engine.feature_names
+        return pd.DataFrame(self.contributions(np.asarray(X)), columns=feature_names, index=index)
+
+
+def top_factors(contributions, k=10):
+    """
+    Facteurs d'échec d'un ensemble de plaquettes : contribution moyenne par capteur,
+    classée par effet sur la probabilité de défaut.
+
+    Args:
+        contributions: DataFrame retourné par ForestExplainer.explain
+        k: Nombre de capteurs retenus
+
+    Returns:
+        DataFrame (Feature, Impact) trié par impact décroissant
+    """
+    impact = contributions.mean(axis=0)
+    top = impact.nlargest(k)
+    return pd.DataFrame({'Feature': top.index.astype(str), 'Impact': top.to_numpy()})
+
+
+if __name__ == "__main__":
+    import joblib
+    from src.inference import CompiledForest
+
+    parser = argparse.ArgumentParser(description="Explication des prédictions de la forêt")
+    parser.add_argument("--model", default="results/final_model_smote_rf.pkl")
+    parser.add_argument("--test", default="results/test_dataset.pkl")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+
+    if not (os.path.exists(args.model) and os.path.exists(args.test)):
+        raise SystemExit("❌ Modèle ou set de test introuvable. Lancez d'abord src/training.py.")
+
+    model = joblib.load(args.model)
+    X_test, _ = joblib.load(args.test)
+    engine = CompiledForest.from_sklearn(model)
+    explainer = ForestExplainer(engine)
+
+    start = time.perf_counter()
+    predictions, probabilities = engine.predict(X_test.to_numpy())
+    scoring_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    contributions = explainer.explain(X_test)
+    explain_ms = (time.perf_counter() - start) * 1000
+
+    error = np.abs(explainer.bias + contributions.sum(axis=1).to_numpy() - probabilities).max()
+    logger.info(f"✅ {len(X_test)} plaquettes expliquées en {explain_ms:.1f} ms "
+                f"(scoring {scoring_ms:.1f} ms, écart à la probabilité {error:.1e})")
+    flagged = contributions[predictions == 1]
+    if len(flagged):
+        logger.info(f"💎 Facteurs clés d'échec ({len(flagged)} plaquettes défectueuses) :")
+        for _, row in top_factors(flagged, args.top).iterrows():
+            logger.info(f"   {row['Feature']:>8} : {row['Impact']:+.4f}")
@@ -0,0 +1,314 @@
+import numpy as np
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledForest:
+    """
+    Moteur d'inférence vectorisé pour une forêt d'arbres de décision.
+
+    Tous les arbres sont aplatis dans des tableaux contigus (feature, seuil, enfants,
+    valeur des feuilles). Un lot est évalué en parcourant simultanément tous les arbres
+    pour tous les échantillons : une seule passe fournit les probabilités et les
+    prédictions seuillées, sans la validation de scikit-learn à chaque appel.
+    """
+
+    # Taille des blocs de lignes traités en parallèle pour les gros lots
+    block_size = 2048
+    # Threads d'évaluation des blocs (None : un par cœur ; 1 dans un processus de travail)
+    n_threads = None
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth,
+                 n_features, feature_names=None, is_leaf=None, baseline=None):
+        """
+        Args:
+            feature: Indice de la variable testée par nœud (int32)
+            threshold: Seuil de chaque nœud (float64, +inf pour une feuille)
+            children: Enfants gauche/droit entrelacés, taille 2 * n_nodes (int32)
+            value: Probabilités des classes 0 et 1 par nœud, forme (n_nodes, 2)
+            roots: Indice global de la racine de chaque arbre
+            max_depth: Profondeur maximale des arbres
+            n_features: Nombre de features attendues
+            feature_names: Noms des features à l'entraînement (optionnel)
+            is_leaf: Masque des feuilles (recalculé s'il n'est pas fourni)
+            baseline: Score initial d'un modèle de boosting ; None pour une forêt
+                      (probabilités moyennées), sinon probabilité = sigmoïde(baseline
+                      + somme des valeurs des feuilles)
+        """
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.feature_names = feature_names
+        if is_leaf is None:
+            is_leaf = children[0::2] == np.arange(len(feature), dtype=children.dtype)
+        self.is_leaf = is_leaf
+        self.baseline = None if baseline is None else float(baseline)
+        self._pool = None
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """
+        Compile un RandomForestClassifier (ou ExtraTreesClassifier) binaire entraîné.
+        """
+        if list(model.classes_) != [0, 1]:
+            raise ValueError(f"Classes attendues [0, 1], obtenues {list(model.classes_)}")
+
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset, max_depth = 0, 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(offset, offset + n_nodes, dtype=np.int32)
+            is_leaf = tree.children_left == -1
+
+            # Une feuille boucle sur elle-même : le parcours peut continuer sans test
+            left = np.where(is_leaf, node_ids, tree.children_left + offset).astype(np.int32)
+            right = np.where(is_leaf, node_ids, tree.children_right + offset).astype(np.int32)
+
+            # Valeurs normalisées en probabilités (comme predict_proba de l'arbre)
+            value = tree.value[:, 0, :].astype(np.float64)
+            value = value / value.sum(axis=1, keepdims=True)
+
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            children.append(np.stack([left, right], axis=1).ravel())
+            values.append(value)
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        feature_names = getattr(model, 'feature_names_in_', None)
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            children=np.concatenate(children),
+            value=np.concatenate(values),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth,
+            n_features=model.n_features_in_,
+            feature_names=None if feature_names is None else list(feature_names),
+        )
+
+    @classmethod
+    def from_hist_gradient_boosting(cls, model, feature_names=None):
+        """
+        Compile un HistGradientBoostingClassifier binaire entraîné (variables numériques).
+
+        Les seuils sont ceux du modèle : entraîné sur des codes de discrétisation
+        (src/binning.py), il s'applique aux mêmes codes.
+        """
+        if list(model.classes_) != [0, 1]:
+            raise ValueError(f"Classes attendues [0, 1], obtenues {list(model.classes_)}")
+
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset, max_depth = 0, 0
+        for (predictor,) in model._predictors:
+            nodes = predictor.nodes
+            if nodes['is_categorical'].any():
+                raise ValueError("Variables catégorielles non prises en charge")
+            n_nodes = len(nodes)
+            node_ids = np.arange(offset, offset + n_nodes, dtype=np.int32)
+            is_leaf = nodes['is_leaf'].astype(bool)
+
+            left = np.where(is_leaf, node_ids, nodes['left'].astype(np.int64) + offset).astype(np.int32)
+            right = np.where(is_leaf, node_ids, nodes['right'].astype(np.int64) + offset).astype(np.int32)
+            # Colonne 1 : contribution de la feuille au score (log-odds)
+            value = np.zeros((n_nodes, 2))
+            value[:, 1] = np.where(is_leaf, nodes['value'], 0.0)
+
+            features.append(np.where(is_leaf, 0, nodes['feature_idx']).astype(np.int32))
+            thresholds.append(np.where(is_leaf, np.inf, nodes['num_threshold']))
+            children.append(np.stack([left, right], axis=1).ravel())
+            values.append(value)
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, int(nodes['depth'].max()))
+
+        if feature_names is None and hasattr(model, 'feature_names_in_'):
+            feature_names = list(model.feature_names_in_)
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            children=np.concatenate(children),
+            value=np.concatenate(values),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth,
+            n_features=model.n_features_in_,
+            feature_names=None if feature_names is None else list(feature_names),
+            baseline=np.ravel(model._baseline_prediction)[0],
+        )
+
+    @classmethod
+    def from_estimator(cls, model, feature_names=None):
+        """Compile une forêt scikit-learn ou un HistGradientBoostingClassifier."""
+        if hasattr(model, '_predictors'):
+            return cls.from_hist_gradient_boosting(model, feature_names)
+        engine = cls.from_sklearn(model)
+        if feature_names is not None:
+            engine.feature_names = list(feature_names)
+        return engine
+
+    def apply(self, X):
+        """
+        Indices globaux des feuilles atteintes, forme (n_trees, n_samples).
+
+        Comme scikit-learn, les valeurs sont comparées en float32. Les gros lots sont
+        découpés en blocs de lignes évalués en parallèle (NumPy libère le GIL).
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"{self.n_features} features attendues, forme reçue {X.shape}")
+
+        n_threads = self.n_threads or os.cpu_count() or 1
+        if X.shape[0] <= self.block_size or n_threads == 1:
+            return self._apply_block(X)
+
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(n_threads)
+        blocks = [X[i:i + self.block_size] for i in range(0, X.shape[0], self.block_size)]
+        return np.hstack(list(self._pool.map(self._apply_block, blocks)))
+
+    def _apply_block(self, X):
+        """
+        Parcours simultané de tous les arbres pour un bloc de lignes.
+
+        Les couples (arbre, échantillon) arrivés sur une feuille sont retirés du
+        calcul à chaque niveau : le coût suit la profondeur moyenne, pas la maximale.
+        """
+        n_samples = X.shape[0]
+        flat = X.ravel()
+        nodes = np.repeat(self.roots[:, None], n_samples, axis=1).ravel()
+        offsets = np.tile(np.arange(n_samples, dtype=np.int64) * self.n_features, self.n_trees)
+
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        current, offsets = nodes[active], offsets[active]
+        while active.size:
+            x = flat[offsets + self.feature[current]]
+            current = self.children[2 * current + (x > self.threshold[current])]
+            nodes[active] = current
+            keep = ~self.is_leaf[current]
+            active, current, offsets = active[keep], current[keep], offsets[keep]
+        return nodes.reshape(self.n_trees, n_samples)
+
+    def predict_proba(self, X):
+        """Probabilités de la classe 1 (moyenne des arbres)."""
+        return self.predict(X)[1]
+
+    def predict(self, X, threshold=None):
+        """
+        Probabilités et prédictions en une seule passe.
+
+        Args:
+            X: Tableau (n_samples, n_features)
+            threshold: Seuil sur la probabilité de défaut ; par défaut, la classe
+                       majoritaire des votes comme RandomForestClassifier.predict
+
+        Returns:
+            predictions: Prédictions (0: OK, 1: Défectueux)
+            probabilities: Probabilités de la classe 1
+        """
+        leaves = self.apply(X)
+        if self.baseline is not None:
+            # Boosting : somme des contributions des arbres puis sigmoïde
+            raw = self.baseline + self.value[:, 1][leaves].sum(axis=0)
+            probabilities = 1.0 / (1.0 + np.exp(-raw))
+            if threshold is not None:
+                return (probabilities >= threshold).astype(int), probabilities
+            # Comme HistGradientBoostingClassifier.predict : score positif
+            return (raw > 0).astype(int), probabilities
+
+        # Somme séquentielle arbre par arbre, dans l'ordre de la forêt
+        proba_ok = self.value[:, 0][leaves].sum(axis=0) / self.n_trees
+        probabilities = self.value[:, 1][leaves].sum(axis=0) / self.n_trees
+        if threshold is not None:
+            predictions = (probabilities >= threshold).astype(int)
+        else:
+            predictions = (probabilities > proba_ok).astype(int)
+        return predictions, probabilities
+
+
+def compare_with_sklearn(model, X, batch_sizes=(1, 64, 10000), repeats=20):
+    """
+    Vérifie l'exactitude du moteur compilé face à scikit-learn et compare les latences.
+
+    Args:
+        model: RandomForestClassifier entraîné
+        X: Données de référence (les lots sont tirés par rééchantillonnage)
+        batch_sizes: Tailles de lots à chronométrer
+        repeats: Nombre de mesures par taille de lot
+
+    Returns:
+        Dictionnaire {taille_lot: {'sklearn_ms': ..., 'compiled_ms': ...}}
+    """
+    engine = CompiledForest.from_sklearn(model)
+    X = np.asarray(X, dtype=np.float64)
+
+    # scikit-learn attend un DataFrame si le modèle a été entraîné avec des noms de colonnes
+    as_input = lambda batch: batch
+    if engine.feature_names is not None:
+        import pandas as pd
+        as_input = lambda batch: pd.DataFrame(batch, columns=engine.feature_names)
+
+    # 1. Exactitude
+    predictions, probabilities = engine.predict(X)
+    reference = model.predict_proba(as_input(X))[:, 1]
+    max_error = np.abs(probabilities - reference).max()
+    if max_error > 1e-12 or not np.array_equal(predictions, model.predict(as_input(X))):
+        raise AssertionError(f"Écart avec scikit-learn (erreur max {max_error:.2e})")
+    logger.info(f"✅ Exactitude vérifiée sur {len(X)} échantillons (erreur max {max_error:.1e})")
+
+    # 2. Latence (predict_proba + predict côté sklearn, une passe côté moteur)
+    rng = np.random.default_rng(0)
+    results = {}
+    for batch_size in batch_sizes:
+        batch = X[rng.integers(0, len(X), batch_size)]
+        frame = as_input(batch)
+        timings = {'sklearn_ms': [], 'compiled_ms': []}
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model.predict_proba(frame)
+            model.predict(frame)
+            timings['sklearn_ms'].append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            engine.predict(batch)
+            timings['compiled_ms'].append((time.perf_counter() - start) * 1000)
+
+        results[batch_size] = {k: float(np.median(v)) for k, v in timings.items()}
+        logger.info(f"   Lot de {batch_size:>6} : sklearn {results[batch_size]['sklearn_ms']:8.2f} ms | "
+              f"compilé {results[batch_size]['compiled_ms']:8.2f} ms")
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    import joblib
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+
+    # Test du moteur sur le modèle sauvegardé, ou sur une forêt synthétique à défaut
+    model_path = "results/final_model_smote_rf.pkl"
+    if os.path.exists(model_path) and os.path.exists("results/test_dataset.pkl"):
+        model = joblib.load(model_path)
+        X_test, _ = joblib.load("results/test_dataset.pkl")
+        X_ref = np.asarray(X_test, dtype=np.float64)
+    else:
+        from sklearn.ensemble import RandomForestClassifier
+        rng = np.random.default_rng(42)
+        X_ref = rng.normal(size=(2000, 567))
+        y_ref = (X_ref[:, :5].sum(axis=1) + rng.normal(size=2000) > 1.5).astype(int)
+        model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1).fit(X_ref, y_ref)
+
+    compare_with_sklearn(model, X_ref)
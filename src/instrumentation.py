@@ -0,0 +1,188 @@
+import numpy as np
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+# Bornes des histogrammes de latence (ms)
+LATENCY_BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+
+class Metrics:
+    """
+    Registre de métriques léger : compteurs, histogrammes de latence et spans de durée.
+
+    Les mesures sont agrégées en mémoire (aucune écriture sur le chemin de scoring) et
+    exportées à la demande au format texte Prometheus ou JSON. Désactivé, chaque appel
+    se réduit à un test de booléen.
+
+    Args:
+        enabled: État initial (variable d'environnement SCQC_METRICS=0 pour désactiver)
+        buckets: Bornes supérieures des histogrammes, en millisecondes
+    """
+
+    def __init__(self, enabled=True, buckets=LATENCY_BUCKETS_MS):
+        self.enabled = enabled
+        self.buckets = np.asarray(buckets, dtype=np.float64)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def inc(self, name, value=1, **labels):
+        """Incrémente un compteur (lignes scorées, valeurs imputées...)."""
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value_ms, **labels):
+        """Ajoute une observation à un histogramme de latence."""
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        index = int(np.searchsorted(self.buckets, value_ms))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    'counts': np.zeros(len(self.buckets) + 1, dtype=np.int64), 'sum': 0.0, 'count': 0,
+                }
+            histogram['counts'][index] += 1
+            histogram['sum'] += value_ms
+            histogram['count'] += 1
+
+    @contextlib.contextmanager
+    def span(self, stage, **labels):
+        """
+        Chronomètre une étape ; la durée alimente l'histogramme stage_duration_ms.
+
+        Les spans ouverts dans un trace() sont aussi relevés individuellement,
+        ce qui donne la répartition du temps pour un lot donné.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            self.observe('stage_duration_ms', duration_ms, stage=stage, **labels)
+            trace = getattr(self._local, 'trace', None)
+            if trace is not None:
+                trace[stage] = trace.get(stage, 0.0) + duration_ms
+
+    @contextlib.contextmanager
+    def trace(self):
+        """
+        Relève les durées des spans exécutés dans le bloc (même thread).
+
+        Yields:
+            Dictionnaire {étape: durée en ms}, rempli à la sortie des spans
+        """
+        parent = getattr(self._local, 'trace', None)
+        self._local.trace = {}
+        try:
+            yield self._local.trace
+        finally:
+            self._local.trace = parent
+
+    def timed(self, stage):
+        """Décorateur : exécute la fonction dans un span."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """
+        Returns:
+            {'counters': [...], 'histograms': [...]} (sérialisable en JSON)
+        """
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            histograms = []
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                cumulative = np.cumsum(histogram['counts'])
+                histograms.append({
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': histogram['count'],
+                    'sum': histogram['sum'],
+                    'buckets': {**{f'{b:g}': int(c) for b, c in zip(self.buckets, cumulative)},
+                                '+Inf': int(cumulative[-1])},
+                })
+        return {'counters': counters, 'histograms': histograms}
+
+    def to_json(self, indent=None):
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self, prefix='scqc'):
+        """Export au format texte d'exposition Prometheus."""
+        snapshot = self.snapshot()
+        lines, declared = [], set()
+        for counter in snapshot['counters']:
+            name = f"{prefix}_{counter['name']}_total"
+            if name not in declared:
+                lines.append(f"# TYPE {name} counter")
+                declared.add(name)
+            lines.append(f"{name}{_format_labels(counter['labels'].items())} {counter['value']}")
+        for histogram in snapshot['histograms']:
+            name = f"{prefix}_{histogram['name']}"
+            if name not in declared:
+                lines.append(f"# TYPE {name} histogram")
+                declared.add(name)
+            labels = histogram['labels'].items()
+            for bound, count in histogram['buckets'].items():
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', bound))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Écrit les métriques sur disque (JSON si l'extension est .json, sinon Prometheus)."""
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        content = self.to_json(indent=2) if path.endswith('.json') else self.to_prometheus()
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def stage_summary(self):
+        """Durée cumulée et nombre d'appels par étape, de la plus coûteuse à la moins coûteuse."""
+        summary = [(h['labels'].get('stage'), h['sum'], h['count'])
+                   for h in self.snapshot()['histograms'] if h['name'] == 'stage_duration_ms']
+        return sorted(summary, key=lambda item: item[1], reverse=True)
+
+
+# Registre partagé par tout le pipeline
+METRICS = Metrics(enabled=os.environ.get('SCQC_METRICS', '1') != '0')
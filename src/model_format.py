@@ -0,0 +1,132 @@
+import numpy as np
+import json
+import os
+import uuid
+
+from src.inference import CompiledForest
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+ALIGNMENT = 64
+ARRAY_NAMES = ('feature', 'threshold', 'children', 'value', 'roots', 'is_leaf')
+
+
+def save_compiled(engine, directory, source_path=None):
+    """
+    Sauvegarde une forêt compilée : tableaux de nœuds dans un conteneur binaire
+    unique et petit manifeste JSON (types, formes, décalages).
+
+    Le binaire porte un identifiant unique et le manifeste est remplacé en dernier,
+    de façon atomique : un lecteur voit toujours un couple cohérent. Le binaire de la
+    publication précédente est conservé jusqu'à la suivante : un lecteur qui vient de
+    lire l'ancien manifeste peut encore l'ouvrir.
+
+    Args:
+        engine: CompiledForest
+        directory: Dossier de destination
+        source_path: Modèle scikit-learn d'origine (taille et date enregistrées pour
+                     détecter un artefact périmé)
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    binary_name = f"forest-{uuid.uuid4().hex[:12]}.bin"
+    arrays, offset = {}, 0
+    with open(os.path.join(directory, binary_name), 'wb') as f:
+        for name in ARRAY_NAMES:
+            array = np.ascontiguousarray(getattr(engine, name))
+            padding = (-offset) % ALIGNMENT
+            f.write(b'\0' * padding)
+            offset += padding
+            f.write(array.tobytes())
+            arrays[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset += array.nbytes
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'binary': binary_name,
+        'n_trees': engine.n_trees,
+        'n_features': engine.n_features,
+        'max_depth': engine.max_depth,
+        'feature_names': engine.feature_names,
+        'arrays': arrays,
+    }
+    if engine.baseline is not None:
+        manifest['baseline'] = engine.baseline
+    if source_path is not None and os.path.exists(source_path):
+        stat = os.stat(source_path)
+        manifest['source'] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    previous = read_manifest(directory)
+    keep = {binary_name, previous['binary'] if previous is not None else None}
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    # Nettoyage des binaires antérieurs à la publication précédente
+    for name in os.listdir(directory):
+        if name.startswith('forest-') and name.endswith('.bin') and name not in keep:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+    return manifest_path
+
+
+def read_manifest(directory):
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    return manifest if manifest.get('format_version') == FORMAT_VERSION else None
+
+
+def is_stale(manifest, source_path):
+    """Vrai si le modèle d'origine a été modifié depuis l'export compilé."""
+    if 'source' not in manifest or source_path is None or not os.path.exists(source_path):
+        return False
+    stat = os.stat(source_path)
+    return (manifest['source']['size'], manifest['source']['mtime_ns']) != (stat.st_size, stat.st_mtime_ns)
+
+
+def load_compiled(directory, mmap=True):
+    """
+    Charge une forêt compilée ; avec mmap, les tableaux sont projetés en mémoire
+    (lecture seule, pages chargées à la demande).
+
+    Returns:
+        CompiledForest, ou None si aucun artefact valide n'existe
+    """
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return None
+
+    path = os.path.join(directory, manifest['binary'])
+    arrays = {}
+    if mmap:
+        for name, spec in manifest['arrays'].items():
+            arrays[name] = np.memmap(path, dtype=np.dtype(spec['dtype']), mode='r',
+                                     offset=spec['offset'], shape=tuple(spec['shape']))
+    else:
+        with open(path, 'rb') as f:
+            buffer = f.read()
+        for name, spec in manifest['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape']))
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count,
+                                         offset=spec['offset']).reshape(spec['shape'])
+
+    return CompiledForest(
+        feature=arrays['feature'],
+        threshold=arrays['threshold'],
+        children=arrays['children'],
+        value=arrays['value'],
+        roots=arrays['roots'],
+        max_depth=manifest['max_depth'],
+        n_features=manifest['n_features'],
+        feature_names=manifest['feature_names'],
+        is_leaf=arrays['is_leaf'],
+        baseline=manifest.get('baseline'),
+    )
@@ -0,0 +1,305 @@
+import pandas as pd
+import numpy as np
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+
+# Permet l'exécution directe du script (python src/monitoring.py)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+logger = logging.getLogger(__name__)
+
+DRIFT_REFERENCE_PATH = 'results/drift_reference.npz'
+DRIFT_STATE_PATH = 'results/drift_state.npz'
+
+# Seuils usuels du PSI : < 0.1 stable, 0.1 - 0.25 dérive modérée, > 0.25 dérive forte
+PSI_WARNING = 0.1
+PSI_ALERT = 0.25
+_EPSILON = 1e-4
+
+
+def build_reference(X, n_bins=10):
+    """
+    Instantané de référence des capteurs, pris à l'entraînement.
+
+    Les bornes des classes sont les quantiles d'entraînement : chaque classe contient
+    environ 1/n_bins des plaquettes de référence, ce qui rend le PSI sensible partout.
+
+    Args:
+        X: DataFrame des features d'entraînement (données réelles, sans SMOTE)
+        n_bins: Nombre de classes par capteur
+
+    Returns:
+        Dictionnaire de tableaux (bornes, proportions, moyennes, variances)
+    """
+    values = np.asarray(X, dtype=np.float64)
+    levels = np.linspace(0, 1, n_bins + 1)[1:-1]
+    edges = np.nanquantile(values, levels, axis=0).T
+    counts = _bin_counts(values, edges)
+    return {
+        'reference_id': np.asarray(uuid.uuid4().hex),
+        'feature_names': np.asarray(list(X.columns), dtype=str),
+        'edges': edges,
+        'proportions': counts / np.maximum(counts.sum(axis=1, keepdims=True), 1),
+        'mean': np.nanmean(values, axis=0),
+        'var': np.nanvar(values, axis=0),
+        'count': np.asarray(len(values)),
+    }
+
+
+def save_reference(reference, path=DRIFT_REFERENCE_PATH):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **reference)
+    os.replace(tmp_path, path)
+
+
+def load_reference(path=DRIFT_REFERENCE_PATH):
+    """Instantané de référence, ou None s'il n'existe pas."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def _bin_counts(values, edges):
+    """
+    Comptes par capteur et par classe, forme (n_features, n_bins).
+
+    La classe d'une valeur est le nombre de bornes intérieures qu'elle dépasse : une
+    comparaison vectorisée par borne, accumulée directement dans l'indice plat
+    (capteur, classe) passé à un seul bincount.
+    """
+    n_features, n_bins = edges.shape[0], edges.shape[1] + 1
+    flat = np.broadcast_to(np.arange(n_features, dtype=np.int64) * n_bins, values.shape).copy()
+    for edge in np.ascontiguousarray(edges.T):
+        flat += values > edge
+    missing = np.isnan(values)
+    flat = flat[~missing] if missing.any() else flat.ravel()
+    return np.bincount(flat, minlength=n_features * n_bins).reshape(n_features, n_bins)
+
+
+def _psi(proportions, reference):
+    p = np.maximum(proportions, _EPSILON)
+    q = np.maximum(reference, _EPSILON)
+    return ((p - q) * np.log(p / q)).sum(axis=-1)
+
+
+def _ks(proportions, reference):
+    return np.abs(np.cumsum(proportions, axis=-1) - np.cumsum(reference, axis=-1)).max(axis=-1)
+
+
+class DriftMonitor:
+    """
+    Suivi de dérive des capteurs sur le flux de plaquettes scorées.
+
+    Pour chaque capteur, l'état tient en quelques nombres : effectif, moyenne et
+    somme des carrés des écarts (Welford, fusion par lot) et un histogramme sur les
+    bornes fixes de la référence. Les scores PSI et KS comparent l'histogramme
+    cumulé à celui de la référence ; chaque lot laisse aussi une entrée d'historique.
+    """
+
+    def __init__(self, reference, history_size=500, save_interval=30.0, max_hist_rows=256, min_batch_rows=64):
+        """
+        Args:
+            reference: Instantané retourné par build_reference
+            history_size: Nombre de lots conservés dans l'historique
+            save_interval: Délai minimal (s) entre deux sauvegardes automatiques
+            max_hist_rows: Au-delà, l'histogramme d'un lot est estimé sur un sous-échantillon
+                           régulier de ce nombre de lignes (moyennes et variances restent exactes)
+            min_batch_rows: Lignes accumulées avant intégration (une entrée d'historique par intégration)
+        """
+        self.reference = reference
+        self.feature_names = [str(name) for name in reference['feature_names']]
+        self._columns = pd.Index(self.feature_names)
+        self.max_hist_rows = max_hist_rows
+        self.min_batch_rows = min_batch_rows
+        self.history_size = history_size
+        self.save_interval = save_interval
+        self._last_save = 0.0
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        n_features, n_bins = self.reference['proportions'].shape
+        self.count = np.zeros(n_features, dtype=np.int64)
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.counts = np.zeros((n_features, n_bins))
+        self.history = deque(maxlen=self.history_size)
+        self._pending, self._pending_rows, self._pending_defects = [], 0, 0
+
+    def update(self, X, predictions=None):
+        """
+        Intègre un lot de plaquettes prétraitées.
+
+        Les petits lots (scoring unitaire) sont mis en attente et intégrés ensemble dès
+        que `min_batch_rows` lignes sont accumulées : le coût par appel se limite à
+        une copie de la ligne.
+
+        Args:
+            X: DataFrame (colonnes de la référence) ou tableau dans le même ordre
+            predictions: Prédictions du lot, pour l'historique de production
+        """
+        if isinstance(X, pd.DataFrame) and not X.columns.equals(self._columns):
+            X = X[self.feature_names]
+        values = np.array(X, dtype=np.float64, ndmin=2)
+        if len(values) == 0:
+            return
+        defects = 0 if predictions is None else int(np.count_nonzero(np.asarray(predictions) == 1))
+        with self._lock:
+            self._pending.append(values)
+            self._pending_rows += len(values)
+            self._pending_defects += defects
+            if self._pending_rows >= self.min_batch_rows:
+                self._flush()
+
+    def flush(self):
+        """Intègre les lignes en attente."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        values = self._pending[0] if len(self._pending) == 1 else np.vstack(self._pending)
+        defects = self._pending_defects
+        self._pending, self._pending_rows, self._pending_defects = [], 0, 0
+        self._update(values, defects)
+
+    def _update(self, values, defects):
+        # Welford par lot (fusion de deux moments, algorithme de Chan)
+        if np.isnan(values).any():
+            n_batch = np.sum(~np.isnan(values), axis=0)
+            has_values = n_batch > 0
+            batch_mean = np.where(has_values, np.nansum(values, axis=0) / np.maximum(n_batch, 1), 0.0)
+            batch_m2 = np.nansum((values - batch_mean) ** 2, axis=0)
+        else:
+            # Cas courant : données déjà imputées
+            n_batch = np.full(values.shape[1], len(values))
+            has_values = n_batch > 0
+            batch_mean = values.mean(axis=0)
+            batch_m2 = ((values - batch_mean) ** 2).sum(axis=0)
+        total = self.count + n_batch
+        delta = batch_mean - self.mean
+        self.mean = np.where(has_values, self.mean + delta * n_batch / np.maximum(total, 1), self.mean)
+        self.m2 = self.m2 + batch_m2 + delta ** 2 * self.count * n_batch / np.maximum(total, 1)
+        self.count = total
+
+        n_rows = len(values)
+        if n_rows > self.max_hist_rows:
+            values = values[::-(-n_rows // self.max_hist_rows)]
+        lot_counts = _bin_counts(values, self.reference['edges'])
+        # Pondération : chaque lot pèse son nombre réel de lignes dans l'histogramme cumulé
+        self.counts += lot_counts * (n_rows / len(values))
+
+        entry = {'time': time.time(), 'rows': n_rows, 'defects': defects, 'mean_psi': None, 'drifting_sensors': None}
+        # Le PSI d'un lot n'est significatif qu'à partir de quelques dizaines de lignes
+        if n_rows >= self.min_batch_rows:
+            lot_proportions = lot_counts / np.maximum(lot_counts.sum(axis=1, keepdims=True), 1)
+            lot_psi = _psi(lot_proportions, self.reference['proportions'])
+            entry['mean_psi'] = float(lot_psi.mean())
+            entry['drifting_sensors'] = int(np.sum(lot_psi > PSI_ALERT))
+        self.history.append(entry)
+
+    @property
+    def n_rows(self):
+        """Plaquettes suivies, lignes en attente comprises."""
+        return (int(self.count.max()) if len(self.count) else 0) + self._pending_rows
+
+    def proportions(self):
+        return self.counts / np.maximum(self.counts.sum(axis=1, keepdims=True), 1)
+
+    def report(self):
+        """
+        Scores de dérive par capteur depuis le début du suivi.
+
+        Returns:
+            DataFrame (psi, ks, décalage de moyenne en écarts-types de référence),
+            trié par PSI décroissant
+        """
+        self.flush()
+        proportions = self.proportions()
+        reference_std = np.sqrt(self.reference['var'])
+        scale = np.where(reference_std > 0, reference_std, 1.0)
+        std = np.sqrt(self.m2 / np.maximum(self.count - 1, 1))
+        report = pd.DataFrame({
+            'psi': _psi(proportions, self.reference['proportions']),
+            'ks': _ks(proportions, self.reference['proportions']),
+            'mean_shift': np.where(self.count > 0, (self.mean - self.reference['mean']) / scale, 0.0),
+            'std_ratio': np.where(reference_std > 0, std / scale, 1.0),
+            'rows': self.count,
+        }, index=self.feature_names)
+        return report.sort_values('psi', ascending=False)
+
+    def history_frame(self):
+        self.flush()
+        return pd.DataFrame(list(self.history))
+
+    def save(self, path=DRIFT_STATE_PATH):
+        """Sauvegarde atomique de l'état (quelques dizaines de Ko)."""
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = path + '.tmp.npz'
+        with self._lock:
+            self._flush()
+            np.savez(tmp_path, reference_id=self.reference['reference_id'], count=self.count,
+                     mean=self.mean, m2=self.m2, counts=self.counts,
+                     history=np.asarray(json.dumps(list(self.history))))
+        os.replace(tmp_path, path)
+        self._last_save = time.monotonic()
+
+    def maybe_save(self, path=DRIFT_STATE_PATH):
+        """Sauvegarde si la précédente date de plus de save_interval secondes."""
+        if time.monotonic() - self._last_save >= self.save_interval:
+            self.save(path)
+
+    @classmethod
+    def load(cls, reference, path=DRIFT_STATE_PATH, **kwargs):
+        """
+        Reprend l'état sauvegardé ; il est ignoré s'il a été calculé contre une autre
+        référence (modèle réentraîné entre-temps).
+        """
+        monitor = cls(reference, **kwargs)
+        if os.path.exists(path):
+            with np.load(path) as data:
+                if str(data['reference_id']) == str(reference['reference_id']):
+                    monitor.count = data['count']
+                    monitor.mean = data['mean']
+                    monitor.m2 = data['m2']
+                    monitor.counts = data['counts']
+                    monitor.history.extend(json.loads(str(data['history'])))
+        return monitor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rapport de dérive des capteurs")
+    parser.add_argument("--reference", default=DRIFT_REFERENCE_PATH)
+    parser.add_argument("--state", default=DRIFT_STATE_PATH)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+
+    reference = load_reference(args.reference)
+    if reference is None:
+        raise SystemExit(f"❌ Référence {args.reference} introuvable. Lancez d'abord src/training.py.")
+    monitor = DriftMonitor.load(reference, args.state)
+    if monitor.n_rows == 0:
+        raise SystemExit("ℹ️  Aucune plaquette suivie depuis l'entraînement.")
+
+    report = monitor.report()
+    logger.info(f"📡 {monitor.n_rows} plaquettes suivies sur {len(monitor.history)} lots")
+    logger.info(f"   {int(np.sum(report['psi'] > PSI_ALERT))} capteurs en dérive forte (PSI > {PSI_ALERT}), "
+                f"{int(np.sum(report['psi'] > PSI_WARNING))} en dérive modérée (PSI > {PSI_WARNING})")
+    logger.info(report.head(args.top).to_string(float_format=lambda v: f"{v:.3f}"))
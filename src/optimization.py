@@ -0,0 +1,207 @@
+import numpy as np
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Permet l'exécution directe du script (python src/optimization.py)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from config import RANDOM_STATE, TEST_SIZE
+from src.data_cache import load_csv
+
+logger = logging.getLogger(__name__)
+
+BEST_PARAMS_PATH = 'results/best_params.json'
+
+# Espace de recherche par défaut (taille de la forêt gérée par les paliers)
+PARAM_GRID = {
+    'max_depth': [None, 8, 16, 32],
+    'min_samples_leaf': [1, 2, 5],
+    'max_features': ['sqrt', 'log2', 0.2],
+}
+
+
+def prepare_folds(X, y, work_dir, n_splits=3, random_state=RANDOM_STATE):
+    """
+    Calcule une seule fois les plis de validation croisée.
+
+    SMOTE est appliqué à l'intérieur de chaque pli, sur sa seule partie
+    d'entraînement (pas de fuite vers la validation). Chaque tableau est écrit en
+    .npy pour être projeté en mémoire par les workers au lieu de leur être envoyé.
+
+    Returns:
+        Liste de dictionnaires de chemins (X_train, y_train, X_val, y_val) par pli
+    """
+    from sklearn.model_selection import StratifiedKFold
+    from src.resampling import smote_resample
+
+    X = np.asarray(X, dtype=np.float32)
+    y = np.asarray(y, dtype=np.int64)
+    folds = []
+    splitter = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    for i, (train_idx, val_idx) in enumerate(splitter.split(X, y)):
+        X_res, y_res = smote_resample(X[train_idx], y[train_idx], random_state=random_state)
+        paths = {}
+        for name, array in (('X_train', X_res), ('y_train', y_res), ('X_val', X[val_idx]), ('y_val', y[val_idx])):
+            paths[name] = os.path.join(work_dir, f'fold{i}_{name}.npy')
+            np.save(paths[name], np.ascontiguousarray(array))
+        folds.append(paths)
+    return folds
+
+
+def _f1(y_true, y_pred):
+    tp = np.sum((y_true == 1) & (y_pred == 1))
+    fp = np.sum((y_true == 0) & (y_pred == 1))
+    fn = np.sum((y_true == 1) & (y_pred == 0))
+    return 2 * tp / (2 * tp + fp + fn) if tp > 0 else 0.0
+
+
+def evaluate_candidate(params, n_estimators, folds, random_state=RANDOM_STATE, prune_below=None):
+    """
+    Score F1 moyen d'une configuration sur les plis pré-calculés.
+
+    Les données sont ouvertes en lecture seule par memory-map. Si le premier pli
+    est déjà sous `prune_below`, l'évaluation s'arrête (configuration abandonnée).
+
+    Returns:
+        (score moyen, nombre de plis évalués)
+    """
+    from sklearn.ensemble import RandomForestClassifier
+
+    scores = []
+    for i, paths in enumerate(folds):
+        data = {name: np.load(path, mmap_mode='r') for name, path in paths.items()}
+        model = RandomForestClassifier(n_estimators=n_estimators, random_state=random_state, n_jobs=1, **params)
+        model.fit(data['X_train'], data['y_train'])
+        scores.append(_f1(data['y_val'], model.predict(data['X_val'])))
+        if prune_below is not None and i == 0 and scores[0] < prune_below:
+            break
+    return float(np.mean(scores)), len(scores)
+
+
+def successive_halving(X, y, param_grid=None, n_candidates=16, min_estimators=25, max_estimators=200,
+                       factor=2, n_splits=3, n_jobs=-1, random_state=RANDOM_STATE, prune_margin=0.1, work_dir=None):
+    """
+    Recherche d'hyperparamètres par élimination successive (successive halving).
+
+    Toutes les configurations commencent avec `min_estimators` arbres ; à chaque palier
+    seule la meilleure fraction 1/factor est conservée et la taille de la forêt est
+    multipliée par `factor`. Les candidats d'un palier sont évalués en parallèle.
+
+    Args:
+        X, y: Données d'entraînement (jamais le set de test)
+        param_grid: Dictionnaire {paramètre: valeurs} (PARAM_GRID par défaut)
+        n_candidates: Nombre de configurations tirées dans la grille
+        min_estimators, max_estimators: Taille de forêt au premier et au dernier palier
+        factor: Facteur d'élimination entre deux paliers
+        n_splits: Nombre de plis de validation croisée
+        n_jobs: Nombre de processus (-1 : tous les cœurs)
+        random_state: Graine aléatoire
+        prune_margin: Une configuration dont le premier pli est sous le seuil du palier
+                      précédent moins cette marge est abandonnée
+        work_dir: Dossier des plis memory-mappés (temporaire par défaut)
+
+    Returns:
+        best_params: Meilleure configuration (n_estimators inclus)
+        history: Liste des évaluations par palier
+    """
+    param_grid = param_grid or PARAM_GRID
+    grid = [dict(zip(param_grid, values)) for values in itertools.product(*param_grid.values())]
+    rng = np.random.default_rng(random_state)
+    candidates = [grid[i] for i in rng.permutation(len(grid))[:n_candidates]]
+    n_workers = os.cpu_count() if n_jobs in (None, -1) else n_jobs
+
+    temp = None
+    if work_dir is None:
+        temp = tempfile.TemporaryDirectory()
+        work_dir = temp.name
+
+    logger.info(f"📂 Pré-calcul de {n_splits} plis (SMOTE par pli)...")
+    folds = prepare_folds(X, y, work_dir, n_splits, random_state)
+
+    history = []
+    n_estimators, prune_below = min_estimators, None
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        while True:
+            start = time.perf_counter()
+            futures = [pool.submit(evaluate_candidate, params, n_estimators, folds, random_state, prune_below)
+                       for params in candidates]
+            results = [future.result() for future in futures]
+            for params, (score, n_folds) in zip(candidates, results):
+                history.append({'n_estimators': n_estimators, 'params': params, 'f1': score, 'folds': n_folds})
+
+            ranking = sorted(range(len(candidates)), key=lambda i: results[i][0], reverse=True)
+            logger.info(f"   Palier {n_estimators:>4} arbres : {len(candidates):>3} candidats, "
+                        f"meilleur F1 {results[ranking[0]][0]:.4f} ({time.perf_counter() - start:.1f}s)")
+
+            if len(candidates) == 1 or n_estimators * factor > max_estimators:
+                best = candidates[ranking[0]]
+                break
+
+            keep = max(1, math.ceil(len(candidates) / factor))
+            prune_below = results[ranking[keep - 1]][0] - prune_margin
+            candidates = [candidates[i] for i in ranking[:keep]]
+            n_estimators *= factor
+
+    if temp is not None:
+        temp.cleanup()
+
+    best_params = dict(best, n_estimators=n_estimators)
+    return best_params, history
+
+
+def save_best_params(params, path=BEST_PARAMS_PATH):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        json.dump(params, f, indent=2)
+
+
+def load_best_params(path=BEST_PARAMS_PATH):
+    """Configuration retenue par la recherche, ou None si elle n'a pas été lancée."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    from sklearn.model_selection import train_test_split
+
+    parser = argparse.ArgumentParser(description="Recherche d'hyperparamètres du Random Forest")
+    parser.add_argument("--candidates", type=int, default=16)
+    parser.add_argument("--min-estimators", type=int, default=25)
+    parser.add_argument("--max-estimators", type=int, default=200)
+    parser.add_argument("--splits", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=-1)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+
+    data_path = 'data/secom_preprocessed.csv'
+    if not os.path.exists(data_path):
+        raise SystemExit(f"❌ Erreur: {data_path} introuvable. Lancez d'abord le prétraitement.")
+
+    df = load_csv(data_path)
+    X = df.drop('Target', axis=1)
+    y = df['Target'].astype(int)
+
+    # Même découpage que training.py : le set de test reste hors de la recherche
+    X_train, _, y_train, _ = train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=y)
+
+    logger.info("🔎 Recherche par élimination successive...")
+    best_params, _ = successive_halving(X_train, y_train, n_candidates=args.candidates,
+                                        min_estimators=args.min_estimators, max_estimators=args.max_estimators,
+                                        n_splits=args.splits, n_jobs=args.jobs)
+    save_best_params(best_params)
+    logger.info(f"🏆 Meilleure configuration : {best_params}")
+    logger.info(f"💾 Sauvegardée dans {BEST_PARAMS_PATH} (utilisée par src/training.py)")
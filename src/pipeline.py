@@ -0,0 +1,449 @@
+import argparse
+import hashlib
+import inspect
+import joblib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+# Permet l'exécution directe du script (python src/pipeline.py)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import config
+from src.data_cache import file_sha256, load_csv
+from src.inference import CompiledForest
+from src.instrumentation import METRICS
+from src.model_format import MANIFEST_NAME, save_compiled
+from src.monitoring import build_reference, save_reference
+from src.optimization import load_best_params
+from src.preprocessing import load_and_preprocess
+from src.resampling import smote_resample
+from src.sensor_stats import compute_sensor_stats, save_sensor_stats
+from src.thresholds import save_operating_point
+from src.binning import BIN_EDGES_PATH, load_bin_edges, save_bin_edges, transform_bins
+from src.training import cv_operating_point, evaluate_model, fit_binned_boosting, fit_forest, log_metrics
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_VERSION = 1
+MANIFEST = 'stage.json'
+
+
+class Stage:
+    """
+    Étape du pipeline.
+
+    Args:
+        name: Nom de l'étape
+        func: Fonction func(out_dir, inputs, params) écrivant ses artefacts dans out_dir ;
+              inputs associe le nom de chaque dépendance à son dossier de sortie et celui
+              de chaque source à son chemin
+        deps: Étapes dont les sorties sont lues
+        params: Paramètres (sérialisables en JSON) issus de config.py
+        sources: Fichiers externes lus, {nom: chemin} ; seul leur contenu compte
+        publish: Artefacts recopiés à leur emplacement habituel, {fichier: destination}
+    """
+
+    def __init__(self, name, func, deps=(), params=None, sources=None, publish=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.params = params or {}
+        self.sources = sources or {}
+        self.publish = publish or {}
+
+
+def _code_names(code):
+    """Noms globaux lus par un code objet et par ceux qu'il contient (compréhensions, lambdas)."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+def _code_dependencies(func):
+    """
+    Code dont dépend une étape : sa fonction, les fonctions du même module qu'elle
+    appelle et le source des modules src/ utilisés, directement ou via leurs propres
+    imports. Modifier fit_forest ou smote_resample change donc l'empreinte.
+    """
+    functions, modules = {}, {}
+    pending = [func]
+    while pending:
+        obj = pending.pop()
+        if inspect.ismodule(obj):
+            if obj.__name__ in modules:
+                continue
+            modules[obj.__name__] = inspect.getsource(obj)
+            values = list(vars(obj).values())
+        else:
+            if obj.__qualname__ in functions:
+                continue
+            functions[obj.__qualname__] = inspect.getsource(obj)
+            values = [obj.__globals__[name] for name in _code_names(obj.__code__) if name in obj.__globals__]
+            # Fonctions utilitaires du module de l'étape (_model_inputs...)
+            pending += [value for value in values
+                        if inspect.isfunction(value) and value.__module__ == obj.__module__]
+        for value in values:
+            module = value if inspect.ismodule(value) else inspect.getmodule(value)
+            if module is not None and module.__name__.startswith('src.') and module.__name__ != func.__module__ \
+                    and module.__name__ not in modules:
+                pending.append(module)
+    return {'functions': functions, 'modules': modules}
+
+
+def _stage_key(stage, dep_keys, source_digests):
+    """
+    Empreinte d'une étape : code (fonction et modules dont elle dépend), paramètres,
+    empreintes des dépendances et contenu des sources. Deux exécutions de même
+    empreinte produisent le même résultat.
+    """
+    payload = {
+        'version': PIPELINE_VERSION,
+        'stage': stage.name,
+        'code': _code_dependencies(stage.func),
+        'params': stage.params,
+        'deps': {name: dep_keys[name] for name in stage.deps},
+        'sources': source_digests,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _publish_file(src, dest):
+    """
+    Copie vers un nom temporaire puis remplacement atomique. Pas de lien physique :
+    les scripts réécrivent certains fichiers de results/ en place, ce qui altérerait
+    les sorties indexées.
+    """
+    directory = os.path.dirname(dest)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    source = os.stat(src)
+    if os.path.exists(dest):
+        current = os.stat(dest)
+        if (current.st_size, current.st_mtime_ns) == (source.st_size, source.st_mtime_ns):
+            return
+    tmp_path = dest + '.tmp'
+    # copy2 conserve la date de modification (contrôle de fraîcheur de la forêt compilée)
+    shutil.copy2(src, tmp_path)
+    os.replace(tmp_path, dest)
+
+
+def _publish(src, dest):
+    if not os.path.exists(src):
+        # Artefact non produit par cette configuration : l'ancienne copie serait trompeuse
+        if os.path.isfile(dest):
+            os.remove(dest)
+        return
+    if not os.path.isdir(src):
+        _publish_file(src, dest)
+        return
+    # Dossier (forêt compilée) : manifeste remplacé en dernier, anciens fichiers retirés ensuite
+    names = sorted(os.listdir(src), key=lambda name: name == MANIFEST_NAME)
+    for name in names:
+        _publish_file(os.path.join(src, name), os.path.join(dest, name))
+    for name in set(os.listdir(dest)) - set(names):
+        path = os.path.join(dest, name)
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+class Pipeline:
+    """
+    Exécution d'étapes dont les sorties sont indexées par l'empreinte de leurs entrées.
+
+    Chaque étape écrit dans <work_dir>/<étape>/<empreinte>/ : une étape dont l'empreinte
+    a déjà été calculée est sautée, et seules les étapes touchées par une modification
+    (code, paramètre, source ou étape amont) sont rejouées. Les étapes indépendantes
+    s'exécutent en parallèle (threads : numpy et scikit-learn libèrent le GIL).
+    """
+
+    def __init__(self, stages, work_dir=config.PIPELINE_DIR):
+        self.stages = {stage.name: stage for stage in stages}
+        self.work_dir = work_dir
+        for stage in stages:
+            missing = [dep for dep in stage.deps if dep not in self.stages]
+            if missing:
+                raise ValueError(f"Étape {stage.name} : dépendances inconnues {missing}")
+
+    def _order(self):
+        """Ordre topologique (les étapes sont déclarées d'amont en aval)."""
+        order, seen = [], set()
+
+        def visit(name, path=()):
+            if name in path:
+                raise ValueError(f"Cycle dans le pipeline : {' -> '.join(path + (name,))}")
+            if name in seen:
+                return
+            for dep in self.stages[name].deps:
+                visit(dep, path + (name,))
+            seen.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def plan(self):
+        """
+        Empreinte et dossier de sortie de chaque étape, sans rien exécuter.
+
+        Returns:
+            Liste ordonnée de dictionnaires (name, key, out_dir, cached)
+        """
+        keys, plan, digests = {}, [], {}
+        for name in self._order():
+            stage = self.stages[name]
+            for path in stage.sources.values():
+                if not os.path.exists(path):
+                    raise FileNotFoundError(f"Étape {name} : source {path} introuvable.")
+                if path not in digests:
+                    digests[path] = file_sha256(path)
+            keys[name] = _stage_key(stage, keys, {src: digests[path] for src, path in stage.sources.items()})
+            out_dir = os.path.join(self.work_dir, name, keys[name][:16])
+            plan.append({'name': name, 'key': keys[name], 'out_dir': out_dir,
+                         'cached': os.path.exists(os.path.join(out_dir, MANIFEST))})
+        return plan
+
+    def _execute(self, stage, step, inputs):
+        out_dir = step['out_dir']
+        tmp_dir = f"{out_dir}.tmp-{os.getpid()}"
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+
+        start = time.perf_counter()
+        with METRICS.span(f'pipeline_{stage.name}'):
+            stage.func(tmp_dir, inputs, stage.params)
+        seconds = time.perf_counter() - start
+
+        with open(os.path.join(tmp_dir, MANIFEST), 'w') as f:
+            json.dump({'stage': stage.name, 'key': step['key'], 'params': stage.params,
+                       'deps': list(stage.deps), 'seconds': seconds, 'created': time.time()},
+                      f, indent=2, default=str)
+        # Le dossier n'apparaît sous son empreinte qu'une fois complet
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        os.replace(tmp_dir, out_dir)
+        return seconds
+
+    def run(self, force=(), max_workers=4, publish=True):
+        """
+        Exécute les étapes dont la sortie n'existe pas encore.
+
+        Args:
+            force: Étapes à rejouer même si leur sortie existe
+            max_workers: Étapes exécutées simultanément au plus
+            publish: Recopie les artefacts publiés à leur emplacement habituel
+
+        Returns:
+            Dictionnaire {étape: durée en secondes, ou None si sautée}
+        """
+        steps = {step['name']: step for step in self.plan()}
+        todo = {name for name, step in steps.items() if not step['cached'] or name in force}
+        timings = {name: None for name in steps if name not in todo}
+        for name in steps:
+            if name not in todo:
+                logger.info(f"⏭️  {name} : inchangé ({steps[name]['key'][:12]})")
+
+        running = {}
+        with ThreadPoolExecutor(max_workers) as pool:
+            while todo or running:
+                ready = [name for name in steps if name in todo
+                         and all(dep not in todo and dep not in running for dep in self.stages[name].deps)]
+                for name in ready:
+                    stage = self.stages[name]
+                    inputs = {dep: steps[dep]['out_dir'] for dep in stage.deps}
+                    inputs.update(stage.sources)
+                    logger.info(f"▶️  {name} ({steps[name]['key'][:12]})")
+                    running[name] = pool.submit(self._execute, stage, steps[name], inputs)
+                    todo.discard(name)
+
+                done, _ = wait(list(running.values()), return_when=FIRST_COMPLETED)
+                for name in [n for n, future in running.items() if future in done]:
+                    timings[name] = running.pop(name).result()
+                    logger.info(f"✅ {name} terminé en {timings[name]:.2f} s")
+
+        if publish:
+            for name, step in steps.items():
+                for artifact, dest in self.stages[name].publish.items():
+                    _publish(os.path.join(step['out_dir'], artifact), dest)
+        return timings
+
+
+# --- Étapes ----------------------------------------------------------------
+
+def _preprocess(out_dir, inputs, params):
+    rolling_state_path = os.path.join(out_dir, 'rolling_state.npz') if params['rolling_window'] else None
+    df = load_and_preprocess(inputs['raw'], preprocessor_path=os.path.join(out_dir, 'preprocessor.pkl'),
+                             prune=params['prune'], rolling_window=params['rolling_window'],
+                             rolling_state_path=rolling_state_path)
+    joblib.dump(df, os.path.join(out_dir, 'data.pkl'))
+    df.to_csv(os.path.join(out_dir, 'secom_preprocessed.csv'), index=False)
+
+
+def _split(out_dir, inputs, params):
+    df = joblib.load(os.path.join(inputs['preprocess'], 'data.pkl'))
+    X = df.drop('Target', axis=1)
+    y = df['Target'].astype(int)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=params['test_size'], random_state=params['random_state'], stratify=y
+    )
+    joblib.dump((X_train, y_train), os.path.join(out_dir, 'train.pkl'))
+    joblib.dump((X_test, y_test), os.path.join(out_dir, 'test_dataset.pkl'))
+
+
+def _resample(out_dir, inputs, params):
+    X_train, y_train = joblib.load(os.path.join(inputs['split'], 'train.pkl'))
+    X_res, y_res = smote_resample(X_train, y_train, k_neighbors=params['k_neighbors'],
+                                  random_state=params['random_state'])
+    joblib.dump((X_res, y_res), os.path.join(out_dir, 'resampled.pkl'))
+
+
+def _train(out_dir, inputs, params):
+    X_res, y_res = joblib.load(os.path.join(inputs['resample'], 'resampled.pkl'))
+    model = fit_forest(X_res, y_res, params['forest'], random_state=params['random_state'])
+    joblib.dump(model, os.path.join(out_dir, 'final_model_smote_rf.pkl'))
+
+
+def _train_binned(out_dir, inputs, params):
+    X_train, y_train = joblib.load(os.path.join(inputs['split'], 'train.pkl'))
+    model, edges, _ = fit_binned_boosting(X_train, y_train, params['boosting'], random_state=params['random_state'])
+    joblib.dump(model, os.path.join(out_dir, 'final_model_smote_rf.pkl'))
+    save_bin_edges(edges, list(X_train.columns), os.path.join(out_dir, 'bin_edges.npz'))
+
+
+def _model_inputs(train_dir, X):
+    """Données au format du modèle entraîné : codes uint8 si des bornes ont été sauvegardées."""
+    bins = load_bin_edges(os.path.join(train_dir, 'bin_edges.npz'))
+    return X if bins is None else transform_bins(bins['edges'], X[bins['feature_names']])
+
+
+def _compile(out_dir, inputs, params):
+    model_path = os.path.join(inputs['train'], 'final_model_smote_rf.pkl')
+    X_test, _ = joblib.load(os.path.join(inputs['split'], 'test_dataset.pkl'))
+    save_compiled(CompiledForest.from_estimator(joblib.load(model_path), list(X_test.columns)),
+                  os.path.join(out_dir, 'final_model_compiled'), source_path=model_path)
+
+
+def _operating_point(out_dir, inputs, params):
+    model = joblib.load(os.path.join(inputs['train'], 'final_model_smote_rf.pkl'))
+    X_train, y_train = joblib.load(os.path.join(inputs['split'], 'train.pkl'))
+    # Forêt : SMOTE rejoué dans chaque pli ; boosting : codes uint8, sans rééquilibrage
+    resample = isinstance(model, RandomForestClassifier)
+    point = cv_operating_point(model, _model_inputs(inputs['train'], X_train), y_train,
+                               cost_false_alarm=params['cost_false_alarm'],
+                               cost_missed_defect=params['cost_missed_defect'],
+                               random_state=params['random_state'], resample=resample,
+                               k_neighbors=params['k_neighbors'])
+    logger.info(f"🎯 Seuil de décision retenu : {point['threshold']:.3f}")
+    save_operating_point(point, os.path.join(out_dir, 'operating_point.json'))
+
+
+def _evaluate(out_dir, inputs, params):
+    model = joblib.load(os.path.join(inputs['train'], 'final_model_smote_rf.pkl'))
+    X_test, y_test = joblib.load(os.path.join(inputs['split'], 'test_dataset.pkl'))
+    with open(os.path.join(inputs['operating_point'], 'operating_point.json')) as f:
+        point = json.load(f)
+    metrics = evaluate_model(model, _model_inputs(inputs['train'], X_test), y_test, point)
+    metrics['backend'] = params['backend']
+    log_metrics(metrics)
+    joblib.dump(metrics, os.path.join(out_dir, 'final_metrics.pkl'))
+
+
+def _drift_reference(out_dir, inputs, params):
+    X_train, _ = joblib.load(os.path.join(inputs['split'], 'train.pkl'))
+    save_reference(build_reference(X_train, n_bins=params['n_bins']), os.path.join(out_dir, 'drift_reference.npz'))
+
+
+def _sensor_stats(out_dir, inputs, params):
+    df = joblib.load(os.path.join(inputs['preprocess'], 'data.pkl'))
+    raw_df = load_csv(inputs['raw'])
+    save_sensor_stats(compute_sensor_stats(df, raw_df=raw_df), os.path.join(out_dir, 'sensor_stats.npz'))
+
+
+def build_pipeline(work_dir=None):
+    """
+    Pipeline SC-QC défini par config.py : prétraitement → split → SMOTE → entraînement
+    → évaluation, avec les artefacts annexes (forêt compilée, seuil, référence de
+    dérive, index des statistiques capteurs). Avec MODEL_BACKEND = 'binned_hgb',
+    l'entraînement part directement du split (pas de SMOTE) et publie les bornes de
+    discrétisation.
+    """
+    seed = config.RANDOM_STATE
+    model_publish = {'final_model_smote_rf.pkl': 'results/final_model_smote_rf.pkl',
+                     'bin_edges.npz': BIN_EDGES_PATH}
+    if config.MODEL_BACKEND == 'binned_hgb':
+        train_stages = [
+            Stage('train', _train_binned, deps=['split'],
+                  params={'boosting': {'max_iter': config.N_ESTIMATORS}, 'random_state': seed},
+                  publish=model_publish),
+        ]
+    else:
+        forest_params = {'n_estimators': config.N_ESTIMATORS}
+        forest_params.update(load_best_params() or {})
+        train_stages = [
+            Stage('resample', _resample, deps=['split'],
+                  params={'k_neighbors': config.SMOTE_K_NEIGHBORS, 'random_state': seed}),
+            Stage('train', _train, deps=['resample'], params={'forest': forest_params, 'random_state': seed},
+                  publish=model_publish),
+        ]
+    stages = [
+        Stage('preprocess', _preprocess,
+              params={'prune': config.PRUNE_FEATURES, 'rolling_window': config.ROLLING_WINDOW},
+              sources={'raw': config.DATA_PATH},
+              publish={'secom_preprocessed.csv': 'data/secom_preprocessed.csv',
+                       'preprocessor.pkl': 'results/preprocessor.pkl',
+                       'rolling_state.npz': 'results/rolling_state.npz'}),
+        Stage('split', _split, deps=['preprocess'],
+              params={'test_size': config.TEST_SIZE, 'random_state': seed},
+              publish={'test_dataset.pkl': 'results/test_dataset.pkl'}),
+        Stage('sensor_stats', _sensor_stats, deps=['preprocess'], sources={'raw': config.DATA_PATH},
+              publish={'sensor_stats.npz': 'results/sensor_stats.npz'}),
+        Stage('drift_reference', _drift_reference, deps=['split'], params={'n_bins': 10},
+              publish={'drift_reference.npz': 'results/drift_reference.npz'}),
+        *train_stages,
+        Stage('compile', _compile, deps=['train', 'split'],
+              publish={'final_model_compiled': 'results/final_model_compiled'}),
+        Stage('operating_point', _operating_point, deps=['train', 'split'],
+              params={'cost_false_alarm': config.COST_FALSE_ALARM,
+                      'cost_missed_defect': config.COST_MISSED_DEFECT,
+                      'k_neighbors': config.SMOTE_K_NEIGHBORS, 'random_state': seed},
+              publish={'operating_point.json': 'results/operating_point.json'}),
+        Stage('evaluate', _evaluate, deps=['train', 'split', 'operating_point'],
+              params={'backend': config.MODEL_BACKEND},
+              publish={'final_metrics.pkl': 'results/final_metrics.pkl'}),
+    ]
+    return Pipeline(stages, work_dir or config.PIPELINE_DIR)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline SC-QC (étapes indexées par empreinte)")
+    parser.add_argument("--force", nargs="*", default=[], metavar="ÉTAPE",
+                        help="Rejoue ces étapes même si leur sortie existe")
+    parser.add_argument("--dry-run", action="store_true", help="Affiche les étapes à rejouer sans rien exécuter")
+    parser.add_argument("--jobs", type=int, default=4, help="Étapes exécutées simultanément")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+
+    pipeline = build_pipeline()
+    if args.dry_run:
+        for step in pipeline.plan():
+            status = "inchangé" if step['cached'] and step['name'] not in args.force else "à exécuter"
+            logger.info(f"{step['name']:<16} {step['key'][:12]}  {status}")
+        sys.exit(0)
+
+    start = time.perf_counter()
+    timings = pipeline.run(force=set(args.force), max_workers=args.jobs)
+    executed = [name for name, seconds in timings.items() if seconds is not None]
+    logger.info(f"\n✨ Pipeline terminé en {time.perf_counter() - start:.2f} s "
+                f"({len(executed)} étape(s) exécutée(s), {len(timings) - len(executed)} sautée(s))")
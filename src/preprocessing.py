@@ -1,55 +1,593 @@
 import pandas as pd
 import numpy as np
-from sklearn.impute import SimpleImputer
 import os
+import sys
+import argparse
+import logging
 
-def load_and_preprocess(file_path):
+# Permet l'exécution directe du script (python src/preprocessing.py)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.data_cache import load_csv
+from config import ROLLING_WINDOW
+from src.instrumentation import METRICS
+from src.rolling import ROLLING_STATE_PATH, RollingWindow, rolling_feature_names
+
+logger = logging.getLogger(__name__)
+
+TARGET_NAME = 'Pass/Fail'
+
+
+def _split_features_target(df):
     """
-    Charge, nettoie et prépare le dataset SECOM.
+    Sépare les features brutes de la cible (la colonne Time est ignorée).
     """
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"Le fichier {file_path} est introuvable.")
-        
-    print(f"--- Chargement de {file_path} ---")
-    df = pd.read_csv(file_path)
-    
     # 1. Suppression de la colonne Time
     if 'Time' in df.columns:
         df = df.drop('Time', axis=1)
-        
+
     # 2. Gestion de la cible
-    target_name = 'Pass/Fail'
+    target_name = TARGET_NAME
     if target_name not in df.columns:
         # Si déjà renommée ou déplacée
         target_name = df.columns[-1]
-        
-    y = df[target_name].replace({-1: 0, 1: 1})
+
+    y = df[target_name].replace({-1: 0, 1: 1}).astype(int)
     X = df.drop(target_name, axis=1)
-    
-    # 3. Encodage de la colonne Phase
+    return X, y
+
+
+def _encoded_columns(raw_columns, phase_categories):
+    """
+    Noms des colonnes après encodage de Phase (même ordre que pd.get_dummies).
+    """
+    columns = [c for c in raw_columns if c != 'Phase']
+    if phase_categories is not None:
+        columns += [f"Phase_{cat}" for cat in phase_categories[1:]]
+    return columns
+
+
+def fit_preprocessor(X, max_missing_ratio=0.5, prune=False, **prune_params):
+    """
+    Apprend l'état du prétraitement sur les features brutes d'entraînement.
+
+    Args:
+        X: DataFrame des features brutes (sans Time ni cible)
+        max_missing_ratio: Proportion maximale de valeurs manquantes tolérée
+        prune: Si True, retire aussi les capteurs constants, quasi-constants et redondants
+        **prune_params: Paramètres transmis à select_features
+
+    Returns:
+        state: Dictionnaire compact (indices conservés, médianes, catégories de Phase)
+    """
+    raw_columns = list(X.columns)
+
+    # 3. Catégories de la colonne Phase (drop_first comme pd.get_dummies)
+    phase_categories = None
     if 'Phase' in X.columns:
-        X = pd.get_dummies(X, columns=['Phase'], prefix='Phase', drop_first=True)
-        
+        phase_categories = sorted(X['Phase'].dropna().unique().tolist())
+
+    state = {
+        'raw_columns': raw_columns,
+        'phase_categories': phase_categories,
+        'kept_indices': np.arange(len(_encoded_columns(raw_columns, phase_categories)), dtype=np.int32),
+        'feature_names': _encoded_columns(raw_columns, phase_categories),
+        'medians': None,
+    }
+    values = _encode(state, X)
+
     # 4. Suppression des colonnes avec trop de vides (> 50%)
-    missing_ratio = X.isnull().mean()
-    cols_to_keep = missing_ratio[missing_ratio <= 0.5].index
-    X = X[cols_to_keep]
-    
-    # 5. Imputation par la médiane
-    imputer = SimpleImputer(strategy='median')
-    X_imputed = pd.DataFrame(imputer.fit_transform(X), columns=X.columns)
-    
+    missing_ratio = np.isnan(values).mean(axis=0)
+    kept = np.flatnonzero(missing_ratio <= max_missing_ratio).astype(np.int32)
+    encoded = _encoded_columns(raw_columns, phase_categories)
+
+    # 5. Médianes d'entraînement des colonnes conservées
+    state['kept_indices'] = kept
+    state['feature_names'] = [encoded[i] for i in kept]
+    state['medians'] = np.nanmedian(values[:, kept], axis=0).astype(np.float64)
+
+    # 6. Réduction des features sur la matrice imputée
+    if prune:
+        imputed = values[:, kept]
+        imputed = np.where(np.isnan(imputed), state['medians'], imputed)
+        mask, report = select_features(imputed, **prune_params)
+        state['pruning'] = {reason: [state['feature_names'][i] for i in idx] for reason, idx in report.items()}
+        state['kept_indices'] = kept[mask]
+        state['feature_names'] = [name for name, keep in zip(state['feature_names'], mask) if keep]
+        state['medians'] = state['medians'][mask]
+    return state
+
+
+def select_features(values, variance_threshold=0.0, max_dominance=0.99, corr_threshold=0.98, block_size=128):
+    """
+    Sélection vectorisée des features : retire les colonnes constantes ou de faible
+    variance, quasi-constantes (une valeur occupe plus de `max_dominance` des lignes)
+    et redondantes (|corrélation| > corr_threshold avec une colonne déjà conservée).
+
+    Les corrélations sont calculées par blocs de `block_size` colonnes contre les
+    seules colonnes conservées : la matrice de corrélation complète n'est jamais
+    construite et la mémoire reste de l'ordre de n_lignes x block_size.
+
+    Args:
+        values: Matrice (n_samples, n_features) sans valeurs manquantes
+
+    Returns:
+        mask: Booléens des colonnes conservées
+        report: {motif: indices des colonnes retirées}
+    """
+    n_samples, n_features = values.shape
+    mean = values.mean(axis=0)
+    std = values.std(axis=0)
+
+    # 1. Variance faible
+    low_variance = std ** 2 <= variance_threshold
+
+    # 2. Quasi-constantes : plus longue série de valeurs égales après tri
+    sorted_values = np.sort(values, axis=0)
+    rows = np.arange(n_samples)[:, None]
+    new_run = np.vstack([np.ones((1, n_features), dtype=bool), sorted_values[1:] != sorted_values[:-1]])
+    run_start = np.maximum.accumulate(np.where(new_run, rows, 0), axis=0)
+    dominance = (rows - run_start + 1).max(axis=0) / n_samples
+    quasi_constant = (dominance > max_dominance) & ~low_variance
+    del sorted_values, new_run, run_start
+
+    # 3. Redondance : sélection gloutonne dans l'ordre des colonnes, par blocs
+    candidates = np.flatnonzero(~(low_variance | quasi_constant))
+    correlated = np.zeros(n_features, dtype=bool)
+    kept = []
+    for start in range(0, len(candidates), block_size):
+        block = candidates[start:start + block_size]
+        z_block = ((values[:, block] - mean[block]) / std[block]).astype(np.float32)
+        dropped = np.zeros(len(block), dtype=bool)
+
+        # Contre les colonnes déjà conservées (par blocs également)
+        for k in range(0, len(kept), block_size):
+            previous = kept[k:k + block_size]
+            z_prev = ((values[:, previous] - mean[previous]) / std[previous]).astype(np.float32)
+            corr = np.abs(z_prev.T @ z_block) / n_samples
+            dropped |= (corr > corr_threshold).any(axis=0)
+
+        # À l'intérieur du bloc, dans l'ordre des colonnes
+        corr = np.abs(z_block.T @ z_block) / n_samples
+        for j in range(len(block)):
+            if not dropped[j]:
+                dropped[j + 1:] |= corr[j, j + 1:] > corr_threshold
+
+        correlated[block[dropped]] = True
+        kept.extend(block[~dropped].tolist())
+
+    mask = ~(low_variance | quasi_constant | correlated)
+    report = {
+        'low_variance': np.flatnonzero(low_variance).tolist(),
+        'quasi_constant': np.flatnonzero(quasi_constant).tolist(),
+        'correlated': np.flatnonzero(correlated).tolist(),
+    }
+    return mask, report
+
+
+def _encode(state, X):
+    """
+    Construit la matrice float64 des colonnes conservées à partir des features brutes.
+    """
+    encoded = _encoded_columns(state['raw_columns'], state['phase_categories'])
+    n_numeric = len(encoded) - (len(state['phase_categories']) - 1 if state['phase_categories'] else 0)
+    kept = state['kept_indices']
+
+    numeric_names = [encoded[i] for i in kept if i < n_numeric]
+    values = X.reindex(columns=numeric_names).to_numpy(dtype=np.float64)
+
+    dummy_kept = kept[kept >= n_numeric] - n_numeric
+    if len(dummy_kept) > 0:
+        phase = X['Phase'].to_numpy() if 'Phase' in X.columns else np.full(len(X), None)
+        categories = np.asarray(state['phase_categories'][1:], dtype=object)[dummy_kept]
+        dummies = (phase[:, None] == categories[None, :]).astype(np.float64)
+        values = np.hstack([values, dummies])
+    return values
+
+
+def apply_preprocessor(state, X):
+    """
+    Applique l'état appris : sélection des colonnes et imputation par les médianes
+    d'entraînement, en une seule passe vectorisée (aucun réajustement).
+
+    Les capteurs absents sont remplacés par leur médiane d'entraînement ; le scoring
+    utilise compile_schema une seule fois puis align_features, plus strict.
+
+    Args:
+        state: Dictionnaire retourné par fit_preprocessor
+        X: DataFrame brut ou déjà au format prétraité
+
+    Returns:
+        DataFrame des features prêtes pour le modèle
+    """
+    return align_features(compile_schema(state, missing_sensors='median'), X)
+
+
+MISSING_SENSOR_POLICIES = ('error', 'median')
+
+# En deçà, les données non alignées sont converties d'un bloc (voir align_features)
+_SMALL_FRAME_ROWS = 64
+
+
+def compile_schema(state, missing_sensors='error'):
+    """
+    Compile le schéma d'entrée du modèle à partir de l'état du prétraitement.
+
+    Calculé une seule fois au chargement : index des colonnes attendues (recherche
+    nom -> position par table de hachage), position des indicatrices de Phase,
+    médianes d'imputation et politique pour les capteurs absents.
+
+    Args:
+        state: Dictionnaire retourné par fit_preprocessor
+        missing_sensors: 'error' (capteur absent refusé) ou 'median' (médiane d'entraînement)
+
+    Returns:
+        Dictionnaire utilisé par align_features
+    """
+    if missing_sensors not in MISSING_SENSOR_POLICIES:
+        raise ValueError(f"missing_sensors doit valoir {MISSING_SENSOR_POLICIES}, reçu {missing_sensors!r}")
+    encoded = _encoded_columns(state['raw_columns'], state['phase_categories'])
+    n_numeric = len(encoded) - (len(state['phase_categories']) - 1 if state['phase_categories'] else 0)
+    kept = np.asarray(state['kept_indices'])
+    dummy_slots = np.flatnonzero(kept >= n_numeric)
+    categories = state['phase_categories'][1:] if state['phase_categories'] else []
+    return {
+        'columns': pd.Index(state['feature_names']),
+        'medians': np.asarray(state['medians'], dtype=np.float64),
+        'dummy_slots': dummy_slots,
+        'dummy_categories': np.asarray(categories, dtype=object)[kept[dummy_slots] - n_numeric],
+        'missing_sensors': missing_sensors,
+    }
+
+
+def _is_float_frame(X):
+    """Vrai si toutes les colonnes sont float32 ou toutes float64 (un seul bloc numpy)."""
+    dtypes = set(X.dtypes)
+    return len(dtypes) == 1 and dtypes.pop() in (np.float32, np.float64)
+
+
+def _to_float_columns(block):
+    """Convertit les colonnes non numériques (texte, objets) ; échoue en nommant le capteur fautif."""
+    converted = {}
+    for name, dtype in block.dtypes.items():
+        if dtype.kind in 'fiub':
+            continue
+        try:
+            converted[name] = pd.to_numeric(block[name], errors='raise')
+        except (ValueError, TypeError):
+            bad = block[name][pd.to_numeric(block[name], errors='coerce').isna() & block[name].notna()]
+            raise ValueError(f"Capteur {name} : valeur non numérique {bad.iloc[0]!r} "
+                             f"(ligne {bad.index[0]})") from None
+    return block.assign(**converted) if converted else block
+
+
+def align_features(schema, X):
+    """
+    Aligne des données sur le schéma du modèle : réordonne, convertit en float et
+    impute en une seule passe vectorisée.
+
+    Des données déjà alignées (mêmes colonnes dans le même ordre, float32 ou float64,
+    sans valeur manquante) sont retournées telles quelles, sans copie. Les colonnes
+    supplémentaires (Time, cible, capteurs écartés) sont ignorées.
+
+    Args:
+        schema: Dictionnaire retourné par compile_schema
+        X: DataFrame brut ou prétraité, ou tableau (n_samples, n_features) dans l'ordre du schéma
+
+    Returns:
+        DataFrame des features prêtes pour le modèle
+
+    Raises:
+        ValueError: colonnes dupliquées, capteur absent (politique 'error'), valeur non
+            numérique ou infinie, tableau de largeur inattendue
+    """
+    columns = schema['columns']
+    if isinstance(X, np.ndarray):
+        if X.ndim != 2 or X.shape[1] != len(columns) or X.dtype.kind not in 'fiub':
+            raise ValueError(f"Tableau numérique (n, {len(columns)}) attendu, reçu {X.dtype} {X.shape}")
+        X = pd.DataFrame(X, columns=columns, copy=False)
+    elif not isinstance(X, pd.DataFrame):
+        raise TypeError(f"DataFrame ou tableau numpy attendu, reçu {type(X).__name__}")
+
+    if X.columns.equals(columns) and _is_float_frame(X):
+        # Chemin rapide : vue sur le bloc numpy existant, un seul contrôle des valeurs
+        values = X.to_numpy(copy=False)
+        if np.isfinite(values).all():
+            return X
+        values = values.astype(np.float64)
+    else:
+        if not X.columns.is_unique:
+            duplicated = X.columns[X.columns.duplicated()].unique().tolist()
+            raise ValueError(f"Colonnes dupliquées : {duplicated[:5]}")
+        positions = X.columns.get_indexer(columns)
+        slots = np.flatnonzero(positions >= 0)
+
+        # Une seule matrice de sortie : capteurs présents copiés à leur place, absents à NaN
+        values = np.full((len(X), len(columns)), np.nan)
+        try:
+            if len(X) <= _SMALL_FRAME_ROWS:
+                # Quelques lignes d'un CSV brut (un bloc pandas par colonne) : une conversion
+                # globale coûte moins cher qu'une sélection de colonnes bloc par bloc
+                values[:, slots] = X.to_numpy()[:, positions[slots]].astype(np.float64)
+            else:
+                values[:, slots] = X.iloc[:, positions[slots]].to_numpy(dtype=np.float64)
+        except (ValueError, TypeError):
+            # Conversion colonne par colonne pour nommer le capteur fautif
+            values[:, slots] = _to_float_columns(X.iloc[:, positions[slots]]).to_numpy(dtype=np.float64)
+
+        # Indicatrices de Phase recalculées à partir des données brutes
+        dummy_slots = schema['dummy_slots'][positions[schema['dummy_slots']] < 0]
+        if len(dummy_slots) > 0 and 'Phase' in X.columns:
+            categories = schema['dummy_categories'][np.searchsorted(schema['dummy_slots'], dummy_slots)]
+            values[:, dummy_slots] = X['Phase'].to_numpy()[:, None] == categories[None, :]
+
+        absent = np.flatnonzero(positions < 0)
+        absent = absent[~np.isin(absent, dummy_slots)] if 'Phase' in X.columns else absent
+        if len(absent) > 0:
+            names = columns[absent].tolist()
+            if schema['missing_sensors'] == 'error':
+                raise ValueError(f"{len(names)} capteurs attendus absents : {names[:5]}"
+                                 + (" ..." if len(names) > 5 else ""))
+            logger.warning(f"⚠️  {len(names)} capteurs absents remplacés par leur médiane : {names[:5]}")
+            METRICS.inc('missing_sensors', len(names))
+
+    missing = np.isnan(values)
+    if np.isinf(values).any():
+        bad = columns[np.flatnonzero(np.isinf(values).any(axis=0))].tolist()
+        raise ValueError(f"Valeurs infinies dans les capteurs : {bad[:5]}")
+    if missing.any():
+        if METRICS.enabled:
+            METRICS.inc('imputed_values', int(missing.sum()))
+        np.copyto(values, np.broadcast_to(schema['medians'], values.shape), where=missing)
+    return pd.DataFrame(values, columns=columns, index=X.index)
+
+
+def add_rolling_features(state, X, times=None, rolling=None):
+    """
+    Ajoute les features glissantes de l'état (moyenne, écart-type et delta de chaque
+    capteur), calculées plaquette par plaquette dans l'ordre chronologique.
+
+    Args:
+        state: État du prétraitement, avec sa clé 'rolling'
+        X: Features prétraitées (colonnes state['feature_names'])
+        times: Colonne Time (optionnel) ; sinon l'ordre des lignes fait foi
+        rolling: Fenêtre à prolonger (par défaut, fenêtre vide : début d'historique)
+
+    Returns:
+        (X complété des features glissantes, fenêtre en fin de lot)
+    """
+    if rolling is None:
+        rolling = RollingWindow(state['feature_names'], state['rolling']['window'])
+    features = rolling.transform(X[state['feature_names']].to_numpy(), times)
+    return pd.concat([X, pd.DataFrame(features, columns=rolling.feature_names, index=X.index)], axis=1), rolling
+
+
+def has_rolling_features(state, X):
+    """Vrai si X contient déjà toutes les features glissantes de l'état."""
+    return pd.Index(rolling_feature_names(state['feature_names'])).isin(X.columns).all()
+
+
+def save_preprocessor(state, path):
+    """Sauvegarde l'état du prétraitement à côté du modèle."""
+    import joblib
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    joblib.dump(state, path)
+
+
+def load_preprocessor(path):
+    """Charge l'état du prétraitement sauvegardé par save_preprocessor."""
+    import joblib
+    return joblib.load(path)
+
+
+def load_and_preprocess(file_path, preprocessor_path=None, prune=True, rolling_window=0,
+                        rolling_state_path=None):
+    """
+    Charge, nettoie et prépare le dataset SECOM.
+
+    Args:
+        file_path: Chemin du CSV brut
+        preprocessor_path: Si fourni, l'état appris y est sauvegardé pour le scoring
+        prune: Si True, retire les capteurs constants, quasi-constants et redondants
+        rolling_window: Si > 0, ajoute moyenne, écart-type et delta de chaque capteur sur
+            les rolling_window plaquettes précédentes (ordre de la colonne Time)
+        rolling_state_path: Si fourni, la fenêtre en fin d'historique y est sauvegardée
+            pour être prolongée au scoring
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Le fichier {file_path} est introuvable.")
+
+    logger.info(f"--- Chargement de {file_path} ---")
+    with METRICS.span('preprocess_load'):
+        df = load_csv(file_path)
+        times = df['Time'].to_numpy() if 'Time' in df.columns else None
+        X, y = _split_features_target(df)
+
+    # 3-6. Encodage de Phase, filtrage des colonnes vides, médianes et réduction
+    with METRICS.span('preprocess_fit'):
+        state = fit_preprocessor(X, prune=prune)
+    if rolling_window > 0:
+        state['rolling'] = {'window': rolling_window}
+    if 'pruning' in state:
+        counts = {reason: len(names) for reason, names in state['pruning'].items()}
+        logger.info(f"Réduction des features : {counts}")
+    if preprocessor_path is not None:
+        save_preprocessor(state, preprocessor_path)
+        logger.info(f"État du prétraitement sauvegardé : {preprocessor_path}")
+
     # 6. Recombinaison
-    df_clean = X_imputed.copy()
+    with METRICS.span('preprocess_apply'):
+        df_clean = apply_preprocessor(state, X).reset_index(drop=True)
+
+    # 7. Features glissantes, calculées plaquette par plaquette dans l'ordre chronologique
+    if rolling_window > 0:
+        with METRICS.span('preprocess_rolling'):
+            df_clean, rolling = add_rolling_features(state, df_clean, times)
+        if rolling_state_path is not None:
+            rolling.save(rolling_state_path)
+        logger.info(f"Features glissantes ajoutées : {len(rolling.feature_names)} (fenêtre {rolling_window})")
+    elif rolling_state_path is not None and os.path.exists(rolling_state_path):
+        # Fenêtre d'un prétraitement précédent : sans objet pour ce modèle
+        os.remove(rolling_state_path)
     df_clean['Target'] = y.values
-    
-    print(f"Prétraitement terminé : {df_clean.shape[1]} colonnes conservées.")
+
+    logger.info(f"Prétraitement terminé : {df_clean.shape[1]} colonnes conservées.")
     return df_clean
 
+
+class QuantileSketch:
+    """
+    Résumé de quantiles en mémoire bornée pour une colonne.
+
+    Les valeurs sont conservées triées sous forme de centroïdes pondérés ; au-delà
+    de `capacity` centroïdes, les voisins de même rang cumulé sont fusionnés.
+    L'erreur de rang reste de l'ordre de 1 / capacity, quelle que soit la taille du flux.
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.values = np.empty(0)
+        self.weights = np.empty(0)
+
+    def update(self, x):
+        x = x[~np.isnan(x)]
+        if len(x) == 0:
+            return
+        values = np.concatenate([self.values, x])
+        weights = np.concatenate([self.weights, np.ones(len(x))])
+        order = np.argsort(values, kind='mergesort')
+        values, weights = values[order], weights[order]
+
+        if len(values) > self.capacity:
+            # Regroupement en `capacity` tranches de poids cumulé égal
+            cum = np.cumsum(weights) - weights / 2
+            bins = np.minimum(cum / cum[-1] * self.capacity, self.capacity - 1).astype(int)
+            w = np.bincount(bins, weights=weights, minlength=self.capacity)
+            v = np.bincount(bins, weights=weights * values, minlength=self.capacity)
+            nonzero = w > 0
+            values, weights = v[nonzero] / w[nonzero], w[nonzero]
+
+        self.values, self.weights = values, weights
+
+    def quantile(self, q):
+        if len(self.values) == 0:
+            return np.nan
+        cum = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * self.weights.sum(), cum, self.values))
+
+
+def load_and_preprocess_chunked(file_path, output_path, chunksize=10000, preprocessor_path=None,
+                                max_missing_ratio=0.5, sketch_capacity=256):
+    """
+    Variante en mémoire bornée de load_and_preprocess, en deux passes sur le fichier.
+
+    La première passe compte les valeurs manquantes et alimente un QuantileSketch par
+    colonne (médianes approchées) ; la seconde applique l'état obtenu bloc par bloc et
+    écrit le résultat sur disque. Le pic mémoire dépend de `chunksize`, pas du fichier.
+    La réduction des features (select_features) n'est pas appliquée dans ce mode.
+
+    Args:
+        file_path: Chemin du CSV brut
+        output_path: CSV prétraité à écrire
+        chunksize: Nombre de lignes lues à la fois
+        preprocessor_path: Si fourni, l'état appris y est sauvegardé pour le scoring
+        max_missing_ratio: Proportion maximale de valeurs manquantes tolérée
+        sketch_capacity: Nombre de centroïdes par colonne pour les médianes
+
+    Returns:
+        state: État du prétraitement (voir fit_preprocessor)
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Le fichier {file_path} est introuvable.")
+
+    # Passe 1 : taux de valeurs manquantes, médianes approchées et catégories de Phase
+    logger.info(f"--- Passe 1/2 : statistiques de {file_path} ---")
+    raw_columns, numeric_columns = None, None
+    sketches, non_null, n_rows = None, None, 0
+    phase_counts = {}
+    for chunk in pd.read_csv(file_path, chunksize=chunksize):
+        X, _ = _split_features_target(chunk)
+        if raw_columns is None:
+            raw_columns = list(X.columns)
+            numeric_columns = [c for c in raw_columns if c != 'Phase']
+            sketches = [QuantileSketch(sketch_capacity) for _ in numeric_columns]
+            non_null = np.zeros(len(numeric_columns), dtype=np.int64)
+
+        values = X[numeric_columns].to_numpy(dtype=np.float64)
+        non_null += (~np.isnan(values)).sum(axis=0)
+        for j, sketch in enumerate(sketches):
+            sketch.update(values[:, j])
+        if 'Phase' in X.columns:
+            for cat, count in X['Phase'].value_counts().items():
+                phase_counts[cat] = phase_counts.get(cat, 0) + int(count)
+        n_rows += len(X)
+
+    if raw_columns is None:
+        raise ValueError(f"Le fichier {file_path} ne contient aucune ligne.")
+
+    phase_categories = sorted(phase_counts) if 'Phase' in raw_columns else None
+    encoded = _encoded_columns(raw_columns, phase_categories)
+
+    # Les indicatrices de Phase ne sont jamais manquantes ; leur médiane est 0 ou 1
+    missing_ratio = np.concatenate([1 - non_null / n_rows, np.zeros(len(encoded) - len(numeric_columns))])
+    medians = [sketch.quantile(0.5) for sketch in sketches]
+    if phase_categories is not None:
+        medians += [float(phase_counts[cat] / n_rows > 0.5) for cat in phase_categories[1:]]
+
+    kept = np.flatnonzero(missing_ratio <= max_missing_ratio).astype(np.int32)
+    state = {
+        'raw_columns': raw_columns,
+        'phase_categories': phase_categories,
+        'kept_indices': kept,
+        'feature_names': [encoded[i] for i in kept],
+        'medians': np.asarray(medians, dtype=np.float64)[kept],
+    }
+    if preprocessor_path is not None:
+        save_preprocessor(state, preprocessor_path)
+        logger.info(f"État du prétraitement sauvegardé : {preprocessor_path}")
+
+    # Passe 2 : écriture des blocs nettoyés
+    logger.info(f"--- Passe 2/2 : écriture de {output_path} ---")
+    directory = os.path.dirname(output_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    header = True
+    for chunk in pd.read_csv(file_path, chunksize=chunksize):
+        X, y = _split_features_target(chunk)
+        chunk_clean = apply_preprocessor(state, X)
+        chunk_clean['Target'] = y.values
+        chunk_clean.to_csv(output_path, mode='w' if header else 'a', header=header, index=False)
+        header = False
+
+    logger.info(f"Prétraitement terminé : {n_rows} lignes, {len(kept) + 1} colonnes conservées.")
+    return state
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prétraitement du dataset SECOM")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Active le mode en mémoire bornée (lignes lues par bloc)")
+    parser.add_argument("--no-prune", action="store_true",
+                        help="Conserve les capteurs constants et redondants")
+    parser.add_argument("--rolling-window", type=int, default=ROLLING_WINDOW,
+                        help="Features glissantes sur les N plaquettes précédentes (0 : désactivées)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+
     # Test du script
     raw_data_path = "data/uci-secom.csv"
     if os.path.exists(raw_data_path):
-        processed_df = load_and_preprocess(raw_data_path)
-        processed_df.to_csv("data/secom_preprocessed.csv", index=False)
-        print("Fichier de sortie généré : data/secom_preprocessed.csv")
+        if args.chunksize:
+            if args.rolling_window:
+                logger.warning("⚠️  Features glissantes non disponibles en mode --chunksize")
+            load_and_preprocess_chunked(raw_data_path, "data/secom_preprocessed.csv",
+                                        chunksize=args.chunksize, preprocessor_path="results/preprocessor.pkl")
+        else:
+            processed_df = load_and_preprocess(raw_data_path, preprocessor_path="results/preprocessor.pkl",
+                                               prune=not args.no_prune, rolling_window=args.rolling_window,
+                                               rolling_state_path=ROLLING_STATE_PATH)
+            processed_df.to_csv("data/secom_preprocessed.csv", index=False)
+        logger.info("Fichier de sortie généré : data/secom_preprocessed.csv")
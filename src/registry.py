@@ -0,0 +1,392 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Permet l'exécution directe du script (python src/registry.py)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.instrumentation import METRICS
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_DIR = 'results/registry'
+DEFAULT_LINE = 'default'
+CURRENT_NAME = 'CURRENT'
+VERSION_MANIFEST = 'version.json'
+STATE_DIR = 'state'
+
+# Artefacts d'un modèle déployable. rolling_state.npz n'est que la fenêtre de fin
+# d'entraînement : l'état modifiable au scoring est écrit dans version_state_dir
+MODEL_ARTIFACTS = (
+    'final_model_smote_rf.pkl',
+    'final_model_compiled',
+    'final_metrics.pkl',
+    'preprocessor.pkl',
+    'operating_point.json',
+    'bin_edges.npz',
+    'drift_reference.npz',
+    'rolling_state.npz',
+)
+
+
+def _artifact_bytes(directory):
+    """Taille sur disque des artefacts d'un modèle (estimation de son empreinte mémoire)."""
+    total = 0
+    for name in MODEL_ARTIFACTS:
+        path = os.path.join(directory, name)
+        if os.path.isdir(path):
+            total += sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+        elif os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+
+def version_state_dir(directory):
+    """
+    Dossier de l'état modifiable au scoring (suivi de dérive, fenêtre glissante) d'un
+    modèle : <registre>/<ligne>/state/<version> pour une version du registre, qui n'est
+    jamais réécrite ; le dossier des artefacts lui-même hors registre.
+    """
+    if not os.path.exists(os.path.join(directory, VERSION_MANIFEST)):
+        return directory
+    directory = os.path.normpath(directory)
+    return os.path.join(os.path.dirname(directory), STATE_DIR, os.path.basename(directory))
+
+
+def list_lines(registry_dir=REGISTRY_DIR):
+    """Lignes de production ayant une version active."""
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(name for name in os.listdir(registry_dir)
+                  if os.path.exists(os.path.join(registry_dir, name, CURRENT_NAME)))
+
+
+def list_versions(line=DEFAULT_LINE, registry_dir=REGISTRY_DIR):
+    line_dir = os.path.join(registry_dir, line)
+    if not os.path.isdir(line_dir):
+        return []
+    return sorted(name for name in os.listdir(line_dir)
+                  if os.path.exists(os.path.join(line_dir, name, VERSION_MANIFEST)))
+
+
+def current_version(line=DEFAULT_LINE, registry_dir=REGISTRY_DIR):
+    """Version active d'une ligne, ou None."""
+    try:
+        with open(os.path.join(registry_dir, line, CURRENT_NAME)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def activate_version(line, version, registry_dir=REGISTRY_DIR):
+    """
+    Rend une version active (publication ou retour arrière) par remplacement atomique
+    du pointeur CURRENT : les lecteurs voient l'ancienne ou la nouvelle version.
+    """
+    line_dir = os.path.join(registry_dir, line)
+    if not os.path.exists(os.path.join(line_dir, version, VERSION_MANIFEST)):
+        raise ValueError(f"Version {version} introuvable pour la ligne {line}")
+    tmp_path = os.path.join(line_dir, f'{CURRENT_NAME}.{uuid.uuid4().hex[:8]}.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(line_dir, CURRENT_NAME))
+
+
+def publish_model(source_dir='results', line=DEFAULT_LINE, registry_dir=REGISTRY_DIR, activate=True, note=None):
+    """
+    Enregistre les artefacts d'un modèle entraîné comme nouvelle version d'une ligne.
+
+    La version est copiée dans un dossier temporaire puis renommée : une version
+    visible est toujours complète, et n'est plus jamais modifiée.
+
+    Args:
+        source_dir: Dossier des artefacts (sortie de src/training.py ou src/pipeline.py)
+        line: Ligne de production (ou phase) servie par ce modèle
+        registry_dir: Racine du registre
+        activate: Si True, la nouvelle version devient active
+        note: Commentaire libre enregistré dans le manifeste
+
+    Returns:
+        Nom de la version (v0001, v0002, ...)
+    """
+    if not os.path.exists(os.path.join(source_dir, MODEL_ARTIFACTS[0])):
+        raise FileNotFoundError(f"Aucun modèle dans {source_dir}")
+    line_dir = os.path.join(registry_dir, line)
+    os.makedirs(line_dir, exist_ok=True)
+
+    tmp_dir = os.path.join(line_dir, f'.tmp-{uuid.uuid4().hex[:8]}')
+    os.makedirs(tmp_dir)
+    for name in MODEL_ARTIFACTS:
+        path = os.path.join(source_dir, name)
+        if os.path.isdir(path):
+            shutil.copytree(path, os.path.join(tmp_dir, name))
+        elif os.path.exists(path):
+            shutil.copy2(path, os.path.join(tmp_dir, name))
+
+    manifest = {'line': line, 'created': time.time(), 'source': os.path.abspath(source_dir), 'note': note}
+    metrics_path = os.path.join(source_dir, 'final_metrics.pkl')
+    if os.path.exists(metrics_path):
+        import joblib
+        metrics = joblib.load(metrics_path)
+        manifest['metrics'] = {k: float(metrics[k]) for k in ('accuracy', 'precision', 'recall', 'f1_score')
+                               if k in metrics}
+        manifest['backend'] = metrics.get('backend', 'random_forest')
+
+    # Numéro suivant ; un renommage concurrent sur le même numéro échoue et on réessaie
+    while True:
+        existing = [int(v[1:]) for v in list_versions(line, registry_dir) if v[1:].isdigit()]
+        version = f"v{max(existing, default=0) + 1:04d}"
+        manifest['version'] = version
+        with open(os.path.join(tmp_dir, VERSION_MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        try:
+            os.rename(tmp_dir, os.path.join(line_dir, version))
+            break
+        except OSError:
+            if not os.path.exists(os.path.join(line_dir, version)):
+                raise
+
+    if activate:
+        activate_version(line, version, registry_dir)
+    logger.info(f"📦 Ligne {line} : version {version} enregistrée{' et activée' if activate else ''}")
+    return version
+
+
+class ModelRegistry:
+    """
+    Modèles chargés en mémoire, par ligne de production et par version.
+
+    - Routage : chaque ligne est servie par sa version active ; une ligne sans modèle
+      enregistré est servie par la ligne par défaut.
+    - Cache LRU borné par un budget mémoire (taille des artefacts) : les versions
+      inactives les moins récemment utilisées sont libérées en premier ; une version
+      active n'est jamais libérée.
+    - Remplacement à chaud : le pointeur CURRENT est relu au plus toutes les
+      `refresh_interval` secondes ; une nouvelle version est chargée en arrière-plan
+      et ne remplace l'ancienne qu'une fois prête. Les prédictions en cours gardent
+      leur référence au modèle qu'elles utilisent : rien n'est bloqué.
+
+    La ligne par défaut sans version enregistrée est servie depuis `fallback_dir`
+    (artefacts de src/training.py), rechargée lorsque le modèle y est réécrit.
+    """
+
+    def __init__(self, loader, registry_dir=None, memory_budget_mb=1024, default_line=DEFAULT_LINE,
+                 fallback_dir=None, refresh_interval=1.0):
+        """
+        Args:
+            loader: Fonction loader(dossier) -> modèle prêt à l'emploi
+            registry_dir: Racine du registre
+            memory_budget_mb: Budget mémoire du cache de modèles
+            default_line: Ligne servant les requêtes sans ligne connue
+            fallback_dir: Artefacts utilisés pour la ligne par défaut hors registre
+            refresh_interval: Délai minimal entre deux relectures du pointeur d'une ligne
+        """
+        # Par défaut, on teste les deux localisations classiques (depuis notebooks/ ou depuis racine)
+        if registry_dir is None:
+            paths_to_test = [REGISTRY_DIR, os.path.join('..', REGISTRY_DIR)]
+            registry_dir = next((p for p in paths_to_test if os.path.exists(p)), paths_to_test[0])
+        if fallback_dir is None:
+            paths_to_test = ['results', os.path.join('..', 'results')]
+            fallback_dir = next((p for p in paths_to_test if os.path.exists(p)), paths_to_test[0])
+        self.loader = loader
+        self.registry_dir = registry_dir
+        self.memory_budget = memory_budget_mb * 1e6
+        self.default_line = default_line
+        self.fallback_dir = fallback_dir
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()   # (ligne, version) -> {'model', 'bytes', 'directory'}
+        self._active = {}             # ligne -> (version, modèle)
+        self._routes = {}             # ligne demandée -> ligne servie
+        self._checked = {}            # ligne -> date de la dernière lecture du pointeur
+        self._loading = {}            # (ligne, version) -> threading.Event
+        self.stats = {'hits': 0, 'loads': 0, 'swaps': 0, 'evictions': 0}
+
+    def _pointer(self, line):
+        """(version, dossier) actifs d'une ligne, ou (None, None)."""
+        version = current_version(line, self.registry_dir)
+        if version is not None:
+            return version, os.path.join(self.registry_dir, line, version)
+        model_path = os.path.join(self.fallback_dir, MODEL_ARTIFACTS[0])
+        if line == self.default_line and os.path.exists(model_path):
+            # Hors registre : la version suit la date du modèle (réentraînement sur place)
+            return f"local-{os.stat(model_path).st_mtime_ns}", self.fallback_dir
+        return None, None
+
+    def lines(self):
+        """Lignes routables (la ligne par défaut en premier)."""
+        return [self.default_line] + [line for line in list_lines(self.registry_dir) if line != self.default_line]
+
+    def get(self, line=None):
+        """
+        Modèle actif d'une ligne.
+
+        Returns:
+            (ligne servie, version, modèle)
+        """
+        line = line or self.default_line
+        now = time.monotonic()
+        with self._lock:
+            route = self._routes.get(line)
+            active = self._active.get(route)
+            if active is not None and now - self._checked.get(line, 0.0) < self.refresh_interval:
+                return (route,) + active
+            self._checked[line] = now
+        # Pointeur relu hors verrou : un chargement ne bloque pas les autres lignes
+        route = self._refresh(line)
+        with self._lock:
+            self._routes[line] = route
+            active = self._active.get(route)
+        if active is None:
+            raise LookupError(f"Ligne {line} : aucune version active")
+        return (route,) + active
+
+    def _refresh(self, line):
+        """Relit le pointeur d'une ligne ; retourne la ligne qui la sert."""
+        version, directory = self._pointer(line)
+        if version is None:
+            if line == self.default_line:
+                raise LookupError(f"Aucun modèle disponible (registre {self.registry_dir}, {self.fallback_dir})")
+            self.get(self.default_line)
+            return self.default_line
+
+        with self._lock:
+            active = self._active.get(line)
+        if active is None:
+            # Premier accès : chargement synchrone
+            self._activate(line, version, self._load(line, version, directory))
+        elif version != active[0]:
+            self._swap_in_background(line, version, directory)
+        return line
+
+    def _load(self, line, version, directory):
+        key = (line, version)
+        while True:
+            with self._lock:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return self._cache[key]['model']
+                event = self._loading.get(key)
+                if event is None:
+                    event = self._loading[key] = threading.Event()
+                    break
+            # Chargement déjà en cours dans un autre thread
+            event.wait()
+
+        try:
+            start = time.perf_counter()
+            model = self.loader(directory)
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self._cache[key] = {'model': model, 'bytes': _artifact_bytes(directory), 'directory': directory}
+                self.stats['loads'] += 1
+                self._evict(keep=key)
+            METRICS.inc('model_loads')
+            logger.info(f"📥 Ligne {line} : version {version} chargée en {seconds:.2f} s")
+            return model
+        finally:
+            with self._lock:
+                self._loading.pop(key).set()
+
+    def _evict(self, keep):
+        """
+        Libère les versions inactives les moins récemment utilisées au-delà du budget (verrou tenu).
+
+        Une version active n'est jamais libérée : des requêtes en cours (micro-batch,
+        predict_stream) peuvent la tenir, et close() sauvegarde son état.
+        """
+        total = sum(entry['bytes'] for entry in self._cache.values())
+        active_keys = {(line, version) for line, (version, _) in self._active.items()}
+        for key in [k for k in self._cache if k != keep and k not in active_keys]:
+            if total <= self.memory_budget:
+                break
+            entry = self._cache.pop(key)
+            total -= entry['bytes']
+            self.stats['evictions'] += 1
+            METRICS.inc('model_evictions')
+            close = getattr(entry['model'], 'close', None)
+            if close is not None:
+                close()
+        if total > self.memory_budget:
+            logger.warning(f"⚠️  Budget mémoire des modèles dépassé : {total / 1e6:.0f} Mo de versions actives "
+                           f"pour {self.memory_budget / 1e6:.0f} Mo")
+
+    def _activate(self, line, version, model):
+        with self._lock:
+            previous = self._active.get(line)
+            self._active[line] = (version, model)
+        if previous is not None and previous[0] != version:
+            self.stats['swaps'] += 1
+            METRICS.inc('model_swaps')
+            logger.info(f"🔄 Ligne {line} : {previous[0]} → {version}")
+
+    def _swap_in_background(self, line, version, directory):
+        with self._lock:
+            if (line, version) in self._loading:
+                return
+
+        def swap():
+            try:
+                model = self._load(line, version, directory)
+            except Exception as e:
+                logger.error(f"❌ Ligne {line} : chargement de {version} impossible ({e}), version précédente conservée")
+                return
+            # Le pointeur a pu bouger pendant le chargement : n'activer que la version courante
+            if self._pointer(line)[0] == version:
+                self._activate(line, version, model)
+
+        threading.Thread(target=swap, daemon=True).start()
+
+    def snapshot(self):
+        """État du cache : versions chargées, mémoire estimée, compteurs."""
+        with self._lock:
+            return {
+                'active': {line: version for line, (version, _) in self._active.items()},
+                'loaded': [f"{line}/{version}" for line, version in self._cache],
+                'memory_mb': sum(entry['bytes'] for entry in self._cache.values()) / 1e6,
+                'memory_budget_mb': self.memory_budget / 1e6,
+                **self.stats,
+            }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Registre des modèles par ligne de production")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pub = sub.add_parser("publish", help="Enregistre les artefacts d'un entraînement comme nouvelle version")
+    pub.add_argument("--source", default="results")
+    pub.add_argument("--line", default=DEFAULT_LINE)
+    pub.add_argument("--no-activate", action="store_true")
+    pub.add_argument("--note", default=None)
+    act = sub.add_parser("activate", help="Active une version (retour arrière compris)")
+    act.add_argument("--line", default=DEFAULT_LINE)
+    act.add_argument("--version", required=True)
+    sub.add_parser("list", help="Liste les lignes et leurs versions")
+    parser.add_argument("--registry", default=REGISTRY_DIR)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+
+    if args.command == "publish":
+        publish_model(args.source, args.line, args.registry, activate=not args.no_activate, note=args.note)
+    elif args.command == "activate":
+        activate_version(args.line, args.version, args.registry)
+        logger.info(f"✅ Ligne {args.line} : version {args.version} active")
+    else:
+        for line in list_lines(args.registry):
+            current = current_version(line, args.registry)
+            for version in list_versions(line, args.registry):
+                with open(os.path.join(args.registry, line, version, VERSION_MANIFEST)) as f:
+                    manifest = json.load(f)
+                f1 = manifest.get('metrics', {}).get('f1_score')
+                marker = "▶" if version == current else " "
+                logger.info(f"{marker} {line:<12} {version}  {manifest.get('backend', '-'):<14} "
+                            f"F1 {f1:.4f}" if f1 is not None else f"{marker} {line:<12} {version}")
@@ -0,0 +1,139 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+SMOTE_CACHE_DIR = 'results/cache/smote'
+SMOTE_CACHE_MAX_ENTRIES = 8      # Jeux rééquilibrés conservés sur disque (les moins récents sont retirés)
+CACHE_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+def nearest_neighbors(X, k, chunk_size=1024, n_jobs=-1):
+    """
+    k plus proches voisins exacts de chaque ligne de X parmi les autres lignes.
+
+    Les distances sont calculées par blocs de `chunk_size` lignes (||a||² + ||b||² - 2ab),
+    ce qui borne la mémoire à chunk_size x n. Les données sont centrées et le calcul se
+    fait en float64 : sans cela, un décalage commun important (capteurs autour de 1e4)
+    fait perdre presque toute la précision à la soustraction. Les blocs sont répartis
+    sur plusieurs threads (le produit matriciel libère le GIL).
+
+    Returns:
+        Indices des voisins, forme (n, k), du plus proche au plus lointain
+    """
+    X = np.asarray(X, dtype=np.float64)
+    X = np.ascontiguousarray(X - X.mean(axis=0))
+    squared = np.einsum('ij,ij->i', X, X)
+
+    def block(start):
+        stop = min(start + chunk_size, len(X))
+        distances = squared[start:stop, None] + squared[None, :] - 2 * (X[start:stop] @ X.T)
+        distances[np.arange(stop - start), np.arange(start, stop)] = np.inf
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1)
+        return np.take_along_axis(nearest, order, axis=1)
+
+    starts = range(0, len(X), chunk_size)
+    n_workers = os.cpu_count() if n_jobs in (None, -1) else n_jobs
+    if n_workers > 1 and len(starts) > 1:
+        with ThreadPoolExecutor(n_workers) as pool:
+            return np.vstack(list(pool.map(block, starts)))
+    return np.vstack([block(start) for start in starts])
+
+
+def smote_resample(X, y, k_neighbors=5, random_state=42, chunk_size=1024, n_jobs=-1):
+    """
+    Sur-échantillonnage SMOTE de la classe minoritaire, en float32.
+
+    Même principe que imblearn.over_sampling.SMOTE (stratégie 'auto', cas binaire) :
+    chaque point synthétique est interpolé entre une plaquette minoritaire et l'un
+    de ses k voisins minoritaires. Les données d'origine restent en tête.
+
+    Returns:
+        X_res (float32), y_res
+    """
+    columns = X.columns if isinstance(X, pd.DataFrame) else None
+    name = getattr(y, 'name', None)
+    X = np.asarray(X, dtype=np.float32)
+    y = np.asarray(y)
+
+    classes, counts = np.unique(y, return_counts=True)
+    if len(classes) != 2:
+        raise ValueError(f"SMOTE attend deux classes, {len(classes)} trouvée(s).")
+    minority = classes[np.argmin(counts)]
+    n_synthetic = counts.max() - counts.min()
+
+    X_min = X[y == minority]
+    if len(X_min) <= k_neighbors:
+        raise ValueError(f"{len(X_min)} échantillons minoritaires pour k_neighbors={k_neighbors}.")
+
+    rng = np.random.default_rng(random_state)
+    neighbors = nearest_neighbors(X_min, k_neighbors, chunk_size, n_jobs)
+    rows = rng.integers(0, len(X_min), n_synthetic)
+    picked = neighbors[rows, rng.integers(0, k_neighbors, n_synthetic)]
+    gaps = rng.random(n_synthetic, dtype=np.float32)[:, None]
+    synthetic = X_min[rows] + gaps * (X_min[picked] - X_min[rows])
+
+    X_res = np.vstack([X, synthetic])
+    y_res = np.concatenate([y, np.full(n_synthetic, minority, dtype=y.dtype)])
+    if columns is not None:
+        return pd.DataFrame(X_res, columns=columns), pd.Series(y_res, name=name)
+    return X_res, y_res
+
+
+def _cache_key(X, y, params):
+    digest = hashlib.sha256()
+    digest.update(json.dumps({'version': CACHE_VERSION, **params}, sort_keys=True).encode())
+    digest.update(np.ascontiguousarray(X, dtype=np.float32).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def _evict_cache(cache_dir, max_entries):
+    """Retire les jeux rééquilibrés les moins récemment utilisés au-delà de max_entries."""
+    entries = [entry for entry in os.scandir(cache_dir)
+               if entry.name.endswith('.npz') and not entry.name.endswith('.tmp.npz')]
+    entries.sort(key=lambda entry: entry.stat().st_mtime_ns)
+    for entry in entries[:max(len(entries) - max_entries, 0)]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def cached_smote_resample(X, y, k_neighbors=5, random_state=42, cache_dir=SMOTE_CACHE_DIR,
+                          max_entries=SMOTE_CACHE_MAX_ENTRIES, **kwargs):
+    """
+    smote_resample avec cache disque, indexé par l'empreinte des données et des paramètres.
+
+    Un entraînement relancé sur le même split réutilise directement le jeu rééquilibré.
+    Le cache garde au plus max_entries jeux : les moins récemment utilisés sont retirés.
+    """
+    columns = X.columns if isinstance(X, pd.DataFrame) else None
+    name = getattr(y, 'name', None)
+    key = _cache_key(X, y, {'k_neighbors': k_neighbors, 'random_state': random_state})
+    path = os.path.join(cache_dir, f'{key}.npz')
+
+    if os.path.exists(path):
+        logger.info(f"♻️  Jeu rééquilibré repris du cache ({key[:12]})")
+        with np.load(path) as data:
+            X_res, y_res = data['X'], data['y']
+        # Date de modification = dernière utilisation (ordre d'éviction)
+        os.utime(path)
+    else:
+        X_res, y_res = smote_resample(X, y, k_neighbors, random_state, **kwargs)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, X=np.asarray(X_res), y=np.asarray(y_res))
+        os.replace(tmp_path, path)
+        _evict_cache(cache_dir, max_entries)
+
+    if columns is not None:
+        return pd.DataFrame(np.asarray(X_res), columns=columns), pd.Series(np.asarray(y_res), name=name)
+    return np.asarray(X_res), np.asarray(y_res)
@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+import os
+import threading
+import time
+
+ROLLING_STATE_PATH = 'results/rolling_state.npz'
+ROLLING_STATS = ('mean', 'std', 'delta')
+
+
+def rolling_feature_names(sensors):
+    """Noms des features glissantes : toutes les moyennes, puis les écarts-types, puis les deltas."""
+    return [f"{sensor}_roll_{stat}" for stat in ROLLING_STATS for sensor in sensors]
+
+
+def time_order(times):
+    """
+    Ordre chronologique stable des plaquettes.
+
+    Args:
+        times: Colonne Time (texte ou dates) ; les dates illisibles sont placées en fin
+
+    Returns:
+        Indices triés par date (ordre d'origine conservé à date égale)
+    """
+    parsed = pd.to_datetime(pd.Series(times), errors='coerce')
+    return np.argsort(parsed.to_numpy(dtype='datetime64[ns]'), kind='stable')
+
+
+class RollingWindow:
+    """
+    Statistiques glissantes par capteur sur les `window` plaquettes précédentes.
+
+    Les dernières plaquettes sont conservées dans un tampon circulaire (window, capteurs) ;
+    sommes et sommes des carrés (des écarts à une valeur de référence par capteur, pour
+    éviter les annulations numériques) sont mises à jour à chaque plaquette (ajout de la
+    nouvelle, retrait de la plus ancienne), soit O(1) par capteur, et recalculées
+    exactement depuis le tampon toutes les `window` plaquettes pour borner l'erreur
+    d'arrondi. La mémoire est fixe quelle que soit la longueur de l'historique.
+
+    Le même code sert à l'entraînement (historique complet, dans l'ordre chronologique)
+    et au scoring en ligne (l'état sauvegardé en fin d'historique est repris).
+    """
+
+    def __init__(self, sensors, window, save_interval=60.0):
+        """
+        Args:
+            sensors: Noms des capteurs suivis (colonnes prétraitées, sans valeur manquante)
+            window: Nombre de plaquettes précédentes prises en compte
+            save_interval: Délai minimal (s) entre deux sauvegardes par maybe_save
+        """
+        if window < 1:
+            raise ValueError(f"window doit être >= 1, reçu {window}")
+        self.sensors = list(sensors)
+        self.window = int(window)
+        n_sensors = len(self.sensors)
+        self.buffer = np.zeros((self.window, n_sensors))
+        self.sum = np.zeros(n_sensors)
+        self.sumsq = np.zeros(n_sensors)
+        self.shift = np.zeros(n_sensors)
+        self.last = np.zeros(n_sensors)
+        self.count = 0
+        self.save_interval = save_interval
+        self._last_save = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def feature_names(self):
+        return rolling_feature_names(self.sensors)
+
+    def update(self, x):
+        """
+        Features d'une nouvelle plaquette, puis ajout de la plaquette à la fenêtre.
+
+        Sans historique, la moyenne vaut la valeur courante, l'écart-type et le delta 0.
+
+        Args:
+            x: Valeurs des capteurs (n_sensors,)
+
+        Returns:
+            Tableau (3 * n_sensors,) : moyenne, écart-type (population) et delta
+        """
+        x = np.asarray(x, dtype=np.float64)
+        n = min(self.count, self.window)
+        features = np.empty(3 * len(x))
+        mean, std, delta = features[:len(x)], features[len(x):2 * len(x)], features[2 * len(x):]
+        if n == 0:
+            mean[:] = x
+            std[:] = 0.0
+            delta[:] = 0.0
+            self.shift[:] = x
+        else:
+            np.divide(self.sum, n, out=mean)
+            np.sqrt(np.maximum(self.sumsq / n - mean * mean, 0.0), out=std)
+            mean += self.shift
+            np.subtract(x, self.last, out=delta)
+
+        slot = self.count % self.window
+        if self.count >= self.window:
+            old = self.buffer[slot] - self.shift
+            self.sum -= old
+            self.sumsq -= old * old
+        self.buffer[slot] = x
+        d = x - self.shift
+        self.sum += d
+        self.sumsq += d * d
+        self.last[:] = x
+        self.count += 1
+        if self.count % self.window == 0:
+            # Resynchronisation exacte (amortie : O(1) par plaquette et par capteur)
+            self._resync(self.buffer)
+        return features
+
+    def _resync(self, filled):
+        """Recalcule les sommes depuis les plaquettes du tampon, centrées sur leur moyenne."""
+        self.shift = filled.mean(axis=0)
+        centered = filled - self.shift
+        self.sum = centered.sum(axis=0)
+        self.sumsq = (centered * centered).sum(axis=0)
+
+    def transform(self, values, times=None):
+        """
+        Features glissantes d'un lot de plaquettes, calculées dans l'ordre chronologique.
+
+        L'état avance d'une plaquette par ligne du lot.
+
+        Args:
+            values: Tableau (n_samples, n_sensors) dans l'ordre de self.sensors
+            times: Colonne Time du lot (optionnel) ; sinon l'ordre des lignes fait foi
+
+        Returns:
+            Tableau (n_samples, 3 * n_sensors), dans l'ordre des lignes du lot
+        """
+        values = np.asarray(values, dtype=np.float64)
+        order = time_order(times) if times is not None else np.arange(len(values))
+        out = np.empty((len(values), 3 * len(self.sensors)))
+        with self._lock:
+            for i in order:
+                out[i] = self.update(values[i])
+        return out
+
+    def copy(self):
+        """Copie indépendante : features calculées sans faire avancer cette fenêtre."""
+        clone = RollingWindow(self.sensors, self.window, self.save_interval)
+        with self._lock:
+            for name in ('buffer', 'sum', 'sumsq', 'shift', 'last'):
+                setattr(clone, name, getattr(self, name).copy())
+            clone.count = self.count
+        return clone
+
+    def save(self, path=ROLLING_STATE_PATH):
+        """Sauvegarde atomique de la fenêtre (window x capteurs valeurs)."""
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = path + '.tmp.npz'
+        with self._lock:
+            np.savez(tmp_path, sensors=np.asarray(self.sensors, dtype=str), window=self.window,
+                     buffer=self.buffer, last=self.last, count=self.count)
+        os.replace(tmp_path, path)
+        self._last_save = time.monotonic()
+
+    def maybe_save(self, path=ROLLING_STATE_PATH):
+        """Sauvegarde si la précédente date de plus de save_interval secondes."""
+        if time.monotonic() - self._last_save >= self.save_interval:
+            self.save(path)
+
+    @classmethod
+    def load(cls, path=ROLLING_STATE_PATH, **kwargs):
+        """Fenêtre sauvegardée, ou None si elle n'existe pas."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            rolling = cls(list(data['sensors']), int(data['window']), **kwargs)
+            rolling.buffer = data['buffer'].copy()
+            rolling.last = data['last'].copy()
+            rolling.count = int(data['count'])
+        if rolling.count > 0:
+            rolling._resync(rolling.buffer[:min(rolling.count, rolling.window)])
+        return rolling
@@ -0,0 +1,166 @@
+import pandas as pd
+import numpy as np
+import argparse
+import logging
+import os
+import sys
+
+# Permet l'exécution directe du script (python src/sensor_stats.py)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.data_cache import load_csv
+
+logger = logging.getLogger(__name__)
+
+SENSOR_STATS_PATH = 'results/sensor_stats.npz'
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def _class_histograms(values, y, n_bins):
+    """
+    Histogrammes par capteur et par classe sur des bornes communes, en une passe.
+
+    Returns:
+        edges (n_features, n_bins + 1), counts (2, n_features, n_bins)
+    """
+    n_samples, n_features = values.shape
+    low = np.nanmin(values, axis=0)
+    high = np.nanmax(values, axis=0)
+    width = np.where(high > low, high - low, 1.0)
+    edges = low[:, None] + width[:, None] * np.linspace(0, 1, n_bins + 1)[None, :]
+
+    bins = np.floor((values - low) / width * n_bins)
+    valid = ~np.isnan(bins)
+    bins = np.clip(np.nan_to_num(bins), 0, n_bins - 1).astype(np.int64)
+    # Indice plat (classe, capteur, bin) pour un seul bincount
+    flat = (y[:, None] * n_features + np.arange(n_features)[None, :]) * n_bins + bins
+    counts = np.bincount(flat[valid], minlength=2 * n_features * n_bins)
+    return edges, counts.reshape(2, n_features, n_bins)
+
+
+def compute_sensor_stats(df, target='Target', raw_df=None, n_bins=40, n_points=200, random_state=42):
+    """
+    Résumés par capteur et par classe pour la page Statistiques Capteurs.
+
+    Pour chaque capteur : quantiles et moyenne par classe, histogrammes par classe sur
+    des bornes communes, taux de valeurs manquantes (sur les données brutes si
+    fournies), score de séparation (statistique de Kolmogorov-Smirnov entre classes,
+    calculée sur les histogrammes) et un petit échantillon de plaquettes par classe.
+
+    Args:
+        df: DataFrame prétraité (features + cible)
+        target: Nom de la colonne cible (0: OK, 1: Fail)
+        raw_df: Données brutes, pour des taux de valeurs manquantes avant imputation
+        n_bins: Nombre de classes des histogrammes
+        n_points: Plaquettes échantillonnées par classe pour l'affichage
+
+    Returns:
+        Dictionnaire de tableaux numpy (voir save_sensor_stats)
+    """
+    feature_names = [c for c in df.columns if c != target]
+    values = df[feature_names].to_numpy(dtype=np.float32)
+    y = df[target].to_numpy().astype(np.int64)
+
+    quantiles = np.stack([np.nanquantile(values[y == c], QUANTILES, axis=0) for c in (0, 1)])
+    means = np.stack([np.nanmean(values[y == c], axis=0) for c in (0, 1)])
+    edges, counts = _class_histograms(values, y, n_bins)
+
+    # Séparation : écart maximal entre les fonctions de répartition des deux classes
+    cdf = np.cumsum(counts, axis=2) / np.maximum(counts.sum(axis=2, keepdims=True), 1)
+    separation = np.abs(cdf[0] - cdf[1]).max(axis=1)
+
+    if raw_df is not None:
+        raw = raw_df.reindex(columns=feature_names)
+        missing_rate = raw.isna().mean().to_numpy()
+    else:
+        missing_rate = np.isnan(values).mean(axis=0)
+
+    # Échantillon par classe : l'affichage ne reçoit que quelques centaines de points
+    rng = np.random.default_rng(random_state)
+    sample_idx = np.concatenate([
+        rng.choice(np.flatnonzero(y == c), min(n_points, int(np.sum(y == c))), replace=False)
+        for c in (0, 1)
+    ])
+
+    return {
+        'feature_names': np.asarray(feature_names, dtype=str),
+        'quantile_levels': np.asarray(QUANTILES),
+        'quantiles': quantiles.astype(np.float32),
+        'means': means.astype(np.float32),
+        'hist_edges': edges.astype(np.float32),
+        'hist_counts': counts.astype(np.int32),
+        'class_counts': np.bincount(y, minlength=2),
+        'missing_rate': missing_rate.astype(np.float32),
+        'separation': separation.astype(np.float32),
+        'sample_values': values[sample_idx],
+        'sample_labels': y[sample_idx].astype(np.int8),
+    }
+
+
+def save_sensor_stats(stats, path=SENSOR_STATS_PATH):
+    """Écrit l'index (npz non compressé : lecture directe, quelques Mo au plus)."""
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **stats)
+    os.replace(tmp_path, path)
+
+
+def load_sensor_stats(path=SENSOR_STATS_PATH):
+    """Index des statistiques capteurs, ou None s'il n'a pas été calculé."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def sensor_summary(stats, feature):
+    """
+    Vue d'un capteur extraite de l'index.
+
+    Returns:
+        Dictionnaire : histogrammes, quantiles par classe, échantillon de points
+    """
+    j = int(np.flatnonzero(stats['feature_names'] == feature)[0])
+    edges = stats['hist_edges'][j]
+    counts = stats['hist_counts'][:, j, :]
+    density = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    return {
+        'bin_centers': (edges[:-1] + edges[1:]) / 2,
+        'density': density,
+        'quantiles': pd.DataFrame(stats['quantiles'][:, :, j].T, index=stats['quantile_levels'],
+                                  columns=['OK', 'Fail']),
+        'means': stats['means'][:, j],
+        'missing_rate': float(stats['missing_rate'][j]),
+        'separation': float(stats['separation'][j]),
+        'points': pd.DataFrame({'Target': stats['sample_labels'], feature: stats['sample_values'][:, j]}),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index des statistiques par capteur")
+    parser.add_argument("--data", default="data/secom_preprocessed.csv")
+    parser.add_argument("--raw", default="data/uci-secom.csv",
+                        help="CSV brut pour les taux de valeurs manquantes")
+    parser.add_argument("--output", default=SENSOR_STATS_PATH)
+    parser.add_argument("--bins", type=int, default=40)
+    parser.add_argument("--points", type=int, default=200)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+
+    if not os.path.exists(args.data):
+        raise SystemExit(f"❌ Erreur: {args.data} introuvable. Lancez d'abord le prétraitement.")
+
+    df = load_csv(args.data)
+    raw_df = load_csv(args.raw) if os.path.exists(args.raw) else None
+    stats = compute_sensor_stats(df, raw_df=raw_df, n_bins=args.bins, n_points=args.points)
+    save_sensor_stats(stats, args.output)
+
+    size_kb = os.path.getsize(args.output) / 1024
+    top = np.argsort(stats['separation'])[::-1][:5]
+    logger.info(f"💾 Index de {len(stats['feature_names'])} capteurs sauvegardé : {args.output} ({size_kb:.0f} Ko)")
+    logger.info("🏅 Capteurs les plus discriminants : "
+                + ", ".join(f"{stats['feature_names'][j]} ({stats['separation'][j]:.2f})" for j in top))
@@ -0,0 +1,133 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+import sys
+
+# Permet l'exécution directe du script et l'import de config.py
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from config import COST_FALSE_ALARM, COST_MISSED_DEFECT
+
+OPERATING_POINT_PATH = 'results/operating_point.json'
+
+
+def confusion_counts(y_true, y_pred):
+    """
+    Matrice de confusion binaire en un seul bincount.
+
+    Returns:
+        Tableau 2x2 [[VN, FP], [FN, VP]] (même disposition que scikit-learn)
+    """
+    y_true = np.asarray(y_true, dtype=np.int64)
+    y_pred = np.asarray(y_pred, dtype=np.int64)
+    return np.bincount(2 * y_true + y_pred, minlength=4).reshape(2, 2)
+
+
+def metrics_from_counts(cm):
+    """Accuracy, précision, rappel et F1 à partir d'une matrice de confusion 2x2."""
+    (tn, fp), (fn, tp) = cm
+    total = tn + fp + fn + tp
+    return {
+        'accuracy': (tp + tn) / total if total else 0.0,
+        'precision': tp / (tp + fp) if tp + fp else 0.0,
+        'recall': tp / (tp + fn) if tp + fn else 0.0,
+        'f1_score': 2 * tp / (2 * tp + fp + fn) if tp else 0.0,
+        'confusion_matrix': np.asarray(cm),
+    }
+
+
+def threshold_sweep(y_true, probabilities, cost_false_alarm=COST_FALSE_ALARM,
+                    cost_missed_defect=COST_MISSED_DEFECT):
+    """
+    Métriques à tous les seuils possibles, en une passe.
+
+    Les probabilités sont triées une seule fois par ordre décroissant ; les vrais et
+    faux positifs au seuil t (prédiction « défectueux » si probabilité >= t) sont
+    alors des sommes cumulées, lues à la dernière position de chaque valeur distincte.
+
+    Args:
+        y_true: Labels réels (0: OK, 1: Défectueux)
+        probabilities: Probabilités de défaut
+        cost_false_alarm: Coût d'une plaquette conforme rebutée
+        cost_missed_defect: Coût d'une plaquette défectueuse non détectée
+
+    Returns:
+        DataFrame indexé par seuil décroissant (tp, fp, fn, tn, precision, recall,
+        f1_score, cost), plus le seuil +inf (aucune plaquette rebutée)
+    """
+    y_true = np.asarray(y_true, dtype=np.int64)
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    order = np.argsort(-probabilities, kind='stable')
+    scores, labels = probabilities[order], y_true[order]
+
+    # Dernière position de chaque probabilité distincte
+    last = np.r_[np.flatnonzero(np.diff(scores)), len(scores) - 1]
+    tp = np.r_[0, np.cumsum(labels)[last]]
+    fp = np.r_[0, (last + 1) - tp[1:]]
+    thresholds = np.r_[np.inf, scores[last]]
+
+    positives = int(labels.sum())
+    negatives = len(labels) - positives
+    fn = positives - tp
+    tn = negatives - fp
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 1.0)
+        recall = np.where(positives > 0, tp / max(positives, 1), 0.0)
+        f1 = np.where(tp > 0, 2 * tp / (2 * tp + fp + fn), 0.0)
+    return pd.DataFrame({
+        'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn,
+        'precision': precision, 'recall': recall, 'f1_score': f1,
+        'cost': cost_false_alarm * fp + cost_missed_defect * fn,
+    }, index=pd.Index(thresholds, name='threshold'))
+
+
+def choose_operating_point(y_true, probabilities, cost_false_alarm=COST_FALSE_ALARM,
+                           cost_missed_defect=COST_MISSED_DEFECT):
+    """
+    Seuil minimisant le coût rebut / échappement.
+
+    Le seuil retenu est placé à mi-chemin entre la probabilité de coupure et la
+    suivante, pour ne pas dépendre des valeurs exactes observées.
+
+    Returns:
+        Dictionnaire (threshold, coûts utilisés, métriques au seuil)
+    """
+    sweep = threshold_sweep(y_true, probabilities, cost_false_alarm, cost_missed_defect)
+    # En cas d'égalité de coût, le seuil le plus haut (le moins de rebuts)
+    best = int(np.argmin(sweep['cost'].to_numpy()))
+    thresholds = sweep.index.to_numpy()
+    threshold = thresholds[best]
+    if best + 1 < len(thresholds):
+        threshold = (threshold + thresholds[best + 1]) / 2 if np.isfinite(threshold) else threshold
+    row = sweep.iloc[best]
+    n = len(np.asarray(y_true))
+    return {
+        'threshold': float(threshold),
+        'cost_false_alarm': cost_false_alarm,
+        'cost_missed_defect': cost_missed_defect,
+        'expected_cost_per_wafer': float(row['cost'] / n) if n else 0.0,
+        'precision': float(row['precision']),
+        'recall': float(row['recall']),
+        'f1_score': float(row['f1_score']),
+        'n_samples': n,
+    }
+
+
+def save_operating_point(point, path=OPERATING_POINT_PATH):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(point, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def load_operating_point(path=OPERATING_POINT_PATH):
+    """Point de fonctionnement enregistré avec le modèle, ou None."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
@@ -2,73 +2,507 @@ import pandas as pd
 import numpy as np
 import joblib
 import os
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
+import sys
+import argparse
+import copy
+import logging
+import time
+import tracemalloc
+from sklearn.base import clone
+from sklearn.model_selection import StratifiedKFold, cross_val_predict, train_test_split
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
-from imblearn.over_sampling import SMOTE
 
-def train_and_save_model():
-    print("🚀 Démarrage de l'entraînement du modèle...")
-    
-    # 1. Chargement des données
-    data_path = 'data/secom_preprocessed.csv'
+# Permet l'exécution directe du script (python src/training.py)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from config import (COST_FALSE_ALARM, COST_MISSED_DEFECT, MODEL_BACKEND, N_ESTIMATORS, RANDOM_STATE,
+                    SMOTE_K_NEIGHBORS, TEST_SIZE)
+from src.data_cache import load_csv
+from src.optimization import load_best_params
+from src.resampling import cached_smote_resample, smote_resample
+from src.inference import CompiledForest
+from src.model_format import save_compiled
+from src.instrumentation import METRICS
+from src.monitoring import DRIFT_REFERENCE_PATH, build_reference, save_reference
+from src.confidence import bootstrap_intervals
+from src.binning import BIN_EDGES_PATH, N_BINS, fit_bin_edges, save_bin_edges, transform_bins
+from src.thresholds import (OPERATING_POINT_PATH, choose_operating_point, confusion_counts,
+                            metrics_from_counts, save_operating_point)
+from src.preprocessing import (_split_features_target, add_rolling_features, apply_preprocessor,
+                               has_rolling_features, load_preprocessor)
+
+MODEL_PATH = 'results/final_model_smote_rf.pkl'
+COMPILED_PATH = 'results/final_model_compiled'
+MODEL_BACKENDS = ('random_forest', 'binned_hgb')
+
+logger = logging.getLogger(__name__)
+
+def default_forest_params():
+    """Hyperparamètres par défaut, complétés par la recherche de src/optimization.py."""
+    params = {'n_estimators': N_ESTIMATORS}
+    best_params = load_best_params()
+    if best_params is not None:
+        params.update(best_params)
+    return params
+
+
+def fit_forest(X_train_res, y_train_res, params=None, random_state=RANDOM_STATE):
+    """
+    Entraîne la forêt sur le jeu rééquilibré.
+
+    Args:
+        X_train_res, y_train_res: Jeu d'entraînement après SMOTE
+        params: Hyperparamètres (par défaut, ceux de src/optimization.py s'ils existent)
+        random_state: Graine
+
+    Returns:
+        model: RandomForestClassifier entraîné
+    """
+    if params is None:
+        params = default_forest_params()
+    model = RandomForestClassifier(**params, random_state=random_state, n_jobs=-1)
+    with METRICS.span('train_fit'):
+        model.fit(X_train_res, y_train_res)
+    return model
+
+
+def fit_binned_boosting(X_train, y_train, params=None, n_bins=N_BINS, random_state=RANDOM_STATE):
+    """
+    Backend compact : chaque capteur est discrétisé une fois en codes uint8, puis un
+    HistGradientBoostingClassifier est entraîné sur ces codes.
+
+    Pas de SMOTE : le déséquilibre est compensé par la pondération des classes, sans
+    doubler le volume d'entraînement.
+
+    Args:
+        X_train, y_train: Plaquettes réelles d'entraînement
+        params: Hyperparamètres du boosting (par défaut, N_ESTIMATORS itérations)
+        n_bins: Classes par capteur
+        random_state: Graine
+
+    Returns:
+        model, edges (bornes à sauvegarder pour le scoring), codes (X_train discrétisé)
+    """
+    with METRICS.span('train_bin'):
+        edges = fit_bin_edges(X_train, n_bins, random_state=random_state)
+        codes = transform_bins(edges, X_train)
+    params = dict(params or {'max_iter': N_ESTIMATORS})
+    model = HistGradientBoostingClassifier(**params, max_bins=n_bins + 1, class_weight='balanced',
+                                           early_stopping=False, random_state=random_state)
+    with METRICS.span('train_fit'):
+        model.fit(codes, np.asarray(y_train))
+    return model, edges, codes
+
+
+def cv_operating_point(model, X_train, y_train, n_splits=3, cost_false_alarm=COST_FALSE_ALARM,
+                       cost_missed_defect=COST_MISSED_DEFECT, random_state=RANDOM_STATE,
+                       resample=False, k_neighbors=SMOTE_K_NEIGHBORS):
+    """
+    Point de fonctionnement : coût rebut / échappement minimal sur les probabilités
+    hors pli d'une validation croisée stratifiée des plaquettes réelles d'entraînement.
+
+    Avec resample, SMOTE est appliqué à l'intérieur de chaque pli, sur sa seule partie
+    d'entraînement (comme src/optimization.py). Les probabilités out-of-bag d'une forêt
+    entraînée après SMOTE ne conviennent pas : les voisins synthétiques des défauts réels
+    sont dans le sac, ce qui surestime leur probabilité et donc le seuil.
+
+    Args:
+        model: Modèle dont la configuration est reprise (réentraîné sur chaque pli)
+        X_train, y_train: Plaquettes réelles d'entraînement (ou leurs codes uint8)
+        n_splits: Nombre de plis
+        cost_false_alarm, cost_missed_defect: Coûts du point de fonctionnement
+        random_state: Graine des plis et de SMOTE
+        resample: Rééquilibrage SMOTE de chaque pli (backend random_forest)
+        k_neighbors: Voisins de SMOTE
+
+    Returns:
+        Dictionnaire de choose_operating_point
+    """
+    X = np.asarray(X_train)
+    y = np.asarray(y_train)
+    estimator = clone(model)
+    if 'oob_score' in estimator.get_params():
+        estimator.set_params(oob_score=False)
+    folds = StratifiedKFold(n_splits, shuffle=True, random_state=random_state)
+    with METRICS.span('train_operating_point'):
+        if not resample:
+            proba = cross_val_predict(estimator, X, y, cv=folds, method='predict_proba')[:, 1]
+        else:
+            proba = np.empty(len(y))
+            for train_idx, val_idx in folds.split(X, y):
+                X_res, y_res = smote_resample(X[train_idx], y[train_idx], k_neighbors, random_state)
+                proba[val_idx] = clone(estimator).fit(X_res, y_res).predict_proba(X[val_idx])[:, 1]
+    return choose_operating_point(y, proba, cost_false_alarm, cost_missed_defect)
+
+
+def _fit_backend(backend, X_train, y_train, X_test, random_state=RANDOM_STATE):
+    """Entraîne un backend de bout en bout ; retourne le moteur compilé, la matrice d'entraînement et X_test au format du modèle."""
+    if backend == 'random_forest':
+        X_fit, y_fit = smote_resample(X_train, y_train, random_state=random_state)
+        model = fit_forest(X_fit, y_fit, random_state=random_state)
+        return CompiledForest.from_sklearn(model), X_fit, X_test.to_numpy()
+    model, edges, X_fit = fit_binned_boosting(X_train, y_train, random_state=random_state)
+    return CompiledForest.from_hist_gradient_boosting(model), X_fit, transform_bins(edges, X_test)
+
+
+def compare_backends(X_train, y_train, X_test, y_test, random_state=RANDOM_STATE):
+    """
+    Compare les backends sur les mêmes données : durée d'entraînement (SMOTE ou
+    discrétisation compris), pic de mémoire alloué (tracemalloc, mesuré lors d'un
+    second entraînement pour ne pas fausser la durée), taille de la matrice
+    d'entraînement et du modèle compilé, F1 et recall de test.
+
+    Returns:
+        DataFrame indexé par backend
+    """
+    rows = {}
+    for backend in MODEL_BACKENDS:
+        start = time.perf_counter()
+        engine, X_fit, X_eval = _fit_backend(backend, X_train, y_train, X_test, random_state)
+        seconds = time.perf_counter() - start
+
+        tracemalloc.start()
+        _fit_backend(backend, X_train, y_train, X_test, random_state)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        predictions, _ = engine.predict(X_eval)
+        metrics = metrics_from_counts(confusion_counts(y_test, predictions))
+        rows[backend] = {
+            'fit_seconds': seconds,
+            'peak_alloc_mb': peak / 1e6,
+            'train_matrix_mb': np.asarray(X_fit).nbytes / 1e6,
+            'model_kb': sum(getattr(engine, name).nbytes for name in
+                            ('feature', 'threshold', 'children', 'value', 'roots', 'is_leaf')) / 1e3,
+            'f1_score': metrics['f1_score'],
+            'recall': metrics['recall'],
+        }
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def evaluate_model(model, X_test, y_test, operating_point=None):
+    """
+    Métriques sur le set de test, au seuil par défaut et au point de fonctionnement.
+
+    Returns:
+        metrics: Dictionnaire sauvegardé dans results/final_metrics.pkl
+    """
+    with METRICS.span('train_evaluate'):
+        y_pred = model.predict(X_test)
+        metrics = {
+            'accuracy': accuracy_score(y_test, y_pred),
+            'precision': precision_score(y_test, y_pred),
+            'recall': recall_score(y_test, y_pred),
+            'f1_score': f1_score(y_test, y_pred),
+            'confusion_matrix': confusion_matrix(y_test, y_pred)
+        }
+        # Quelques centaines de plaquettes seulement : intervalles de confiance bootstrap
+        metrics['confidence_intervals'] = bootstrap_intervals(y_test, y_pred)
+        if operating_point is not None:
+            y_pred_op = model.predict_proba(X_test)[:, 1] >= operating_point['threshold']
+            metrics['operating_point'] = dict(metrics_from_counts(confusion_counts(y_test, y_pred_op)),
+                                              threshold=operating_point['threshold'])
+            metrics['operating_point_intervals'] = bootstrap_intervals(y_test, y_pred_op)
+    return metrics
+
+
+def log_metrics(metrics):
+    logger.info("\n✅ Performances sur le set de test :")
+    logger.info(f"   Accuracy  : {metrics['accuracy']:.4f}")
+    logger.info(f"   Precision : {metrics['precision']:.4f}")
+    logger.info(f"   Recall    : {metrics['recall']:.4f}")
+    logger.info(f"   F1-Score  : {metrics['f1_score']:.4f}")
+    _log_intervals(metrics.get('confidence_intervals'))
+    if 'operating_point' in metrics:
+        op_metrics = metrics['operating_point']
+        logger.info(f"   Au seuil {op_metrics['threshold']:.3f} : précision {op_metrics['precision']:.4f}, "
+                    f"recall {op_metrics['recall']:.4f}, F1 {op_metrics['f1_score']:.4f}")
+        _log_intervals(metrics.get('operating_point_intervals'))
+
+
+def _log_intervals(intervals):
+    if intervals:
+        logger.info(f"   IC {intervals['confidence']:.0%} (bootstrap) : "
+                    + ", ".join(f"{name} [{intervals[name][0]:.3f} ; {intervals[name][1]:.3f}]"
+                                for name in ('accuracy', 'precision', 'recall', 'f1_score')))
+
+
+def _load_training_data(data_path='data/secom_preprocessed.csv'):
+    """Données prétraitées séparées en train/test (split stratifié de config.py)."""
     if not os.path.exists(data_path):
-        print(f"❌ Erreur: {data_path} introuvable. Lancez d'abord le prétraitement.")
-        return
+        logger.error(f"❌ Erreur: {data_path} introuvable. Lancez d'abord le prétraitement.")
+        return None
 
-    df = pd.read_csv(data_path)
-    X = df.drop('Target', axis=1)
-    y = df['Target']
+    with METRICS.span('train_load'):
+        df = load_csv(data_path)
+        X = df.drop('Target', axis=1)
+        y = df['Target'].astype(int)
     
-    print(f"✅ Données chargées : {X.shape[0]} lignes, {X.shape[1]} features")
+    logger.info(f"✅ Données chargées : {X.shape[0]} lignes, {X.shape[1]} features")
 
-    # 2. Séparation Train/Test
     # On garde 20% pour le test, stratifié pour préserver le ratio de défauts
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
-    )
-    
-    # 3. Rééquilibrage avec SMOTE sur le set d'entraînement
-    print("⚖️ Application du SMOTE pour rééquilibrer les classes...")
-    smote = SMOTE(random_state=42)
-    X_train_res, y_train_res = smote.fit_resample(X_train, y_train)
-    
-    print(f"📈 Volume après rééquilibrage : {len(y_train_res)} échantillons")
-    print(f"   Distribution : {pd.Series(y_train_res).value_counts().to_dict()}")
+    return train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=y)
+
 
-    # 4. Entraînement du modèle
-    print("🤖 Entraînement du Random Forest...")
-    model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
-    model.fit(X_train_res, y_train_res)
+def train_and_save_model(backend=MODEL_BACKEND):
+    """
+    Entraîne, évalue et sauvegarde le modèle.
 
-    # 5. Évaluation sur le set de test
-    y_pred = model.predict(X_test)
+    Args:
+        backend: 'random_forest' (SMOTE + forêt float32) ou 'binned_hgb' (codes uint8 +
+                 boosting par histogrammes, bornes sauvegardées pour le scoring)
+    """
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Backend inconnu : {backend} (attendu : {', '.join(MODEL_BACKENDS)})")
+    logger.info(f"🚀 Démarrage de l'entraînement du modèle ({backend})...")
     
-    metrics = {
-        'accuracy': accuracy_score(y_test, y_pred),
-        'precision': precision_score(y_test, y_pred),
-        'recall': recall_score(y_test, y_pred),
-        'f1_score': f1_score(y_test, y_pred),
-        'confusion_matrix': confusion_matrix(y_test, y_pred)
-    }
-
-    print("\n✅ Performances sur le set de test :")
-    print(f"   Accuracy  : {metrics['accuracy']:.4f}")
-    print(f"   Precision : {metrics['precision']:.4f}")
-    print(f"   Recall    : {metrics['recall']:.4f}")
-    print(f"   F1-Score  : {metrics['f1_score']:.4f}")
-
-    # 6. Sauvegarde
+    # 1-2. Chargement des données et séparation Train/Test
+    split = _load_training_data()
+    if split is None:
+        return
+    X_train, X_test, y_train, y_test = split
+
+    edges = None
+    if backend == 'random_forest':
+        # 3. Rééquilibrage avec SMOTE sur le set d'entraînement
+        logger.info("⚖️ Application du SMOTE pour rééquilibrer les classes...")
+        # Étape dédiée (float32, voisins par blocs) ; le résultat est mis en cache par split
+        with METRICS.span('train_smote'):
+            X_train_res, y_train_res = cached_smote_resample(X_train, y_train, random_state=RANDOM_STATE)
+        
+        logger.info(f"📈 Volume après rééquilibrage : {len(y_train_res)} échantillons")
+        logger.info(f"   Distribution : {pd.Series(y_train_res).value_counts().to_dict()}")
+
+        # 4. Entraînement du modèle
+        logger.info("🤖 Entraînement du Random Forest...")
+        # Configuration issue de src/optimization.py si la recherche a été lancée
+        params = default_forest_params()
+        if params != {'n_estimators': N_ESTIMATORS}:
+            logger.info(f"   Hyperparamètres optimisés : {params}")
+        model = fit_forest(X_train_res, y_train_res, params)
+
+        # 5. Point de fonctionnement (probabilités hors pli, SMOTE dans chaque pli)
+        operating_point = cv_operating_point(model, X_train, y_train, resample=True)
+        X_eval = X_test
+    else:
+        # 3-4. Discrétisation uint8 puis boosting par histogrammes
+        logger.info("🤖 Entraînement du boosting sur capteurs discrétisés (uint8)...")
+        model, edges, codes = fit_binned_boosting(X_train, y_train)
+        logger.info(f"📦 Matrice d'entraînement : {codes.nbytes / 1e6:.1f} Mo en uint8 "
+                    f"({X_train.shape[0] * X_train.shape[1] * 8 / 1e6:.1f} Mo en float64)")
+
+        # 5. Point de fonctionnement
+        operating_point = cv_operating_point(model, codes, y_train)
+        X_eval = transform_bins(edges, X_test)
+
+    if operating_point is not None:
+        logger.info(f"🎯 Seuil de décision retenu : {operating_point['threshold']:.3f} "
+                    f"(coût rebut {operating_point['cost_false_alarm']:g} / échappement "
+                    f"{operating_point['cost_missed_defect']:g})")
+
+    # 6. Évaluation sur le set de test
+    metrics = evaluate_model(model, X_eval, y_test, operating_point)
+    metrics['backend'] = backend
+    log_metrics(metrics)
+
+    # 7. Sauvegarde
     if not os.path.exists('results'):
         os.makedirs('results')
         
-    joblib.dump(model, 'results/final_model_smote_rf.pkl')
-    joblib.dump(metrics, 'results/final_metrics.pkl')
-    # Sauvegarde du test set pour l'évaluation ultérieure si besoin
-    joblib.dump((X_test, y_test), 'results/test_dataset.pkl')
+    with METRICS.span('train_save'):
+        joblib.dump(model, MODEL_PATH)
+        # Export compact memory-mappable pour un démarrage rapide du scoring
+        engine = CompiledForest.from_estimator(model, list(X_train.columns))
+        save_compiled(engine, COMPILED_PATH, source_path=MODEL_PATH)
+        joblib.dump(metrics, 'results/final_metrics.pkl')
+        # Sauvegarde du test set pour l'évaluation ultérieure si besoin
+        joblib.dump((X_test, y_test), 'results/test_dataset.pkl')
+        # Référence de dérive : plaquettes réelles d'entraînement, avant SMOTE
+        save_reference(build_reference(X_train), DRIFT_REFERENCE_PATH)
+        # Seuil utilisé par défaut au scoring
+        if operating_point is not None:
+            save_operating_point(operating_point, OPERATING_POINT_PATH)
+        elif os.path.exists(OPERATING_POINT_PATH):
+            os.remove(OPERATING_POINT_PATH)
+        # Bornes de discrétisation : leur présence indique au scoring un modèle sur codes uint8
+        if edges is not None:
+            save_bin_edges(edges, list(X_train.columns), BIN_EDGES_PATH)
+        elif os.path.exists(BIN_EDGES_PATH):
+            os.remove(BIN_EDGES_PATH)
     
-    print("\n💾 Modèle et métriques sauvegardés dans le dossier 'results/'")
-    print("✨ Entraînement terminé avec succès !")
+    logger.info("\n💾 Modèle et métriques sauvegardés dans le dossier 'results/'")
+    logger.info("✨ Entraînement terminé avec succès !")
+
+
+def _load_labeled_lot(data_path, preprocessor_path):
+    """
+    Charge un lot étiqueté, au format prétraité (colonne Target) ou brut (Pass/Fail).
+
+    Si le modèle utilise des features glissantes absentes du lot, elles sont calculées
+    comme au prétraitement d'entraînement, le lot étant pris comme historique.
+    """
+    df = load_csv(data_path)
+    state = load_preprocessor(preprocessor_path) if os.path.exists(preprocessor_path) else None
+    times = df['Time'].to_numpy() if 'Time' in df.columns else None
+    if 'Target' in df.columns:
+        X, y = df.drop('Target', axis=1), df['Target'].astype(int)
+    else:
+        X, y = _split_features_target(df)
+        if state is None:
+            raise FileNotFoundError(f"Lot brut fourni mais {preprocessor_path} est introuvable.")
+        X = apply_preprocessor(state, X)
+
+    if state is not None and 'rolling' in state and not has_rolling_features(state, X):
+        X, _ = add_rolling_features(state, X[state['feature_names']], times)
+    return X, y
+
+
+def _smote_lot(X, y, random_state=None):
+    """SMOTE d'un petit lot, k adapté à l'effectif de défauts (lot inchangé si trop peu)."""
+    k_neighbors = min(SMOTE_K_NEIGHBORS, int(np.bincount(np.asarray(y)).min()) - 1)
+    if k_neighbors < 1:
+        return X, y
+    return smote_resample(X, y, k_neighbors=k_neighbors, random_state=random_state)
+
+
+def window_operating_point(model, kept_trees, params, X_lot, y_lot, n_splits=3, cost_false_alarm=COST_FALSE_ALARM,
+                           cost_missed_defect=COST_MISSED_DEFECT, random_state=None):
+    """
+    Point de fonctionnement de la forêt après une mise à jour incrémentale.
+
+    Probabilités hors pli sur le lot : pour chaque pli, les arbres conservés, qui n'ont
+    jamais vu le lot, sont complétés d'arbres entraînés sur le reste du lot (SMOTE
+    dans le pli), comme les nouveaux arbres de la fenêtre.
+
+    Args:
+        model: Forêt à mettre à jour (non modifiée)
+        kept_trees: Arbres conservés dans la fenêtre
+        params: Hyperparamètres des nouveaux arbres
+        X_lot, y_lot: Lot étiqueté (au format du modèle)
+        n_splits: Nombre de plis
+
+    Returns:
+        Dictionnaire de choose_operating_point
+    """
+    y = np.asarray(y_lot)
+    forest = copy.copy(model)
+    proba = np.empty(len(y))
+    folds = StratifiedKFold(n_splits, shuffle=True, random_state=random_state)
+    for train_idx, val_idx in folds.split(X_lot, y):
+        X_fit, y_fit = _smote_lot(X_lot.iloc[train_idx], y_lot.iloc[train_idx], random_state)
+        fold_trees = RandomForestClassifier(**params).fit(X_fit, y_fit).estimators_
+        forest.estimators_ = kept_trees + fold_trees
+        forest.n_estimators = len(forest.estimators_)
+        proba[val_idx] = forest.predict_proba(X_lot.iloc[val_idx])[:, 1]
+    return choose_operating_point(y, proba, cost_false_alarm, cost_missed_defect)
+
+
+def update_model(data_path, model_path=MODEL_PATH, n_new_trees=10, max_trees=None,
+                 preprocessor_path='results/preprocessor.pkl', compiled_path=COMPILED_PATH, random_state=None,
+                 operating_point_path=OPERATING_POINT_PATH):
+    """
+    Mise à jour incrémentale de la forêt sur une fenêtre glissante.
+
+    De nouveaux arbres sont entraînés uniquement sur le dernier lot étiqueté, puis
+    ajoutés à la forêt tandis que les plus anciens sont retirés : le coût ne dépend
+    que de la taille du lot, pas de tout l'historique.
+
+    Args:
+        data_path: CSV du nouveau lot étiqueté (brut ou prétraité)
+        model_path: Modèle à mettre à jour (réécrit en place)
+        n_new_trees: Nombre d'arbres entraînés sur le lot
+        max_trees: Taille de la fenêtre (par défaut, taille actuelle de la forêt)
+        preprocessor_path: État du prétraitement, pour les lots bruts
+        compiled_path: Export compilé à régénérer
+        random_state: Graine des nouveaux arbres
+        operating_point_path: Point de fonctionnement, recalculé pour la nouvelle forêt
+
+    Returns:
+        model: Forêt mise à jour
+    """
+    logger.info(f"🔄 Mise à jour incrémentale avec {data_path}...")
+    model = joblib.load(model_path)
+    if not isinstance(model, RandomForestClassifier):
+        raise ValueError("La mise à jour incrémentale ne s'applique qu'au backend random_forest.")
+    X_new, y_new = _load_labeled_lot(data_path, preprocessor_path)
+    if hasattr(model, 'feature_names_in_'):
+        X_new = X_new[list(model.feature_names_in_)]
+
+    counts = y_new.value_counts()
+    if len(counts) < 2:
+        raise ValueError("Le lot doit contenir des plaquettes conformes et défectueuses.")
+
+    # SMOTE sur le seul nouveau lot (k adapté aux petits effectifs de défauts)
+    X_fit, y_fit = _smote_lot(X_new, y_new, random_state)
+
+    params = model.get_params()
+    params.update(n_estimators=n_new_trees, random_state=random_state, oob_score=False, warm_start=False)
+    new_trees = RandomForestClassifier(**params).fit(X_fit, y_fit)
+
+    # Fenêtre glissante : les arbres les plus anciens sont en tête de liste
+    max_trees = max_trees or len(model.estimators_)
+    n_kept = max(max_trees - len(new_trees.estimators_), 0)
+    kept_trees = model.estimators_[max(len(model.estimators_) - n_kept, 0):] if n_kept else []
+
+    # Point de fonctionnement de la nouvelle forêt (l'ancien seuil ne lui correspond plus)
+    operating_point = None
+    if int(counts.min()) >= 3:  # Au moins un défaut par pli
+        operating_point = window_operating_point(model, kept_trees, params, X_new, y_new, random_state=random_state)
+
+    model.estimators_ = (kept_trees + new_trees.estimators_)[-max_trees:]
+    model.n_estimators = len(model.estimators_)
+    # Les estimations out-of-bag portaient sur l'ancienne forêt
+    model.oob_score = False
+    for attribute in ('oob_score_', 'oob_decision_function_'):
+        if hasattr(model, attribute):
+            delattr(model, attribute)
+    logger.info(f"🌲 {len(new_trees.estimators_)} arbres ajoutés, forêt de {model.n_estimators} arbres")
+
+    # Écriture atomique : un lecteur voit l'ancien ou le nouveau modèle, jamais un fichier partiel
+    tmp_path = model_path + '.tmp'
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, model_path)
+    save_compiled(CompiledForest.from_sklearn(model), compiled_path, source_path=model_path)
+    if operating_point is not None:
+        save_operating_point(operating_point, operating_point_path)
+        logger.info(f"🎯 Seuil de décision recalculé : {operating_point['threshold']:.3f}")
+    elif os.path.exists(operating_point_path):
+        # Trop peu de défauts pour le recalculer : l'ancien seuil ne vaut plus pour cette forêt
+        os.remove(operating_point_path)
+        logger.warning("⚠️  Trop peu de défauts dans le lot pour recalculer le seuil : seuil par défaut")
+    logger.info(f"💾 Modèle mis à jour : {model_path}")
+    return model
 
 if __name__ == "__main__":
-    train_and_save_model()
+    parser = argparse.ArgumentParser(description="Entraînement du modèle SC-QC")
+    parser.add_argument("--update", metavar="CSV",
+                        help="Mise à jour incrémentale avec un nouveau lot étiqueté")
+    parser.add_argument("--new-trees", type=int, default=10)
+    parser.add_argument("--max-trees", type=int, default=None)
+    parser.add_argument("--metrics", metavar="FICHIER",
+                        help="Exporte les durées par étape (.json ou format Prometheus)")
+    parser.add_argument("--backend", choices=MODEL_BACKENDS, default=MODEL_BACKEND,
+                        help="Modèle entraîné (par défaut, MODEL_BACKEND de config.py)")
+    parser.add_argument("--compare-backends", action="store_true",
+                        help="Compare durée, mémoire et qualité des backends sur les mêmes données")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+
+    if args.update:
+        update_model(args.update, n_new_trees=args.new_trees, max_trees=args.max_trees)
+    elif args.compare_backends:
+        split = _load_training_data()
+        if split is not None:
+            X_train, X_test, y_train, y_test = split
+            report = compare_backends(X_train, y_train, X_test, y_test)
+            logger.info("\n⚖️  Comparaison des backends (mêmes données d'entraînement et de test) :")
+            logger.info(report.to_string(float_format=lambda v: f"{v:.3f}"))
+    else:
+        train_and_save_model(args.backend)
+
+    if args.metrics:
+        METRICS.write(args.metrics)
+        logger.info(f"⏱️  Métriques exportées : {args.metrics}")
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Permet d'importer le package src et les modules de notebooks/ depuis les tests
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, 'notebooks')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
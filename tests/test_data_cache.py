@@ -0,0 +1,33 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.data_cache import load_csv
+
+
+def _write(path, value):
+    pd.DataFrame({'Time': ['2008-07-19 11:55:00'] * 3, '0': [value] * 3}).to_csv(path, index=False)
+
+
+def test_rewrite_with_preserved_mtime_is_detected(tmp_path):
+    path = str(tmp_path / 'secom.csv')
+    _write(path, 1.5)
+    assert load_csv(path)['0'].tolist() == [1.5] * 3
+    stat = os.stat(path)
+
+    # Même taille et date de modification restaurée (cp -p, rsync)
+    _write(path, 2.5)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert os.stat(path).st_size == stat.st_size
+    assert load_csv(path)['0'].tolist() == [2.5] * 3
+
+
+def test_rebuild_leaves_only_the_published_cache(tmp_path):
+    path = str(tmp_path / 'secom.csv')
+    _write(path, 1.0)
+    load_csv(path)
+    _write(path, 10.0)
+    df = load_csv(path)
+    np.testing.assert_array_equal(df['0'].to_numpy(), np.full(3, 10.0, dtype=np.float32))
+    assert os.listdir(tmp_path / '.cache') == ['secom']
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from src.explain import ForestExplainer
+from src.inference import CompiledForest
+
+
+@pytest.fixture(scope='module')
+def forest():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 12))
+    y = (X[:, 0] + X[:, 1] * X[:, 2] + rng.normal(scale=0.5, size=len(X)) > 0.5).astype(int)
+    model = RandomForestClassifier(n_estimators=25, min_samples_leaf=3, random_state=0).fit(X, y)
+    return model, X
+
+
+def test_bias_plus_contributions_equals_predict_proba(forest):
+    model, X = forest
+    engine = CompiledForest.from_sklearn(model)
+    # Blocs plus petits que le lot : la remontée par blocs est aussi vérifiée
+    engine.block_size = 64
+    explainer = ForestExplainer(engine)
+
+    contributions = explainer.contributions(X)
+    np.testing.assert_allclose(explainer.bias + contributions.sum(axis=1), model.predict_proba(X)[:, 1],
+                               rtol=0, atol=1e-12)
+
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from src.inference import CompiledForest, compare_with_sklearn
+
+
+@pytest.fixture(scope='module')
+def forest():
+    rng = np.random.default_rng(42)
+    X = rng.normal(size=(600, 30))
+    y = (X[:, :3].sum(axis=1) + rng.normal(size=len(X)) > 1.0).astype(int)
+    model = RandomForestClassifier(n_estimators=30, random_state=0).fit(X, y)
+    return model, X
+
+
+def test_predict_proba_matches_sklearn(forest):
+    model, X = forest
+    engine = CompiledForest.from_sklearn(model)
+    np.testing.assert_array_equal(engine.predict_proba(X), model.predict_proba(X)[:, 1])
+
+
+def test_predictions_match_sklearn_on_large_batch(forest):
+    model, X = forest
+    engine = CompiledForest.from_sklearn(model)
+    # Au-delà de block_size : évaluation par blocs en parallèle
+    X_large = np.tile(X, (5, 1))
+    predictions, probabilities = engine.predict(X_large)
+    np.testing.assert_array_equal(probabilities, model.predict_proba(X_large)[:, 1])
+    np.testing.assert_array_equal(predictions, model.predict(X_large))
+
+
+def test_compare_with_sklearn_reports_latencies(forest):
+    model, X = forest
+    results = compare_with_sklearn(model, X, batch_sizes=(1, 64), repeats=2)
+    assert set(results) == {1, 64}
+
+
+def test_single_thread_apply_matches_parallel(forest):
+    model, X = forest
+    engine = CompiledForest.from_sklearn(model)
+    X_large = np.tile(X, (5, 1))
+    expected = engine.apply(X_large)
+
+    engine = CompiledForest.from_sklearn(model)
+    engine.n_threads = 1
+    np.testing.assert_array_equal(engine.apply(X_large), expected)
+    assert engine._pool is None
@@ -0,0 +1,26 @@
+import os
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from src.inference import CompiledForest
+from src.model_format import load_compiled, read_manifest, save_compiled
+
+
+def test_previous_binary_survives_one_publish(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 5))
+    y = (X[:, 0] > 0).astype(int)
+    engine = CompiledForest.from_sklearn(RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y))
+    directory = str(tmp_path / 'compiled')
+
+    save_compiled(engine, directory)
+    first = read_manifest(directory)['binary']
+    save_compiled(engine, directory)
+    # Un lecteur ayant lu l'ancien manifeste peut encore ouvrir son binaire
+    assert os.path.exists(os.path.join(directory, first))
+    np.testing.assert_array_equal(load_compiled(directory).predict_proba(X), engine.predict_proba(X))
+
+    save_compiled(engine, directory)
+    assert not os.path.exists(os.path.join(directory, first))
+    assert len([name for name in os.listdir(directory) if name.endswith('.bin')]) == 2
@@ -0,0 +1,30 @@
+import inspect
+
+import src.pipeline as pipeline
+import src.resampling as resampling
+from src.pipeline import Stage, _code_dependencies, _stage_key
+
+
+def test_stage_code_includes_called_modules():
+    code = _code_dependencies(pipeline._train)
+    # fit_forest directement, smote_resample via les imports de src/training.py
+    assert {'src.training', 'src.resampling'} <= set(code['modules'])
+    assert 'src.pipeline' not in code['modules']
+
+    code = _code_dependencies(pipeline._operating_point)
+    assert {'_operating_point', '_model_inputs'} <= set(code['functions'])
+
+
+def test_stage_key_changes_with_dependency_source(monkeypatch):
+    stage = Stage('resample', pipeline._resample, params={'k_neighbors': 5})
+    before = _stage_key(stage, {}, {})
+    assert _stage_key(stage, {}, {}) == before
+
+    getsource = inspect.getsource
+
+    def edited(obj):
+        source = getsource(obj)
+        return source + '\n# modifié\n' if obj is resampling else source
+
+    monkeypatch.setattr(inspect, 'getsource', edited)
+    assert _stage_key(stage, {}, {}) != before
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.preprocessing import (align_features, compile_schema, fit_preprocessor, load_and_preprocess_chunked,
+                               select_features)
+
+
+def _raw_frame(rng, n_rows=3000, n_sensors=20):
+    # Format brut SECOM : Time, capteurs (échelles et valeurs manquantes variées), Pass/Fail
+    X = rng.lognormal(mean=2.0, sigma=1.0, size=(n_rows, n_sensors)) * rng.uniform(0.1, 1e3, n_sensors)
+    X[rng.random(X.shape) < 0.1] = np.nan
+    frame = pd.DataFrame(X, columns=[str(i) for i in range(n_sensors)])
+    frame.insert(0, 'Time', pd.date_range('2008-01-01', periods=n_rows, freq='min').astype(str))
+    frame['Pass/Fail'] = np.where(rng.random(n_rows) < 0.07, 1, -1)
+    return frame
+
+
+def test_chunked_medians_within_sketch_rank_error(tmp_path):
+    frame = _raw_frame(np.random.default_rng(0))
+    path = tmp_path / 'secom.csv'
+    frame.to_csv(path, index=False)
+
+    capacity = 64
+    state = load_and_preprocess_chunked(str(path), str(tmp_path / 'out.csv'), chunksize=250,
+                                        sketch_capacity=capacity)
+    reference = fit_preprocessor(frame.drop(columns=['Time', 'Pass/Fail']))
+    assert state['feature_names'] == reference['feature_names']
+
+    # Erreur de rang de l'ordre de 1 / capacity : la médiane approchée reste au centre de la distribution
+    for name, median in zip(state['feature_names'], state['medians']):
+        values = frame[name].dropna().to_numpy()
+        rank = (values < median).mean()
+        assert abs(rank - 0.5) <= 1 / capacity
+
+
+def _pandas_pruning(frame, variance_threshold=0.0, max_dominance=0.99, corr_threshold=0.98):
+    """Référence directe : variance, part de la valeur la plus fréquente, corrélation gloutonne."""
+    low_variance = frame.var(ddof=0) <= variance_threshold
+    dominance = frame.apply(lambda col: col.value_counts(normalize=True).max())
+    quasi_constant = (dominance > max_dominance) & ~low_variance
+    candidates = frame.columns[~(low_variance | quasi_constant)]
+    corr = frame[candidates].corr().abs()
+    kept = []
+    for col in candidates:
+        if not (corr.loc[col, kept] > corr_threshold).any():
+            kept.append(col)
+    return frame.columns.isin(kept)
+
+
+def test_pruning_matches_pandas_reference():
+    rng = np.random.default_rng(0)
+    n_rows = 500
+    base = rng.normal(size=(n_rows, 12))
+    columns = {f"s{i}": base[:, i] for i in range(12)}
+    for i in range(0, 12, 3):
+        # Copies bruitées : redondantes avec leur source, à cheval sur plusieurs blocs
+        columns[f"copy{i}"] = base[:, i] * 2.5 + rng.normal(scale=0.01, size=n_rows)
+    columns['constant'] = np.full(n_rows, 3.0)
+    quasi = np.zeros(n_rows)
+    quasi[:3] = 1.0
+    columns['quasi_constant'] = quasi
+    columns['mixed'] = base[:, 0] - base[:, 1]
+    frame = pd.DataFrame(columns).sample(frac=1.0, axis=1, random_state=0)
+
+    mask, report = select_features(frame.to_numpy(), block_size=4)
+    np.testing.assert_array_equal(mask, _pandas_pruning(frame))
+    assert report['low_variance'] == [frame.columns.get_loc('constant')]
+    assert report['quasi_constant'] == [frame.columns.get_loc('quasi_constant')]
+    assert len(report['correlated']) == 4
+
+
+def _reindex_reference(state, X):
+    """Référence pandas : colonnes du schéma (absentes à NaN) puis médianes d'entraînement."""
+    aligned = X.reindex(columns=state['feature_names']).astype(np.float64)
+    return aligned.fillna(pd.Series(state['medians'], index=state['feature_names']))
+
+
+def test_align_features_matches_reindex():
+    rng = np.random.default_rng(0)
+    frame = _raw_frame(rng, n_rows=200, n_sensors=8)
+    state = fit_preprocessor(frame.drop(columns=['Time', 'Pass/Fail']))
+    schema = compile_schema(state, missing_sensors='median')
+
+    # Colonnes inversées (Time et cible en plus), capteurs absents, petit lot avec une colonne inconnue
+    reordered = frame[frame.columns[::-1]]
+    missing = frame.drop(columns=['3', '5'])
+    small = reordered.iloc[:10].assign(extra=1.0)
+    for X in (frame, reordered, missing, small):
+        pd.testing.assert_frame_equal(align_features(schema, X), _reindex_reference(state, X))
+
+    with pytest.raises(ValueError, match='absents'):
+        align_features(compile_schema(state), missing)
+
+
+def test_align_features_returns_aligned_data_without_copy():
+    rng = np.random.default_rng(1)
+    frame = _raw_frame(rng, n_rows=100, n_sensors=6)
+    state = fit_preprocessor(frame.drop(columns=['Time', 'Pass/Fail']))
+    schema = compile_schema(state)
+
+    aligned = align_features(schema, frame)
+    assert not aligned.isna().any().any()
+    assert align_features(schema, aligned) is aligned
+    float32 = aligned.astype(np.float32)
+    assert align_features(schema, float32) is float32
@@ -0,0 +1,45 @@
+import os
+
+from src.registry import (MODEL_ARTIFACTS, VERSION_MANIFEST, ModelRegistry, list_versions, publish_model,
+                          version_state_dir)
+
+
+def test_version_state_dir_is_outside_version(tmp_path):
+    version_dir = tmp_path / 'default' / 'v0001'
+    version_dir.mkdir(parents=True)
+    (version_dir / VERSION_MANIFEST).write_text('{}')
+
+    state_dir = version_state_dir(str(version_dir))
+    assert state_dir == os.path.join(str(tmp_path / 'default'), 'state', 'v0001')
+    os.makedirs(state_dir)
+    # Le dossier d'état n'est pas pris pour une version
+    assert list_versions('default', str(tmp_path)) == ['v0001']
+
+
+def test_state_dir_outside_registry_is_model_dir(tmp_path):
+    assert version_state_dir(str(tmp_path)) == str(tmp_path)
+
+
+class _Model:
+    def __init__(self, directory):
+        self.directory = directory
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_active_versions_are_never_evicted(tmp_path):
+    source = tmp_path / 'results'
+    source.mkdir()
+    (source / MODEL_ARTIFACTS[0]).write_bytes(b'0' * 2000)
+    registry_dir = str(tmp_path / 'registry')
+    for line in ('default', 'A', 'B'):
+        publish_model(str(source), line, registry_dir)
+
+    # Budget plus petit qu'un seul modèle : seules les versions inactives peuvent partir
+    registry = ModelRegistry(_Model, registry_dir, memory_budget_mb=0.001, fallback_dir=str(source))
+    models = [registry.get(line)[2] for line in ('default', 'A', 'B')]
+    assert not any(model.closed for model in models)
+    assert registry.stats['evictions'] == 0
+    assert [registry.get(line)[2] for line in ('default', 'A', 'B')] == models
@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.resampling import cached_smote_resample, nearest_neighbors, smote_resample
+
+
+def _data(seed=0, n=200):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n, 5)), columns=list('abcde'))
+    y = pd.Series((rng.random(n) < 0.1).astype(int), name='Target')
+    return X, y
+
+
+def test_smote_balances_classes_and_keeps_names():
+    X, y = _data()
+    X_res, y_res = smote_resample(X, y, random_state=0)
+    assert list(X_res.columns) == list('abcde')
+    assert y_res.name == 'Target'
+    assert np.bincount(y_res).tolist() == [np.sum(y == 0)] * 2
+    # Les plaquettes d'origine restent en tête
+    np.testing.assert_array_equal(X_res.to_numpy()[:len(X)], X.to_numpy(dtype=np.float32))
+
+
+def test_smote_cache_is_bounded(tmp_path):
+    for seed in range(4):
+        X, y = _data(seed)
+        _, y_res = cached_smote_resample(X, y, cache_dir=str(tmp_path), max_entries=2)
+        assert y_res.name == 'Target'
+    assert len(os.listdir(tmp_path)) == 2
+
+    # Un succès de cache renvoie le même jeu
+    X_res, _ = cached_smote_resample(X, y, cache_dir=str(tmp_path), max_entries=2)
+    np.testing.assert_array_equal(X_res, smote_resample(X, y)[0])
+
+
+def test_nearest_neighbors_match_sklearn_with_large_offset():
+    from sklearn.neighbors import NearestNeighbors
+
+    # Capteurs autour de 1e4 avec une faible dispersion : cas d'annulation catastrophique
+    rng = np.random.default_rng(0)
+    X = (1e4 + 0.01 * rng.normal(size=(300, 50))).astype(np.float32)
+    expected, _ = NearestNeighbors(n_neighbors=6, algorithm='kd_tree').fit(X).kneighbors(X)
+    neighbors = nearest_neighbors(X, 5, chunk_size=128)
+    # Valeurs float32 quantifiées : des distances à égalité peuvent échanger leurs indices
+    X64 = X.astype(np.float64)
+    distances = np.sqrt(((X64[:, None, :] - X64[neighbors]) ** 2).sum(axis=2))
+    np.testing.assert_allclose(distances, expected[:, 1:], rtol=1e-9)
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from src.rolling import RollingWindow, rolling_feature_names
+
+
+def test_transform_matches_pandas_rolling():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(50, 3)) + 100.0
+    window = RollingWindow(['a', 'b', 'c'], 5)
+    features = window.transform(values)
+
+    previous = pd.DataFrame(values).shift(1).rolling(5, min_periods=1)
+    np.testing.assert_allclose(features[1:, :3], previous.mean().to_numpy()[1:])
+    np.testing.assert_allclose(features[1:, 3:6], previous.std(ddof=0).to_numpy()[1:], atol=1e-9)
+    np.testing.assert_allclose(features[1:, 6:], np.diff(values, axis=0))
+    assert rolling_feature_names(['a'])[0] == 'a_roll_mean'
+
+
+def test_copy_does_not_advance_original():
+    rng = np.random.default_rng(1)
+    window = RollingWindow(['a', 'b'], 4)
+    window.transform(rng.normal(size=(10, 2)))
+    batch = rng.normal(size=(3, 2))
+
+    copy = window.copy()
+    expected = copy.transform(batch)
+    assert window.count == 10 and copy.count == 13
+    np.testing.assert_allclose(window.transform(batch), expected)
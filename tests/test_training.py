@@ -0,0 +1,70 @@
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.model_selection import train_test_split
+
+from src.preprocessing import load_and_preprocess
+from src.resampling import smote_resample
+from src.thresholds import confusion_counts, load_operating_point, metrics_from_counts, save_operating_point
+from src.training import cv_operating_point, fit_forest, update_model
+
+
+@pytest.fixture(scope='module')
+def secom_like():
+    # Défauts rares (~7 %) et signal faible réparti sur quelques capteurs, comme SECOM
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(1200, 40))
+    score = X[:, :4].sum(axis=1) * 0.6 + rng.normal(size=len(X)) * 1.5
+    y = (score > np.quantile(score, 0.93)).astype(int)
+    return train_test_split(X, y, test_size=0.25, random_state=0, stratify=y)
+
+
+def test_operating_point_keeps_recall_on_held_out_data(secom_like):
+    X_train, X_test, y_train, y_test = secom_like
+    X_res, y_res = smote_resample(X_train, y_train, random_state=0)
+    model = fit_forest(X_res, y_res, {'n_estimators': 50}, random_state=0)
+
+    point = cv_operating_point(model, X_train, y_train, resample=True, random_state=0)
+    predictions = model.predict_proba(X_test)[:, 1] >= point['threshold']
+    metrics = metrics_from_counts(confusion_counts(y_test, predictions))
+    assert metrics['recall'] > 0
+
+
+def test_operating_point_without_resampling(secom_like):
+    X_train, _, y_train, _ = secom_like
+    model = fit_forest(X_train, y_train, {'n_estimators': 20}, random_state=0)
+    point = cv_operating_point(model, X_train, y_train, random_state=0)
+    assert 0.0 <= point['threshold'] <= 1.0
+
+
+def _raw_secom(path, rng, n_rows, start):
+    # Format brut : Time, capteurs, Pass/Fail (-1 conforme, 1 défaut)
+    X = rng.normal(size=(n_rows, 12))
+    label = np.where(X[:, :2].sum(axis=1) + rng.normal(size=n_rows) > 1.8, 1, -1)
+    frame = pd.DataFrame(X, columns=[str(i) for i in range(12)])
+    frame.insert(0, 'Time', pd.date_range(start, periods=n_rows, freq='h').astype(str))
+    frame['Pass/Fail'] = label
+    frame.to_csv(path, index=False)
+
+
+def test_update_model_with_rolling_features(tmp_path):
+    rng = np.random.default_rng(0)
+    _raw_secom(tmp_path / 'history.csv', rng, 400, '2008-01-01')
+    _raw_secom(tmp_path / 'lot.csv', rng, 120, '2008-03-01')
+    preprocessor_path = str(tmp_path / 'preprocessor.pkl')
+    df = load_and_preprocess(str(tmp_path / 'history.csv'), preprocessor_path, prune=False, rolling_window=5)
+    X, y = df.drop('Target', axis=1), df['Target']
+    assert any('_roll_' in name for name in X.columns)
+
+    model = fit_forest(*smote_resample(X, y, random_state=0), {'n_estimators': 20, 'oob_score': True}, random_state=0)
+    model_path = str(tmp_path / 'model.pkl')
+    joblib.dump(model, model_path)
+    point_path = str(tmp_path / 'operating_point.json')
+    save_operating_point({'threshold': 0.99}, point_path)
+
+    updated = update_model(str(tmp_path / 'lot.csv'), model_path, n_new_trees=5, preprocessor_path=preprocessor_path,
+                           compiled_path=str(tmp_path / 'compiled'), random_state=0, operating_point_path=point_path)
+    assert updated.n_estimators == 20
+    assert not hasattr(updated, 'oob_decision_function_') and not hasattr(updated, 'oob_score_')
+    assert load_operating_point(point_path)['threshold'] != 0.99